@@ -302,13 +302,12 @@ def evaluate(generate_solutions, test_root, some_module_dict, exception_map=ERRO
             test_class = getattr(project_test_classes, test_dict['class'])
             test_case = test_class(question, test_dict)
 
-            def makefun(test_case, solution_file):
+            def makefun(test_case, test_dict, solution_file):
                 if generate_solutions:
                     # write solution file to disk
                     return lambda grades: test_case.write_solution(some_module_dict, solution_file)
 
                 # read in solution dictionary and pass as an argument
-                test_dict = test_parser.TestParser(test_file).parse()
                 solution_dict = test_parser.TestParser(solution_file).parse()
                 if print_test_case:
                     return lambda grades: print_test(test_dict, solution_dict) or test_case.execute(
@@ -317,7 +316,7 @@ def evaluate(generate_solutions, test_root, some_module_dict, exception_map=ERRO
                         solution_dict)
                 return lambda grades: test_case.execute(grades, some_module_dict, solution_dict)
 
-            question.add_test_case(test_case, makefun(test_case, solution_file))
+            question.add_test_case(test_case, makefun(test_case, test_dict, solution_file))
 
         # Note extra function is necessary for scoping reasons
         def make_fun(question):
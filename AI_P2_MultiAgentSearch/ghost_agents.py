@@ -90,3 +90,80 @@ class DirectionalGhost(GhostAgent):
             dist[a] += (1 - best_prob) / len(legal_actions)
         dist.normalize()
         return dist
+
+
+class DirectionalGhostModel:
+    """
+    A lookup table of DirectionalGhost action distributions for one layout.
+
+    A DirectionalGhost's distribution only depends on the ghost's position and
+    direction (which fix its legal actions), Pacman's position and whether the
+    ghost is scared, so each distribution is computed once per such key and
+    then served from the table.  This lets a search weight its chance nodes by
+    the real ghost policy without building and normalizing a Counter each time.
+
+    Use get_directional_ghost_model(layout) to share tables between agents.
+    """
+
+    def __init__(self, walls, prob_attack=0.8, prob_scared_flee=0.8):
+        self.walls = walls
+        self.prob_attack = prob_attack
+        self.prob_scared_flee = prob_scared_flee
+        self.table = {}
+
+    def get_distribution(self, state, ghost_index):
+        """
+        Returns a dict from each legal action of the ghost to its probability.
+        """
+        ghost_state = state.data.agent_states[ghost_index]
+        configuration = ghost_state.configuration
+        key = (configuration.pos, configuration.direction, state.get_pacman_position(),
+               ghost_state.scared_timer > 0)
+        dist = self.table.get(key)
+        if dist is None:
+            dist = self.table[key] = self.compute_distribution(configuration, *key[2:])
+        return dist
+
+    def compute_distribution(self, configuration, pacman_position, is_scared):
+        """
+        Mirrors DirectionalGhost.get_distribution and GhostRules.get_legal_actions.
+        """
+        legal_actions = Actions.get_possible_actions(configuration, self.walls)
+        reverse = Actions.reverse_direction(configuration.direction)
+        if Directions.STOP in legal_actions:
+            legal_actions.remove(Directions.STOP)
+        if reverse in legal_actions and len(legal_actions) > 1:
+            legal_actions.remove(reverse)
+
+        speed = 0.5 if is_scared else 1
+        pos = configuration.pos
+        action_vectors = [Actions.direction_to_vector(a, speed) for a in legal_actions]
+        distances_to_pacman = [manhattan_distance((pos[0] + a[0], pos[1] + a[1]), pacman_position)
+                               for a in action_vectors]
+        if is_scared:
+            best_score = max(distances_to_pacman)
+            best_prob = self.prob_scared_flee
+        else:
+            best_score = min(distances_to_pacman)
+            best_prob = self.prob_attack
+        best_actions = [action for action, distance
+                        in zip(legal_actions, distances_to_pacman) if distance == best_score]
+
+        dist = dict.fromkeys(legal_actions, (1 - best_prob) / len(legal_actions))
+        for a in best_actions:
+            dist[a] += best_prob / len(best_actions)
+        total = sum(dist.values())
+        return {a: p / total for a, p in dist.items()}
+
+
+def get_directional_ghost_model(layout, prob_attack=0.8, prob_scared_flee=0.8):
+    """
+    Returns the DirectionalGhostModel for a layout, creating it on first use.
+    """
+    models = getattr(layout, 'ghost_models', None)
+    if models is None:
+        models = layout.ghost_models = {}
+    key = (prob_attack, prob_scared_flee)
+    if key not in models:
+        models[key] = DirectionalGhostModel(layout.walls, prob_attack, prob_scared_flee)
+    return models[key]
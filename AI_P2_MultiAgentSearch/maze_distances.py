@@ -0,0 +1,184 @@
+"""
+maze_distances.py
+-----------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+This file contains a MazeDistances object which precomputes the true maze
+distance between every pair of open cells of a layout, together with a
+nearest-food index, so that evaluation functions can be answered from tables
+instead of rescanning the food grid at every leaf of a search.
+
+Example:
+maze = get_maze_distances(game_state.data.layout)
+maze.get_distance((1, 1), (10, 10))
+maze.nearest_food_distance(game_state)
+
+Open cells are numbered 0..n-1 and food is represented as an int bitset with
+bit i set when cell i holds food.  Tables are shared by every game played on
+the same walls.
+"""
+
+from collections import deque
+
+# Tables are keyed by the walls Grid so that layouts loaded twice share them
+MAZE_DISTANCE_CACHE = {}
+
+# Memo tables are cleared once they hold this many entries
+MAX_MEMO_SIZE = 200000
+
+
+class MazeDistances:
+    """
+    All-pairs maze distances for one set of walls, plus memo tables keyed on
+    (cell, food bitset) and on whole evaluation keys.
+    """
+
+    def __init__(self, walls):
+        self.width = walls.width
+        self.height = walls.height
+        self.cells = walls.as_list(False)
+        self.cell_index = {cell: i for i, cell in enumerate(self.cells)}
+        self.distances = [self._breadth_first_distances(walls, source) for source in self.cells]
+        # For every cell, all cells ordered by increasing maze distance
+        self.nearest_order = [sorted(range(len(self.cells)), key=row.__getitem__)
+                              for row in self.distances]
+        self.unreachable = self.width * self.height
+
+        self._food_bits = {}
+        self._nearest_rank = {}
+        self.evaluations = {}
+
+    def _breadth_first_distances(self, walls, source):
+        """
+        Every move costs one, so a breadth first search gives exact distances.
+        """
+        distance = [None] * len(self.cells)
+        distance[self.cell_index[source]] = 0
+        frontier = deque([source])
+        while frontier:
+            x, y = frontier.popleft()
+            next_distance = distance[self.cell_index[(x, y)]] + 1
+            for neighbor in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)):
+                index = self.cell_index.get(neighbor)
+                if index is not None and distance[index] is None:
+                    distance[index] = next_distance
+                    frontier.append(neighbor)
+        unreachable = walls.width * walls.height
+        return [unreachable if d is None else d for d in distance]
+
+    def get_distance(self, pos1, pos2):
+        """
+        Returns the maze distance between two positions.  Positions between
+        cells (scared ghosts move at half speed) are snapped to the
+        neighbouring cells, as in the Distancer of the tracking project.
+        """
+        best_distance = self.unreachable
+        for cell1, offset1 in self._snap(pos1):
+            row = self.distances[self.cell_index[cell1]]
+            for cell2, offset2 in self._snap(pos2):
+                distance = row[self.cell_index[cell2]] + offset1 + offset2
+                if distance < best_distance:
+                    best_distance = distance
+        return best_distance
+
+    def _snap(self, pos):
+        x, y = pos
+        if x == int(x) and y == int(y):
+            return [((int(x), int(y)), 0)]
+        snapped = []
+        for grid_x, x_offset in _snap_1d(x):
+            for grid_y, y_offset in _snap_1d(y):
+                if (grid_x, grid_y) in self.cell_index:
+                    snapped.append(((grid_x, grid_y), x_offset + y_offset))
+        return snapped
+
+    def food_bits(self, food):
+        """
+        Returns the food Grid as a bitset over open cells.
+
+        Successor states share the list of lists behind their food Grid until
+        a pellet is eaten (see PacmanRules.consume), so the bitset is computed
+        once per distinct food layout rather than once per state.  The list is
+        kept alive by the cache so its id cannot be reused.
+        """
+        key = id(food.data)
+        cached = self._food_bits.get(key)
+        if cached is not None and cached[0] is food.data:
+            return cached[1]
+        if len(self._food_bits) > MAX_MEMO_SIZE:
+            self._food_bits.clear()
+        bits = 0
+        for i, (x, y) in enumerate(self.cells):
+            if food.data[x][y]:
+                bits |= 1 << i
+        self._food_bits[key] = (food.data, bits)
+        return bits
+
+    def nearest_food_distance(self, pos, bits, eaten=None):
+        """
+        Returns the maze distance from pos to the closest food in bits, or
+        None when there is no food left.
+
+        The answer is the first cell of nearest_order[pos] that holds food.
+        When the state was reached by eating the pellet at eaten, the search
+        resumes from the rank found for the parent food set instead of
+        starting over, so the index updates incrementally as food is eaten.
+        """
+        if not bits:
+            return None
+        source = self.cell_index[pos]
+        key = (source, bits)
+        rank = self._nearest_rank.get(key)
+        if rank is None:
+            rank = 0
+            if eaten is not None and eaten in self.cell_index:
+                eaten_bit = 1 << self.cell_index[eaten]
+                parent_rank = self._nearest_rank.get((source, bits | eaten_bit))
+                if parent_rank is not None:
+                    rank = parent_rank
+            order = self.nearest_order[source]
+            while not bits >> order[rank] & 1:
+                rank += 1
+            if len(self._nearest_rank) > MAX_MEMO_SIZE:
+                self._nearest_rank.clear()
+            self._nearest_rank[key] = rank
+        return self.distances[source][self.nearest_order[source][rank]]
+
+    def remember(self, key, value):
+        """
+        Stores an evaluation result, bounding the size of the memo table.
+        """
+        if len(self.evaluations) > MAX_MEMO_SIZE:
+            self.evaluations.clear()
+        self.evaluations[key] = value
+        return value
+
+
+def _snap_1d(x):
+    int_x = int(x)
+    if x == int_x:
+        return [(int_x, 0)]
+    return [(int_x, x - int_x), (int_x + 1, int_x + 1 - x)]
+
+
+def get_maze_distances(layout):
+    """
+    Returns the MazeDistances for a layout, computing them on first use.
+    """
+    maze = getattr(layout, 'maze_distances', None)
+    if maze is None:
+        maze = MAZE_DISTANCE_CACHE.get(layout.walls)
+        if maze is None:
+            maze = MazeDistances(layout.walls)
+            MAZE_DISTANCE_CACHE[layout.walls] = maze
+        layout.maze_distances = maze
+    return maze
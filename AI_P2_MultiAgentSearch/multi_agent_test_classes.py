@@ -18,6 +18,7 @@ A minimax tree which interfaces like game_state
     state.is_win()
     state.is_lose()
     state.generate_successor(agent_index, action)
+    state.expand(agent_index)
     state.get_score()
           used by multi_agents.score_evaluation_function, which is the default
 """
@@ -41,47 +42,54 @@ VERBOSE = False
 
 class MultiagentTreeState:
 
-    def __init__(self, problem, state):
+    def __init__(self, problem, state_id):
         self.problem = problem
-        self.state = state
+        self.state_id = state_id
+        self.state = problem.state_names[state_id]
 
     def generate_successor(self, agent_index, action):
+        successor = self.problem.successor_ids[self.state_id][action]
         if VERBOSE:
             print(
                 "generate_successor(%s, %s, %s) -> %s" % (
-                    self.state, agent_index, action,
-                    self.problem.state_to_successor_map[self.state][action]
+                    self.state, agent_index, action, self.problem.state_names[successor]
                 )
             )
-        successor = self.problem.state_to_successor_map[self.state][action]
         self.problem.generated_states.add(successor)
         return MultiagentTreeState(self.problem, successor)
 
+    def expand(self, agent_index, legal=None):
+        if legal is None:
+            legal = self.get_legal_actions(agent_index)
+        for action in legal:
+            yield action, self.generate_successor(agent_index, action)
+
     def get_score(self):
+        value = self.problem.evaluation[self.state_id]
         if VERBOSE:
-            print("get_score(%s) -> %s" % (self.state, self.problem.evaluation[self.state]))
-        if self.state not in self.problem.evaluation:
+            print("get_score(%s) -> %s" % (self.state, value))
+        if value is None:
             raise Exception('get_score() called on non-terminal state or before maximum depth '
                             'achieved.')
-        return float(self.problem.evaluation[self.state])
+        return value
 
     def get_legal_actions(self, _):
         if VERBOSE:
-            print("get_legal_actions(%s) -> %s" % (self.state, self.problem.state_to_actions[
-                self.state]))
+            print("get_legal_actions(%s) -> %s" % (self.state, list(self.problem.actions[
+                self.state_id])))
         # if len(self.problem.stateToActions[self.state]) == 0:
         #    print "WARNING: get_legal_actions called on leaf state %s" % (self.state,)
-        return list(self.problem.state_to_actions[self.state])
+        return list(self.problem.actions[self.state_id])
 
     def is_win(self):
         if VERBOSE:
-            print("is_win(%s) -> %s" % (self.state, self.state in self.problem.win_states))
-        return self.state in self.problem.win_states
+            print("is_win(%s) -> %s" % (self.state, self.problem.win_flags[self.state_id]))
+        return self.problem.win_flags[self.state_id]
 
     def is_lose(self):
         if VERBOSE:
-            print("is_lose(%s) -> %s" % (self.state, self.state in self.problem.lose_states))
-        return self.state in self.problem.lose_states
+            print("is_lose(%s) -> %s" % (self.state, self.problem.lose_flags[self.state_id]))
+        return self.problem.lose_flags[self.state_id]
 
     def get_num_agents(self):
         if VERBOSE:
@@ -90,28 +98,65 @@ class MultiagentTreeState:
 
 
 class MultiagentTreeProblem:
-    def __init__(self, num_agents, start_state, win_states, lose_states, successors, evaluation):
-        self.start_state = MultiagentTreeState(self, start_state)
+    """
+    A game tree compiled into adjacency arrays.  States are numbered in the
+    order they first appear and every per-state table is a list indexed by
+    that number; state_names maps the numbers back for reporting.
+    """
 
+    def __init__(self, num_agents, start_state, win_states, lose_states, successors, evaluation):
         self.num_agents = num_agents
-        self.win_states = win_states
-        self.lose_states = lose_states
-        self.evaluation = evaluation
         self.successors = successors
 
-        self.reset()
+        self.state_names = []
+        self.state_ids = {}
+        for state in [start_state] + [state for edge in successors for state in edge[::2]]:
+            self._intern(state)
+        for state in evaluation:
+            self._intern(state)
 
-        self.state_to_successor_map = defaultdict(dict)
-        self.state_to_actions = defaultdict(list)
+        self.actions = [[] for _ in self.state_names]
+        self.successor_ids = [{} for _ in self.state_names]
         for state, action, next_state in successors:
-            self.state_to_actions[state].append(action)
-            self.state_to_successor_map[state][action] = next_state
+            state_id = self.state_ids[state]
+            self.actions[state_id].append(action)
+            self.successor_ids[state_id][action] = self.state_ids[next_state]
+        self.actions = [tuple(actions) for actions in self.actions]
+
+        self.win_flags = [state in win_states for state in self.state_names]
+        self.lose_flags = [state in lose_states for state in self.state_names]
+        self.evaluation = [None] * len(self.state_names)
+        for state, value in evaluation.items():
+            self.evaluation[self.state_ids[state]] = float(value)
+
+        self.start_state = MultiagentTreeState(self, self.state_ids[start_state])
+        self.reset()
+
+    def _intern(self, state):
+        if state not in self.state_ids:
+            self.state_ids[state] = len(self.state_names)
+            self.state_names.append(state)
 
     def reset(self):
-        self.generated_states = {self.start_state.state}
+        self.generated_states = {self.start_state.state_id}
+
+    def get_generated_states(self):
+        return sorted(self.state_names[state_id] for state_id in self.generated_states)
+
+
+# Parsed trees are shared by every test with the same tree (q2 and q3 reuse them)
+TREE_PROBLEM_CACHE = {}
+TREE_FIELDS = ('num_agents', 'start_state', 'win_states', 'lose_states', 'successors', 'evaluation')
 
 
 def parse_tree_problem(test_dict):
+    key = tuple(test_dict[field] for field in TREE_FIELDS)
+    if key not in TREE_PROBLEM_CACHE:
+        TREE_PROBLEM_CACHE[key] = _parse_tree_problem(test_dict)
+    return TREE_PROBLEM_CACHE[key]
+
+
+def _parse_tree_problem(test_dict):
     num_agents = int(test_dict["num_agents"])
     start_state = test_dict["start_state"]
     win_states = set(test_dict["win_states"].split(" "))
@@ -339,18 +384,17 @@ class PacmanGameTreeTest(test_classes.TestCase):
         self.layout_name = self.test_dict['layoutName']
         self.depth = int(self.test_dict['depth'])
         self.max_points = int(self.test_dict['max_points'])
+        self.layout = layout.Layout([l.strip() for l in self.layout_text.split('\n')])
 
     def execute(self, grades, module_dict, solution_dict):
-        # load student code and staff code solutions
+        # load student code and the reference traces recorded by write_solution
         multi_agents = module_dict['multi_agents']
         student_agent = getattr(multi_agents, self.alg)(depth=self.depth)
-        all_actions = [json.loads(x) for x in solution_dict['optimalActions'].split('\n')]
-        alt_depth_actions = [json.loads(x) for x in solution_dict['altDepthActions'].split('\n')]
-        partial_ply_bug_actions = [json.loads(x) for x in
-                                   solution_dict['partialPlyBugActions'].split('\n')]
+        all_actions, alt_depth_actions, partial_ply_bug_actions = [
+            self.read_list(solution_dict, name) for name in self.TRACE_NAMES]
         # set up game state and play a game
         random.seed(self.seed)
-        lay = layout.Layout([l.strip() for l in self.layout_text.split('\n')])
+        lay = self.layout
         pac = GradingAgent(self.seed, student_agent, all_actions, alt_depth_actions,
                            partial_ply_bug_actions)
         # check return codes and assign grades
@@ -387,6 +431,13 @@ class PacmanGameTreeTest(test_classes.TestCase):
             'State:%s\nStudent Move:%s\nOptimal Move:%s' % (state, student_move, opt_move))
         return self.test_fail(grades)
 
+    # Solution file keys of the optimal, alternative depth and partial ply bug traces
+    TRACE_NAMES = ('optimalActions', 'altDepthActions', 'partialPlyBugActions')
+
+    @staticmethod
+    def read_list(solution_dict, name):
+        return [json.loads(x) for x in solution_dict[name].split('\n')]
+
     def write_list(self, handle, name, a_list):
         handle.write('%s: """\n' % name)
         for item in a_list:
@@ -397,7 +448,7 @@ class PacmanGameTreeTest(test_classes.TestCase):
         # load module, set seed, create ghosts and macman, run game
         multi_agents = module_dict['multi_agents']
         random.seed(self.seed)
-        lay = layout.Layout([l.strip() for l in self.layout_text.split('\n')])
+        lay = self.layout
         if self.alg == 'ExpectimaxAgent':
             our_pac_options = {'expectimax': 'True'}
         elif self.alg == 'AlphaBetaAgent':
@@ -405,16 +456,16 @@ class PacmanGameTreeTest(test_classes.TestCase):
         else:
             our_pac_options = {}
         pac = PolyAgent(self.seed, multi_agents, our_pac_options, self.depth)
-        disp = self.question.getDisplay()
+        disp = self.question.get_display()
         run(lay, self.layout_name, pac, [DirectionalGhost(i + 1) for i in range(2)], disp,
             name=self.alg)
         (optimal_actions, alt_depth_actions, partial_ply_bug_actions) = pac.get_traces()
-        # recover traces and record to file
-        handle = open(file_path, 'w')
-        self.write_list(handle, 'optimal_actions', optimal_actions)
-        self.write_list(handle, 'alt_depth_actions', alt_depth_actions)
-        self.write_list(handle, 'partial_ply_bug_actions', partial_ply_bug_actions)
-        handle.close()
+        # recover traces and record to file, so execute never has to rerun the PolyAgent
+        with open(file_path, 'w') as handle:
+            for name, a_list in zip(self.TRACE_NAMES,
+                                    (optimal_actions, alt_depth_actions, partial_ply_bug_actions)):
+                self.write_list(handle, name, a_list)
+        return True
 
 
 class GraphGameTreeTest(test_classes.TestCase):
@@ -430,8 +481,7 @@ class GraphGameTreeTest(test_classes.TestCase):
         self.problem.reset()
         student_agent = getattr(multi_agents, self.alg)(depth=self.depth)
         action = student_agent.get_action(self.problem.start_state)
-        generated = self.problem.generated_states
-        return action, " ".join([str(s) for s in sorted(generated)])
+        return action, " ".join(self.problem.get_generated_states())
 
     def add_diagram(self):
         self.add_message('Tree:')
@@ -18,6 +18,9 @@ import util
 
 from util import manhattan_distance
 from game import Agent, Directions
+from ghost_agents import get_directional_ghost_model
+from maze_distances import get_maze_distances
+from search_stats import SearchStats
 
 
 class ReflexAgent(Agent):
@@ -40,10 +43,11 @@ class ReflexAgent(Agent):
         some Directions.X for some X in the set {North, South, West, East, Stop}
         """
         # Collect legal moves and successor states
-        legal_moves = game_state.get_legal_actions()
+        successors = list(game_state.expand(0))
+        legal_moves = [action for action, _ in successors]
 
         # Choose one of the best actions
-        scores = [self.evaluation_function(game_state, action) for action in legal_moves]
+        scores = [self.evaluate_successor(successor) for _, successor in successors]
         best_score = max(scores)
         best_indices = [index for index in range(len(scores)) if scores[index] == best_score]
         chosen_index = random.choice(best_indices)  # Pick randomly among the best
@@ -70,6 +74,13 @@ class ReflexAgent(Agent):
 
         # Useful information you can extract from a GameState (pacman.py)
         successor_game_state = current_game_state.generate_pacman_successor(action)
+        return self.evaluate_successor(successor_game_state)
+
+    def evaluate_successor(self, successor_game_state):
+        """
+        Scores a successor GameState that has already been generated, so that
+        get_action can expand all of Pacman's moves in one call.
+        """
         new_pos = successor_game_state.get_pacman_position()
         new_food = successor_game_state.get_food()
         new_ghost_states = successor_game_state.get_ghost_states()
@@ -121,13 +132,19 @@ class MultiAgentSearchAgent(Agent):
       Note: this is an abstract class: one that should not be instantiated.  It's
       only partially specified, and designed to be extended.  Agent (game.py)
       is another abstract class.
+
+      Passing stats=<prefix> records search tree statistics for every move to
+      <prefix>.jsonl and <prefix>.folded (see search_stats.py).  Without it the
+      agent is left untouched.
     """
 
-    def __init__(self, eval_fn='score_evaluation_function', depth='2'):
+    def __init__(self, eval_fn='score_evaluation_function', depth='2', stats=None):
         super().__init__()
         self.index = 0  # Pacman is always agent index 0
         self.evaluation_function = util.lookup(eval_fn, globals())
         self.depth = int(depth)
+        if stats:
+            SearchStats(stats, type(self).__name__).instrument(self)
 
 
 class MinimaxAgent(MultiAgentSearchAgent):
@@ -151,6 +168,9 @@ class MinimaxAgent(MultiAgentSearchAgent):
 
           game_state.get_num_agents():
             Returns the total number of agents in the game
+
+          game_state.expand(agent_index):
+            Returns (action, successor) pairs for every legal action of an agent
         """
 
         # *** YOUR CODE HERE ***#
@@ -159,8 +179,7 @@ class MinimaxAgent(MultiAgentSearchAgent):
             current_action = None
             current_value = -math.inf
 
-            for action in state.get_legal_actions(index):
-                next_state = state.generate_successor(index, action)
+            for action, next_state in state.expand(index):
                 miniValue = minimax(1, depth, next_state)
                 if miniValue > current_value:
                     current_value = miniValue
@@ -177,8 +196,7 @@ class MinimaxAgent(MultiAgentSearchAgent):
             next_depth = depth
             if next_index ==0: #updating based on agent
                 next_depth = depth-1
-            for action in state.get_legal_actions(index):
-                next_state = state.generate_successor(index, action)
+            for action, next_state in state.expand(index):
                 miniValue = minimax(next_index, next_depth, next_state)
                 current_value = min(current_value, miniValue)
             return current_value
@@ -208,8 +226,7 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         beta = math.inf
         current_action = None
 
-        for action in game_state.get_legal_actions(0):
-            next_state = game_state.generate_successor(0, action)
+        for action, next_state in game_state.expand(0):
             score = self.min_value(next_state, 1, 0, alpha, beta)
             if score > alpha:
                 alpha = score
@@ -223,8 +240,7 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
 
         maxScore = -math.inf
 
-        for action in state.get_legal_actions(index):
-            next_state = state.generate_successor(index,action)
+        for action, next_state in state.expand(index):
             score = self.min_value(next_state, index+1 , depth, alpha, beta) #(index+1)%state.get_num_agents()
             maxScore = max(maxScore, score)
 
@@ -241,8 +257,7 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
 
         minScore = math.inf
 
-        for action in state.get_legal_actions(index):
-            next_state = state.generate_successor(index, action)
+        for action, next_state in state.expand(index):
             if index == (state.get_num_agents() -1):
                 score = self.max_value(next_state, 0, depth+1, alpha, beta)
             else:
@@ -278,44 +293,68 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
 
         def max_value(state, index, depth):
             current_value = -math.inf
-            legal_moves = state.get_legal_actions(index)
-            if not legal_moves:  #prevents nasty stuff happening
+            successors = list(state.expand(index))
+            if not successors:  #prevents nasty stuff happening
                 return self.evaluation_function(state)
-            for action in legal_moves:
-                next_state = state.generate_successor(index, action)
+            for action, next_state in successors:
                 current_value = max(current_value, expectimax(next_state, 1, depth))
             return current_value
 
         def expected_value(state, index, depth):
             current_value = 0
-            legalMoves = state.get_legal_actions(index)
-            if not legalMoves:
+            successors = list(state.expand(index))
+            if not successors:
                 return self.evaluation_function(state)
 
-            chanceCalc = 1.0/len(legalMoves) #expectation/probability
+            chances = self.chance_probabilities(state, index, successors) #expectation/probability
 
             nextIndex = index +1
             if nextIndex == state.get_num_agents():
                 nextIndex = 0
                 depth += 1
 
-            for action in legalMoves:
-                next_state = state.generate_successor(index, action)
+            for (action, next_state), chanceCalc in zip(successors, chances):
                 current_value += chanceCalc * expectimax(next_state, nextIndex, depth)
             return current_value
 
-        legalMovesOUT = game_state.get_legal_actions(0)
         current_move = None
         current_score = -math.inf
 
-        for actionOUT in legalMovesOUT:
-            next_stateOUT = game_state.generate_successor(0, actionOUT)
+        for actionOUT, next_stateOUT in game_state.expand(0):
             score = expectimax(next_stateOUT, 1, 0)
             if score > current_score:
                 current_move = actionOUT
                 current_score = score
         return current_move #final
 
+    def chance_probabilities(self, state, index, successors):
+        """
+          Returns the probability of each (action, successor) pair at a ghost's
+          chance node.  Ghosts are modeled as choosing uniformly at random.
+        """
+        return [1.0 / len(successors)] * len(successors)
+
+
+class DirectionalExpectimaxAgent(ExpectimaxAgent):
+    """
+      An expectimax agent that models ghosts as DirectionalGhosts rather than
+      uniformly random ones.  Chance nodes are weighted by the ghost's real
+      action distribution, looked up from a table kept per layout
+      (ghost_agents.DirectionalGhostModel).
+    """
+
+    def __init__(self, eval_fn='score_evaluation_function', depth='2', prob_attack='0.8',
+                 prob_scared_flee='0.8', stats=None):
+        super().__init__(eval_fn, depth, stats)
+        self.prob_attack = float(prob_attack)
+        self.prob_scared_flee = float(prob_scared_flee)
+
+    def chance_probabilities(self, state, index, successors):
+        model = get_directional_ghost_model(state.data.layout, self.prob_attack,
+                                            self.prob_scared_flee)
+        dist = model.get_distribution(state, index)
+        return [dist[action] for action, _ in successors]
+
 
 def better_evaluation_function(current_game_state):
     """
@@ -325,43 +364,49 @@ def better_evaluation_function(current_game_state):
       DESCRIPTION: Close to previous eval function, includes logic for desiring food but prioritizing survival by\
       staying away from active ghosts and chasing scared ghosts. Additionally, has code to drive pacman towards the power pellets
       /capsules
+
+      Distances are true maze distances looked up from tables precomputed once per layout
+      (maze_distances.py).  Everything but the score only depends on Pacman's position, the
+      remaining food, the ghosts and the capsules, so that part is memoized on those keys.
     """
 
     # *** YOUR CODE HERE ***
-    # Useful information you can extract from a GameState (pacman.py)
-    successor_game_state = current_game_state
-    new_pos = successor_game_state.get_pacman_position()
-    new_food = successor_game_state.get_food()
-    new_ghost_states = successor_game_state.get_ghost_states()
+    maze = get_maze_distances(current_game_state.data.layout)
+    new_pos = current_game_state.get_pacman_position()
+    food_bits = maze.food_bits(current_game_state.get_food())
+    ghosts = tuple((ghost.get_position(), ghost.scared_timer > 0)
+                   for ghost in current_game_state.get_ghost_states())
     new_pellets = current_game_state.get_capsules()
-    current_score = current_game_state.get_score()
-    new_scared_times = [ghost_state.scared_timer for ghost_state in new_ghost_states]
+    key = (new_pos, food_bits, ghosts, tuple(new_pellets))
 
-    food = new_food.as_list()
-    if food:
-        closest_food = min([manhattan_distance(new_pos, food_pos) for food_pos in food])
-        current_score += 1.0 /closest_food
+    value = maze.evaluations.get(key)
+    if value is None:
+        value = 0.0
+        closest_food = maze.nearest_food_distance(new_pos, food_bits, current_game_state.data._food_eaten)
+        if closest_food is not None:
+            value += 1.0 / closest_food
 
-    for i, ghost in enumerate(new_ghost_states): #enumerate = more robust
-        ghost_position = ghost.get_position()
-        ghost_distance = manhattan_distance(new_pos, ghost_position)
+        for ghost_position, scared in ghosts:
+            ghost_distance = maze.get_distance(new_pos, ghost_position)
 
-        if new_scared_times[i] > 0: #being near scared ghosts is good
-            current_score += 200/ghost_distance
-        else:
-            if ghost_distance < 2: #being near active ghosts bad
-                current_score-= 1000
+            if scared: #being near scared ghosts is good
+                value += 200 / (ghost_distance or 1)
+            else:
+                if ghost_distance < 2: #being near active ghosts bad
+                    value -= 1000
 
-    if new_pellets: #seek and use power pellets similar to food
-        closest_pellets = min([manhattan_distance(new_pos, capsule) for capsule in new_pellets])
-        current_score += 2.0 / (closest_pellets+1)
+        if new_pellets: #seek and use power pellets similar to food
+            closest_pellets = min([maze.get_distance(new_pos, capsule) for capsule in new_pellets])
+            value += 2.0 / (closest_pellets+1)
 
-    current_score -= len(food) * 10 #leaving food on the board = bad
+        num_food = bin(food_bits).count('1')
+        value -= num_food * 10 #leaving food on the board = bad
 
-    if len(food) == 0:
-        current_score += 1000.0 ##board clear = good
+        if num_food == 0:
+            value += 1000.0 ##board clear = good
+        maze.remember(key, value)
 
-    return current_score
+    return current_game_state.get_score() + value
 
 # Abbreviation
 better = better_evaluation_function
@@ -133,6 +133,58 @@ class GameState:
         GameState.explored.add(state)
         return state
 
+    def expand(self, agent_index=0, legal=None):
+        """
+        Yields an (action, successor) pair for every legal action of the agent.
+        A caller that already has the legal actions of the agent can pass
+        them as legal.
+
+        This is the batched form of get_legal_actions followed by one
+        generate_successor call per action.  The terminal check and the legal
+        actions are computed once for the parent, and when Pacman moves, the
+        ghost positions are read once and every successor's Pacman position is
+        checked against them.  Successors are generated as the caller
+        iterates, so a search that stops early (e.g. an alpha-beta cutoff)
+        never generates the remaining ones.
+        """
+        if self.is_win() or self.is_lose():
+            return
+
+        if agent_index == 0:  # Pacman is moving
+            if legal is None:
+                legal = PacmanRules.get_legal_actions(self)
+            eaten = [False for _ in range(self.get_num_agents())]
+            ghost_positions = [(index, ghost_state.configuration.get_position())
+                               for index, ghost_state in enumerate(self.data.agent_states)
+                               if index != 0]
+        elif legal is None:  # A ghost is moving
+            legal = GhostRules.get_legal_actions(self, agent_index)
+
+        GameState.explored.add(self)
+        for action in legal:
+            state = GameState(self)
+
+            if agent_index == 0:
+                state.data.eaten = eaten[:]
+                PacmanRules.move(state, action)
+                state.data.score_change -= TIME_PENALTY  # Penalty for waiting around
+
+                # Pacman's move cannot move the ghosts, so the parent's ghost positions still hold
+                pacman_position = state.get_pacman_position()
+                for index, ghost_position in ghost_positions:
+                    if GhostRules.can_kill(pacman_position, ghost_position):
+                        GhostRules.collide(state, state.data.agent_states[index], index)
+            else:
+                GhostRules.move(state, action, agent_index)
+                GhostRules.decrement_timer(state.data.agent_states[agent_index])
+                GhostRules.check_death(state, agent_index)
+
+            # Book keeping
+            state.data._agent_moved = agent_index
+            state.data.score += state.data.score_change
+            GameState.explored.add(state)
+            yield action, state
+
     def get_legal_pacman_actions(self):
         return self.get_legal_actions(0)
 
@@ -365,6 +417,13 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
+        PacmanRules.move(state, action)
+
+    @staticmethod
+    def move(state, action):
+        """
+        Moves pacman and eats whatever he lands on, without checking legality.
+        """
         pacman_state = state.data.agent_states[0]
 
         # Update Configuration
@@ -430,6 +489,13 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
+        GhostRules.move(state, action, ghost_index)
+
+    @staticmethod
+    def move(state, action, ghost_index):
+        """
+        Moves the ghost at its current speed, without checking legality.
+        """
         ghost_state = state.data.agent_states[ghost_index]
         speed = GhostRules.GHOST_SPEED
         if ghost_state.scared_timer > 0:
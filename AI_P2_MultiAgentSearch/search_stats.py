@@ -0,0 +1,186 @@
+"""
+search_stats.py
+---------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+Search tree statistics for the multi-agent search agents.
+
+A SearchStats object wraps an agent's get_action and evaluation_function and,
+for the duration of each get_action call, the expand method of the state
+class.  For every move it records the nodes expanded, generated and skipped
+by pruning per ply (as {ply: count} objects, the root being at ply 0), the
+time spent in the evaluation function, the effective branching factor and
+the wall time of the move.  Each move is
+appended to <prefix>.jsonl as one JSON object, and <prefix>.folded collects
+the time per search path in the collapsed-stack format read by flame graph
+tools (flamegraph.pl, speedscope, inferno).
+
+Nothing is wrapped unless statistics are requested, so agents created without
+them run exactly the code they did before.  For example:
+
+python pacman.py -p AlphaBetaAgent -a depth=3,stats=alpha_beta -l small_classic
+"""
+
+import json
+import time
+from collections import defaultdict
+
+
+class SearchStats:
+    """
+    Records statistics about the search trees built by one agent.
+    """
+
+    def __init__(self, prefix, agent_name):
+        self.prefix = prefix
+        self.agent_name = agent_name
+        self.move = 0
+        self.folded = defaultdict(float)
+        self._reset_move()
+        # Truncate the output of any previous run
+        open(self.prefix + '.jsonl', 'w').close()
+
+    def _reset_move(self):
+        self.expanded = defaultdict(int)
+        self.generated = defaultdict(int)
+        self.pruned = defaultdict(int)
+        self.evaluations = 0
+        self.evaluation_time = 0.0
+        self.generation_time = 0.0
+        # id(state) -> (state, ply, stack) of the states generated this move
+        self.nodes = {}
+
+    def instrument(self, agent):
+        """
+        Replaces the agent's get_action and evaluation_function with recording
+        versions, and gives it a final method that writes the flame graph.
+        """
+        agent.get_action = self._wrap_get_action(agent.get_action)
+        agent.evaluation_function = self._wrap_evaluation(agent.evaluation_function)
+        agent.final = self.final
+
+    def _wrap_get_action(self, get_action):
+        def timed_get_action(state):
+            state_class = type(state)
+            expand = state_class.expand
+            state_class.expand = self._wrap_expand(expand)
+            start = time.perf_counter()
+            try:
+                return get_action(state)
+            finally:
+                wall_time = time.perf_counter() - start
+                state_class.expand = expand
+                self._finish_move(wall_time)
+
+        return timed_get_action
+
+    def _node(self, state):
+        """
+        The ply and flame graph stack of a state generated during this move;
+        the root and unknown states are at ply 0 under the agent's name.
+        """
+        _, ply, stack = self.nodes.get(id(state), (None, 0, self.agent_name))
+        return ply, stack
+
+    def _wrap_expand(self, expand):
+        stats = self
+
+        def counted_expand(state, agent_index=0):
+            ply, stack = stats._node(state)
+            # An expanded state is no longer a leaf, so it need not be kept
+            stats.nodes.pop(id(state), None)
+            frame = '%s;ply_%d_agent_%d' % (stack, ply, agent_index)
+            # expand is given the legal actions it would compute anyway,
+            # so counting the pruned successors costs nothing
+            legal = state.get_legal_actions(agent_index)
+            stats.expanded[ply] += 1
+            yielded = 0
+            successors = expand(state, agent_index, legal)
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        action, successor = next(successors)
+                    except StopIteration:
+                        break
+                    finally:
+                        elapsed = time.perf_counter() - start
+                        stats.generation_time += elapsed
+                        stats.folded[frame + ';generate_successor'] += elapsed
+                    # Keeping the successor keeps its id from being reused
+                    stats.nodes[id(successor)] = (successor, ply + 1, frame)
+                    yielded += 1
+                    stats.generated[ply + 1] += 1
+                    yield action, successor
+            finally:
+                # A search that stops iterating early has pruned the rest
+                stats.pruned[ply + 1] += len(legal) - yielded
+
+        return counted_expand
+
+    def _wrap_evaluation(self, evaluation_function):
+        stats = self
+
+        def timed_evaluation(*args):
+            start = time.perf_counter()
+            try:
+                return evaluation_function(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.evaluations += 1
+                stats.evaluation_time += elapsed
+                ply, stack = stats._node(args[0])
+                stats.folded['%s;ply_%d;evaluation_function' % (stack, ply)] += elapsed
+
+        return timed_evaluation
+
+    def _finish_move(self, wall_time):
+        expanded = sum(self.expanded.values())
+        generated = sum(self.generated.values())
+        pruned = sum(self.pruned.values())
+        record = {
+            'agent': self.agent_name,
+            'move': self.move,
+            'wall_time': wall_time,
+            'nodes_expanded': expanded,
+            'nodes_generated': generated,
+            'expanded_per_ply': dict(sorted(self.expanded.items())),
+            'generated_per_ply': dict(sorted(self.generated.items())),
+            'pruned_per_ply': dict(sorted(self.pruned.items())),
+            'pruned': pruned,
+            'pruning_ratio': pruned / (generated + pruned) if generated + pruned else 0.0,
+            'evaluations': self.evaluations,
+            'evaluation_time': self.evaluation_time,
+            'evaluation_time_share': self.evaluation_time / wall_time if wall_time else 0.0,
+            'effective_branching_factor': generated / expanded if expanded else 0.0,
+        }
+        with open(self.prefix + '.jsonl', 'a') as handle:
+            handle.write(json.dumps(record) + '\n')
+
+        # Whatever was not spent generating or evaluating was spent in the search itself
+        search_time = wall_time - self.generation_time - self.evaluation_time
+        self.folded[self.agent_name + ';search'] += max(0.0, search_time)
+        self.move += 1
+        self._reset_move()
+
+    def final(self, state):
+        """
+        Writes the accumulated collapsed stacks, in microseconds.
+        """
+        self.write_folded()
+
+    def write_folded(self):
+        with open(self.prefix + '.folded', 'w') as handle:
+            for stack, seconds in sorted(self.folded.items()):
+                microseconds = int(round(seconds * 1e6))
+                if microseconds > 0:
+                    handle.write('%s %d\n' % (stack, microseconds))
@@ -15,7 +15,8 @@ Then we implement various functions for doing logical inference:
     tt_entails       Say if a statement is entailed by a KB
     pl_resolution    Do resolution on propositional sentences
     dpll_satisfiable See if a propositional sentence is satisfiable
-    WalkSAT          (not yet implemented)
+    cdcl_satisfiable The same, with a clause-learning solver on int clauses
+    WalkSAT          Local search for a model
 
 And a few other functions:
 
@@ -24,7 +25,7 @@ And a few other functions:
     diff, simp       Symbolic differentiation and simplification
 """
 
-import itertools, re
+import functools, heapq, itertools, re, time, weakref
 #import agents
 from utils import *
 
@@ -65,30 +66,183 @@ class KB:
 
 
 class PropKB(KB):
-    "A KB for propositional logic. Inefficient, with no indexing."
-
-    def __init__(self, sentence=None):
+    """A KB for propositional logic.  The clauses are also kept, as int
+    clauses, in a CDCLSolver that lives as long as the KB: tell adds to it,
+    and queries are solved under assumptions, so the symbol map and the
+    learned clauses carry over from one query to the next.  Retracting
+    discards the solver (its learned clauses may depend on what was
+    retracted) and the next query builds a new one.  cnf_method is passed
+    to to_cnf for every sentence told, retracted or asked."""
+
+    def __init__(self, sentence=None, cnf_method='distribute'):
         self.clauses = set()
+        self.cnf_method = cnf_method
+        self.store = ClauseStore()
+        self.solver = None   ## Built by the first query
+        self.solvers_built = 0
+        self.version = 0     ## Changes whenever the clauses change
+        self.last_model = None
+        self._int_clauses = (None, [])
+        self.guards = {}     ## Guard symbol ids, one per kind of query
         if sentence:
             self.tell(sentence)
 
     def tell(self, sentence):
         "Add the sentence's clauses to the KB."
-        conjs = conjuncts(to_cnf(sentence))
+        conjs = conjuncts(to_cnf(sentence, self.cnf_method))
         for conj in conjs:
             if (not conj in self.clauses): # Don't add duplicate clauses (but not checking logical equivalence)
                 self.clauses.add(conj)
+                self.version += 1
+                if self.solver is not None:
+                    literals = self.store.clause(conj)
+                    if literals is not None:
+                        self.solver.add_clause(literals)
 
     def ask_generator(self, query):
         "Yield the empty substitution if KB implies query; else nothing."
-        if tt_entails(Expr('&', *self.clauses), query):
+        if not self.consistent_with(~expr(query)):
             yield {}
 
+    def consistent_with(self, sentence, precheck_flips=0):
+        """Is the KB together with sentence satisfiable?  The KB entails a
+        query exactly when it is not consistent with the query's negation.
+        Unit clauses of the sentence become assumptions; any longer clauses
+        are added guarded by a symbol that is assumed for this call, and
+        then retired from the solver so the next call can reuse it.  With
+        precheck_flips, walksat first gets that many flips, starting from
+        the last model found, and a model it finds answers True without
+        calling the exact solver (unless the KB has an empty clause).
+        >>> kb = PropKB(expr('(B11 <=> (P12 | P21)) & ~B11'))
+        >>> kb.consistent_with(expr('P12'))
+        False
+        >>> kb.consistent_with(expr('P13 | ~P21'))
+        True
+        >>> kb.consistent_with(expr('P31 | P13'), precheck_flips=100)
+        True
+        >>> kb.tell(expr('FALSE'))
+        >>> kb.consistent_with(expr('P31 | P13'), precheck_flips=100)
+        False
+        """
+        solver = self.live_solver()
+        assumptions, guarded = [], []
+        for c in conjuncts(to_cnf(sentence, self.cnf_method)):
+            literals = self.store.clause(c)
+            if literals is None:
+                continue
+            elif len(literals) == 0:
+                return False
+            elif len(literals) == 1:
+                assumptions.append(literals[0])
+            else:
+                guarded.append(literals)
+        if precheck_flips and () not in self.int_clauses():
+            clauses = self.int_clauses() + [(l,) for l in assumptions] + guarded
+            model = walksat(clauses, len(self.store.symbols) - 1,
+                            max_flips=precheck_flips, model=self.last_model)
+            if model is not None:
+                self.last_model = model
+                return True
+        if guarded:
+            guard = self.guard('_Query')
+            for literals in guarded:
+                solver.add_clause(literals + (-guard,))
+            assumptions.append(guard)
+        result = solver.solve(assumptions)
+        if result:
+            self.last_model = solver.model
+        if guarded:
+            solver.retire(guard)
+        return result
+
+    def guard(self, prefix):
+        """The symbol id that guards the temporary clauses of one kind of
+        query, interned once per KB."""
+        if prefix not in self.guards:
+            self.guards[prefix] = self.store.symbol_id(self.store.new_symbol(prefix))
+        return self.guards[prefix]
+
+    def int_clauses(self):
+        "The KB's clauses as int clauses (cached until the KB changes)."
+        if self._int_clauses[0] != self.version:
+            clauses = [self.store.clause(c) for c in self.clauses]
+            self._int_clauses = (self.version, [c for c in clauses if c is not None])
+        return self._int_clauses[1]
+
+    def ask_literals(self, literals):
+        """Answer many literal queries with one backbone computation.
+        Return three sets: the literals the KB entails, those whose
+        negation it entails, and the rest.  One model is found first; a
+        symbol can then only be entailed with its value in that model.
+        The remaining candidates are probed together, by asking for a
+        model that flips at least one of them (with the flipped values
+        preferred when branching): every candidate that changes is ruled
+        out, and once no flip is possible all the remaining candidates are
+        in the backbone, and are added to the solver as unit clauses.  An
+        inconsistent KB entails every literal and its negation.
+        >>> kb = PropKB(expr('(B11 <=> (P12 | P21)) & ~B11 & (B21 <=> (P11 | P22 | P31)) & B21'))
+        >>> entailed, refuted, unknown = kb.ask_literals(map(expr, ['P12', '~P21', 'P22', 'B11']))
+        >>> ppset(entailed), ppset(refuted), ppset(unknown)
+        set([~P21])
+        set([B11, P12])
+        set([P22])
+        (None, None, None)
+        """
+        literals = [expr(l) for l in literals]
+        solver = self.live_solver()
+        ids = [self.store.literal(l) for l in literals]
+        solver.new_vars(len(self.store.symbols) - 1)
+        if not solver.solve():
+            return set(literals), set(literals), set()
+        model = solver.model
+        candidates = set(abs(i) for i in ids)
+        guard = self.guard('_Backbone')
+        while candidates:
+            solver.add_clause([-v if model[v] else v for v in candidates] + [-guard])
+            for v in candidates:
+                solver.polarity[v] = not model[v]
+            flipped = solver.solve([guard]) and solver.model
+            solver.retire(guard)
+            if not flipped:
+                break
+            candidates = set(v for v in candidates if flipped[v] == model[v])
+        backbone = dict((v, model[v]) for v in candidates)
+        for v in candidates:
+            solver.add_clause([v if model[v] else -v])
+        entailed, refuted, unknown = set(), set(), set()
+        for l, i in zip(literals, ids):
+            if abs(i) not in backbone:
+                unknown.add(l)
+            elif backbone[abs(i)] == (i > 0):
+                entailed.add(l)
+            else:
+                refuted.add(l)
+        return entailed, refuted, unknown
+
+    def live_solver(self):
+        "The solver holding the current clauses, building it if need be."
+        if self.solver is None:
+            self.solver = CDCLSolver()
+            self.solvers_built += 1
+            for c in self.clauses:
+                literals = self.store.clause(c)
+                if literals is not None:
+                    self.solver.add_clause(literals)
+        return self.solver
+
     def retract(self, sentence):
-        "Remove the sentence's clauses from the KB."
-        for c in conjuncts(to_cnf(sentence)):
+        """Remove the sentence's clauses from the KB.  Tseitin definitions
+        are left in place: other sentences may share them, and on their own
+        they do not constrain the other symbols."""
+        if self.cnf_method == 'tseitin':
+            clauses = tseitin_clauses(expr(sentence))[0]
+        else:
+            clauses = conjuncts(to_cnf(sentence))
+        for c in clauses:
             if c in self.clauses:
                 self.clauses.remove(c)
+                self.version += 1
+                self.solver = None
 
 #______________________________________________________________________________
 
@@ -119,7 +273,7 @@ def KB_AgentProgram(KB):
 class Expr:
     """A symbolic mathematical expression.  We use this class for logical
     expressions, and for terms within logical expressions. In general, an
-    Expr has an op (operator) and a list of args.  The op can be:
+    Expr has an op (operator) and a tuple of args.  The op can be:
       Null-ary (no args) op:
         A number, representing the number itself.  (e.g. Expr(42) => 42)
         A symbol, representing a variable or constant (e.g. Expr('F') => F)
@@ -160,13 +314,51 @@ class Expr:
     1 doesn't know how to add an Expr.  (Adding an __radd__ method to Expr
     wouldn't help, because int.__add__ is still called first.) Therefore,
     you should use Expr(1) + x instead, or ONE + x, or expr('1 + x').
+
+    Exprs are hash-consed: constructing an Expr that is structurally equal
+    to one that already exists returns the existing object.  So Exprs are
+    immutable (args is a tuple), == is an identity test, the hash is
+    computed once, and values derived from an Expr (such as its CNF or its
+    symbols) can be cached on it with memo().
     """
 
-    def __init__(self, op, *args):
+    __slots__ = ('op', 'args', '_hash', '_memo', '__weakref__')
+
+    ## (op, args) -> Expr, for every Expr that is still in use
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, op, *args):
         "Op is a string or number; args are Exprs (or are coerced to Exprs)."
         assert isinstance(op, str) or (isnumber(op) and not args)
-        self.op = num_or_str(op)
-        self.args = list(map(expr, args)) ## Coerce args to Exprs
+        args = tuple(map(expr, args)) ## Coerce args to Exprs
+        ## An op that is already canonical finds its Expr without num_or_str
+        self = cls._interned.get((op, args))
+        if self is not None:
+            return self
+        op = num_or_str(op)
+        key = (op, args)
+        self = cls._interned.get(key)
+        if self is None:
+            self = object.__new__(cls)
+            object.__setattr__(self, 'op', op)
+            object.__setattr__(self, 'args', args)
+            object.__setattr__(self, '_hash', hash(key))
+            object.__setattr__(self, '_memo', None)
+            cls._interned[key] = self
+        return self
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Exprs are immutable")
+
+    def __reduce__(self):
+        "Unpickling (and copying) goes through Expr() so it is interned too."
+        return (Expr, (self.op,) + self.args)
+
+    def memo(self):
+        "A dict for caching values computed from this Expr."
+        if self._memo is None:
+            object.__setattr__(self, '_memo', {})
+        return self._memo
 
     def __call__(self, *args):
         """Self must be a symbol with no args, such as Expr('F').  Create a new
@@ -186,16 +378,16 @@ class Expr:
             return '(%s)' % (' '+self.op+' ').join(map(repr, self.args))
 
     def __eq__(self, other):
-        """x and y are equal iff their ops and args are equal."""
-        return (other is self) or (isinstance(other, Expr)
-            and self.op == other.op and self.args == other.args)
+        """x and y are equal iff their ops and args are equal, and since
+        Exprs are hash-consed that means they are the same object."""
+        return other is self
 
     def __ne__(self, other):
-        return not self.__eq__(other)
+        return other is not self
 
     def __hash__(self):
         "Need a hash method so Exprs can live in dicts."
-        return hash(self.op) ^ hash(tuple(self.args))
+        return self._hash
 
     # See http://www.python.org/doc/current/lib/module-operator.html
     # Not implemented: not, abs, pos, concat, contains, *item, *slice
@@ -237,13 +429,104 @@ def expr(s):
     """
     if isinstance(s, Expr): return s
     if isnumber(s): return Expr(s)
-    ## Replace the alternative spellings of operators with canonical spellings
-    s = s.replace('==>', '>>').replace('<==', '<<')
-    s = s.replace('<=>', '%').replace('=/=', '^')
-    ## Replace a symbol or number, such as 'P' with 'Expr("P")'
-    s = re.sub(r'([a-zA-Z0-9_.]+)', r'Expr("\1")', s)
-    ## Now eval the string.  (A security hole; do not use with an adversary.)
-    return eval(s, {'Expr':Expr})
+    return parse_expr(s)
+
+## Binary operators: token -> (precedence, op).  These are Python's
+## precedences, so that expr parses a string just as the old
+## eval-based expr did ('<=>' is at the level of '%', its old spelling).
+_binary_ops = {'|': (1, '|'), '^': (2, '^'), '=/=': (2, '^'), '&': (3, '&'),
+               '<<': (4, '<<'), '<==': (4, '<<'), '>>': (4, '>>'),
+               '==>': (4, '>>'), '+': (5, '+'), '-': (5, '-'),
+               '*': (6, '*'), '/': (6, '/'), '%': (6, '<=>'), '<=>': (6, '<=>')}
+_comparison_ops = ('<', '<=', '>=', '>')
+_expr_token = re.compile(r'\s*(==>|<==|<=>|=/=|\*\*|<<|>>|<=|>=|[a-zA-Z0-9_.]+|\S)')
+
+@functools.lru_cache(maxsize=4096)
+def parse_expr(s):
+    """Parse the string s for expr, by precedence climbing; a symbol or
+    number such as 'P' or '2' becomes Expr('P') or Expr(2).  Exprs are
+    immutable, so the results of recent strings are cached.
+    >>> parse_expr('~W3_4 | (P ==> Q(x, 2) <=> R)')
+    (~W3_4 | (P >> (Q(x, 2) <=> R)))
+    """
+    tokens = _expr_token.findall(s)
+    tokens.append('')
+    i = 0
+
+    def error(message):
+        raise SyntaxError('%s in expression %r' % (message, s))
+
+    def comparison():
+        nonlocal i
+        left = binary(1)
+        if tokens[i] in _comparison_ops:
+            op = tokens[i]
+            i += 1
+            left = Expr(op, left, binary(1))
+            if tokens[i] in _comparison_ops:
+                error('Chained comparison')
+        return left
+
+    def binary(min_precedence):
+        nonlocal i
+        left = unary()
+        while tokens[i] in _binary_ops:
+            precedence, op = _binary_ops[tokens[i]]
+            if precedence < min_precedence:
+                break
+            i += 1
+            left = Expr(op, left, binary(precedence + 1))
+        return left
+
+    def unary():
+        nonlocal i
+        if tokens[i] in ('~', '-'):
+            op = tokens[i]
+            i += 1
+            return Expr(op, unary())
+        base = postfix()
+        if tokens[i] == '**': ## Right associative, and binds tighter than
+            i += 1            ## a unary operator on its left only
+            return Expr('**', base, unary())
+        return base
+
+    def postfix():
+        nonlocal i
+        result = primary()
+        while tokens[i] == '(':
+            i += 1
+            args = []
+            while tokens[i] != ')':
+                args.append(comparison())
+                if tokens[i] == ',':
+                    i += 1
+                elif tokens[i] != ')':
+                    error("Expected ',' or ')'")
+            i += 1
+            if not (is_symbol(result.op) and not result.args):
+                error('%s can not be applied' % result)
+            result = result(*args)
+        return result
+
+    def primary():
+        nonlocal i
+        token = tokens[i]
+        i += 1
+        if token == '(':
+            result = comparison()
+            if tokens[i] != ')':
+                error("Expected ')'")
+            i += 1
+            return result
+        elif token and (token[0].isalnum() or token[0] in '_.'):
+            return Expr(token)
+        else:
+            error('Unexpected %r' % (token or 'end'))
+
+    result = comparison()
+    if tokens[i]:
+        error('Unexpected %r' % tokens[i])
+    return result
 
 def is_symbol(s):
     "A string s is a symbol if it starts with an alphabetic char."
@@ -318,15 +601,23 @@ A, B, C, D, E, F, G, P, Q, x, y, z  = list(map(Expr, 'ABCDEFGPQxyz'))
 
 def tt_entails(kb, alpha):
     """Does kb entail the sentence alpha? Use truth tables. For propositional
-    kb's and sentences. [Fig. 7.10]
+    kb's and sentences. [Fig. 7.10]  Rather than checking the models one by
+    one as tt_check_all does, kb & ~alpha is evaluated over a whole table of
+    models at once (see truth_tables); kb entails alpha iff no model is left.
     >>> tt_entails(expr('P & Q'), expr('Q'))
     True
+    >>> chain = associate('&', [Expr('P%d' % i) >> Expr('P%d' % (i + 1))
+    ...                         for i in range(24)])
+    >>> tt_entails(chain & Expr('P0'), Expr('P24')), tt_entails(chain, Expr('P24'))
+    (True, False)
     """
     assert not variables(alpha)
-    return tt_check_all(kb, alpha, prop_symbols(kb & alpha), {})
+    symbols = prop_symbols(kb & alpha)
+    return not some(bool, truth_tables(kb & ~alpha, symbols))
 
 def tt_check_all(kb, alpha, symbols, model):
-    "Auxiliary routine to implement tt_entails."
+    """The model by model check of [Fig. 7.10], which tt_entails no longer
+    uses: one pl_true per model and symbol."""
     if not symbols:
         if pl_true(kb, model):
             result = pl_true(alpha, model)
@@ -339,15 +630,93 @@ def tt_check_all(kb, alpha, symbols, model):
         return (tt_check_all(kb, alpha, rest, extend(model, P, True)) and
                 tt_check_all(kb, alpha, rest, extend(model, P, False)))
 
+## truth_tables works on blocks of 2**TT_BLOCK_SYMBOLS models at a time
+TT_BLOCK_SYMBOLS = 20
+
+def truth_tables(exp, symbols):
+    """Generate the truth table of exp over the models of symbols, as ints
+    with bit m set iff exp is true in model m.  Model m makes symbols[i]
+    true iff bit i of m is set.  Each symbol is a column of bits, so &, |,
+    ~ and so on are done for every model in one int operation, and the
+    expression is walked once per table.  More than TT_BLOCK_SYMBOLS
+    symbols give one table per assignment to the rest, all 0s or all 1s.
+    >>> [bin(t) for t in truth_tables(expr('P & ~Q | (P <=> Q)'), [P, Q])]
+    ['0b1011']
+    """
+    n = len(symbols)
+    k = min(n, TT_BLOCK_SYMBOLS)
+    full = (1 << (1 << k)) - 1
+    values = dict((symbols[i], truth_table_column(i, k)) for i in range(k))
+    for high in range(1 << (n - k)):
+        for j in range(n - k):
+            values[symbols[k + j]] = full if (high >> j) & 1 else 0
+        yield truth_table(exp, values, full, {})
+
+_columns = {}
+
+def truth_table_column(i, k):
+    "The truth table of symbol i over 2**k models: blocks of 2**i 0s then 1s."
+    column = _columns.get((i, k))
+    if column is None:
+        width = 2 << i
+        column = ((1 << (1 << i)) - 1) << (1 << i)
+        while width < (1 << k):
+            column |= column << width
+            width <<= 1
+        column = _columns[i, k] = column
+    return column
+
+def truth_table(exp, values, full, cache):
+    """The truth table of exp, given the tables of its symbols in values;
+    full is the table that is all 1s, and cache holds the tables of the
+    subexpressions seen so far (shared subexpressions are done once)."""
+    table = cache.get(exp)
+    if table is not None:
+        return table
+    op, args = exp.op, exp.args
+    if exp == TRUE:
+        table = full
+    elif exp == FALSE:
+        table = 0
+    elif is_prop_symbol(op):
+        table = values[exp]
+    elif op == '~':
+        table = full ^ truth_table(args[0], values, full, cache)
+    elif op == '&':
+        table = full
+        for arg in args:
+            table &= truth_table(arg, values, full, cache)
+    elif op == '|':
+        table = 0
+        for arg in args:
+            table |= truth_table(arg, values, full, cache)
+    elif op in ('>>', '<<', '<=>', '^') and len(args) == 2:
+        p = truth_table(args[0], values, full, cache)
+        q = truth_table(args[1], values, full, cache)
+        if op == '>>':
+            table = (full ^ p) | q
+        elif op == '<<':
+            table = p | (full ^ q)
+        elif op == '<=>':
+            table = full ^ p ^ q
+        else:
+            table = p ^ q
+    else:
+        raise ValueError("illegal operator in logic expression" + str(exp))
+    cache[exp] = table
+    return table
+
 def prop_symbols(x):
     "Return a list of all propositional symbols in x."
     if not isinstance(x, Expr):
         return []
     elif is_prop_symbol(x.op):
         return [x]
-    else:
-        return list(set(symbol for arg in x.args
-                        for symbol in prop_symbols(arg)))
+    memo = x.memo()
+    if 'prop_symbols' not in memo:
+        memo['prop_symbols'] = list(set(symbol for arg in x.args
+                                        for symbol in prop_symbols(arg)))
+    return list(memo['prop_symbols'])
 
 def tt_true(alpha):
     """Is the propositional sentence alpha a tautology? (alpha will be
@@ -407,9 +776,12 @@ def pl_true(exp, model={}):
 
 ## Convert to Conjunctive Normal Form (CNF)
 
-def to_cnf(s):
+def to_cnf(s, method='distribute'):
     """Convert a propositional logical sentence s to conjunctive normal form.
     That is, to the form ((A | ~B | ...) & (B | C | ...) & ...) [p. 253]
+    The default method distributes & over |, which gives an equivalent
+    sentence but can grow exponentially.  method='tseitin' gives a sentence
+    of linear size that is only equisatisfiable: see tseitin_clauses.
     >>> to_cnf("~(B|C)")
     (~B & ~C)
     >>> to_cnf("B <=> (P1|P2)")
@@ -422,9 +794,115 @@ def to_cnf(s):
     ((D | A | B | C) & (E | A | B | C))
     """
     if isinstance(s, str): s = expr(s)
-    s = eliminate_implications(s) # Steps 1, 2 from p. 253
-    s = move_not_inwards(s) # Step 3
-    return distribute_and_over_or(s) # Step 4
+    memo = s.memo()
+    if method == 'tseitin':
+        if 'tseitin' not in memo:
+            clauses, definitions = tseitin_clauses(s)
+            memo['tseitin'] = associate('&', clauses + definitions)
+        return memo['tseitin']
+    assert method == 'distribute', "Unknown CNF method " + str(method)
+    if 'cnf' not in memo:
+        cnf = eliminate_implications(s) # Steps 1, 2 from p. 253
+        cnf = move_not_inwards(cnf) # Step 3
+        memo['cnf'] = distribute_and_over_or(cnf) # Step 4
+    return memo['cnf']
+
+TSEITIN_PREFIX = 'Tseitin_'
+tseitin_counter = itertools.count(1)
+
+def is_tseitin_symbol(s):
+    "Is s an auxiliary symbol made by to_cnf(s, method='tseitin')?"
+    return isinstance(s.op, str) and s.op.startswith(TSEITIN_PREFIX)
+
+def tseitin_clauses(s):
+    """Tseitin's transformation.  Return (clauses, definitions): two lists of
+    clauses whose conjunction is satisfiable iff s is.  Every compound
+    subsentence below the top-level clauses is named by an auxiliary symbol,
+    and definitions holds the clauses making the symbol equivalent to it, so
+    the output grows linearly with s.  A subsentence is always named by the
+    same symbol (the name is cached on the hash-consed Expr), so sentences
+    that share subsentences share their definitions.  The clauses only
+    mention auxiliary symbols through those definitions, so the result
+    entails exactly the same sentences over the symbols of s; but it must
+    not be negated -- negate s and convert that instead.
+    >>> clauses, definitions = tseitin_clauses(expr('A | (B & C)'))
+    >>> len(clauses), len(definitions)
+    (1, 3)
+    >>> tt_entails(Expr('&', *(clauses + definitions)), expr('A | B'))
+    True
+
+    Operands that are negative literals stay literals in the definitions:
+    >>> s = expr('C ^ ((C >> C) <=> (~B >> E))')
+    >>> model = cdcl_satisfiable(s, 'tseitin')
+    >>> expr('~B') in model, pl_true(s, model)
+    (False, True)
+    """
+    clauses, definitions = [], []
+    named = {}
+
+    def literal(n):
+        "A literal for n, defining auxiliary symbols as needed."
+        if n.op == '~':
+            return negate(literal(n.args[0]))
+        if not n.args or is_symbol(n.op):
+            return n
+        if n in named:
+            return named[n]
+        args = [literal(a) for a in n.args]
+        memo = n.memo()
+        if 'tseitin_symbol' not in memo:
+            memo['tseitin_symbol'] = Expr(TSEITIN_PREFIX + str(next(tseitin_counter)))
+        x = named[n] = memo['tseitin_symbol']
+        a, b = args[0], args[-1]
+        ## Operands may be negative literals: negate(), not ~, keeps them literals
+        if n.op == '&':
+            new = [negate(x) | arg for arg in args] + [Expr('|', x, *map(negate, args))]
+        elif n.op == '|':
+            new = [x | negate(arg) for arg in args] + [Expr('|', negate(x), *args)]
+        elif n.op in ('>>', '<<'):
+            if n.op == '<<': a, b = b, a
+            new = [negate(x) | negate(a) | b, x | a, x | negate(b)]
+        elif n.op in ('<=>', '^'):
+            if n.op == '^': b = negate(b)
+            new = [negate(x) | negate(a) | b, negate(x) | a | negate(b),
+                   x | a | b, x | negate(a) | negate(b)]
+        else:
+            raise ValueError("illegal operator in logic expression" + str(n))
+        definitions.extend(new)
+        return x
+
+    def top_disjuncts(c):
+        "The disjuncts of c, looking through |, >>, << and ~ of &."
+        if c.op == '|':
+            return [d for arg in c.args for d in top_disjuncts(arg)]
+        if c.op == '>>':
+            return top_disjuncts(negate(c.args[0])) + top_disjuncts(c.args[1])
+        if c.op == '<<':
+            return top_disjuncts(c.args[0]) + top_disjuncts(negate(c.args[1]))
+        if c.op == '~' and c.args[0].op == '&':
+            return [d for arg in c.args[0].args for d in top_disjuncts(negate(arg))]
+        if c.op == '~' and c.args[0].op == '~':
+            return top_disjuncts(c.args[0].args[0])
+        return [c]
+
+    todo = [s]
+    while todo:
+        c = todo.pop()
+        if c.op == '&':
+            todo.extend(reversed(c.args))
+        elif c.op == '~' and c.args[0].op == '|':
+            todo.extend(reversed([negate(arg) for arg in c.args[0].args]))
+        elif c.op == '~' and c.args[0].op == '~':
+            todo.append(c.args[0].args[0])
+        elif c.op == '<=>':
+            todo.extend([c.args[1] | ~c.args[0], c.args[0] | ~c.args[1]])
+        else:
+            clauses.append(associate('|', [literal(d) for d in top_disjuncts(c)]))
+    return clauses, definitions
+
+def negate(s):
+    "~s, without double negation."
+    return s.args[0] if s.op == '~' else ~s
 
 def eliminate_implications(s):
     """Change >>, <<, and <=> into &, |, and ~. That is, return an Expr
@@ -527,6 +1005,30 @@ def dissociate(op, args):
     collect(args)
     return result
 
+def Lit(symbol, *indices):
+    """The proposition symbol with the indices appended (joined by '_'),
+    built without parsing; a leading '~' negates it.
+    >>> Lit('P', 3, 4), Lit('~W', 1, 0)
+    (P3_4, ~W1_0)
+    """
+    if symbol[:1] == '~':
+        return ~Lit(symbol[1:], *indices)
+    return Expr(symbol + '_'.join(map(str, indices)))
+
+def Or(*disjuncts):
+    """The disjunction of the arguments, flattened.
+    >>> Or(Lit('P', 1, 2), Lit('P', 2, 1), P)
+    (P1_2 | P2_1 | P)
+    """
+    return associate('|', disjuncts)
+
+def And(*conjuncts):
+    """The conjunction of the arguments, flattened.
+    >>> And(A, B | C, D & E)
+    (A & (B | C) & D & E)
+    """
+    return associate('&', conjuncts)
+
 def conjuncts(s):
     """Return a list of the conjuncts in the sentence s.
     >>> conjuncts(A & B)
@@ -546,22 +1048,189 @@ def disjuncts(s):
     return dissociate('|', [s])
 
 #______________________________________________________________________________
+# Propositional symbols interned as ints, for the clause-based solvers below.
+
+class ClauseStore:
+    """Interns propositional symbols as the ints 1, 2, ... and keeps clauses
+    as tuples of int literals, where -i stands for the negation of symbol i
+    (the DIMACS convention).
+    >>> store = ClauseStore()
+    >>> store.tell(expr('(A | ~B) & (B | C)'))
+    [(1, -2), (2, 3)]
+    >>> store.symbols[1:]
+    [A, B, C]
+    """
 
-def pl_resolution(KB, alpha):
-    "Propositional-logic resolution: say if alpha follows from KB. [Fig. 7.12]"
-    clauses = KB.clauses + conjuncts(to_cnf(~alpha))
-    new = set()
-    while True:
-        n = len(clauses)
-        pairs = [(clauses[i], clauses[j])
-                 for i in range(n) for j in range(i+1, n)]
-        for (ci, cj) in pairs:
-            resolvents = pl_resolve(ci, cj)
-            if FALSE in resolvents: return True
-            new = new.union(set(resolvents))
-        if new.issubset(set(clauses)): return False
-        for c in new:
-            if c not in clauses: clauses.append(c)
+    def __init__(self):
+        self.symbols = [None] ## symbols[i] is the Expr interned as i
+        self.ids = {}         ## Expr -> int
+        self.clauses = []
+        self.auxiliary = set() ## ids of symbols made by new_symbol or Tseitin
+
+    def symbol_id(self, symbol):
+        "Return the int for a symbol, interning it on first use."
+        i = self.ids.get(symbol)
+        if i is None:
+            i = self.ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+            if is_tseitin_symbol(symbol):
+                self.auxiliary.add(i)
+        return i
+
+    def new_symbol(self, prefix):
+        """Return a new symbol that cannot clash with any symbol of a
+        sentence (its name starts with '_'), interned as auxiliary."""
+        symbol = Expr('%s%d' % (prefix, len(self.symbols)))
+        self.auxiliary.add(self.symbol_id(symbol))
+        return symbol
+
+    def literal(self, literal):
+        "Return the int literal for P or ~P."
+        symbol, positive = inspect_literal(literal)
+        i = self.symbol_id(symbol)
+        return i if positive else -i
+
+    def clause(self, clause):
+        """Return a disjunction of literals as a tuple of int literals, or
+        None if the clause is always true.  FALSE disjuncts are dropped."""
+        literals = []
+        for d in disjuncts(clause):
+            if d.op == 'TRUE' or (d.op == '~' and d.args[0].op == 'FALSE'):
+                return None
+            if d.op == 'FALSE' or (d.op == '~' and d.args[0].op == 'TRUE'):
+                continue
+            lit = self.literal(d)
+            if -lit in literals:
+                return None
+            if lit not in literals:
+                literals.append(lit)
+        return tuple(literals)
+
+    def tell(self, sentence, cnf_method='distribute'):
+        "Convert sentence to CNF, store its clauses and return them."
+        added = []
+        for c in conjuncts(to_cnf(sentence, cnf_method)):
+            literals = self.clause(c)
+            if literals is not None:
+                added.append(literals)
+        self.clauses.extend(added)
+        return added
+
+    def to_expr(self, literal):
+        "The Expr for an int literal."
+        symbol = self.symbols[abs(literal)]
+        return symbol if literal > 0 else ~symbol
+
+    def model(self, solver):
+        "The solver's model as a dict from (non-auxiliary) symbols to True/False."
+        return dict((self.symbols[i], solver.value(i))
+                    for i in range(1, len(self.symbols))
+                    if i not in self.auxiliary)
+
+#______________________________________________________________________________
+
+def pl_resolution(KB, alpha, set_of_support=False):
+    """Propositional-logic resolution: say if alpha follows from KB. [Fig. 7.12]
+    The clauses of KB and of ~alpha are interned as sets of int literals
+    (see ClauseStore) and refuted by resolution_refutes, resolving every
+    pair of clauses as the textbook algorithm does.  With set_of_support,
+    only pairs with at least one clause that comes from ~alpha are
+    resolved: this is faster, but only complete when KB is satisfiable,
+    since an inconsistent KB entails everything.
+    >>> pl_resolution(PropKB(A & (A >> B)), B), pl_resolution(PropKB(A | B), B)
+    (True, False)
+    >>> pl_resolution(PropKB(A & (A >> B)), B, set_of_support=True)
+    True
+    >>> inconsistent = PropKB(expr('D & (B ^ B)'))
+    >>> pl_resolution(inconsistent, ~E), pl_resolution(inconsistent, ~E, set_of_support=True)
+    (True, False)
+    """
+    store = ClauseStore()
+    kb = [store.clause(c) for c in KB.clauses]
+    goal = [store.clause(c) for c in conjuncts(to_cnf(~alpha))]
+    kb = [c for c in kb if c is not None]
+    goal = [c for c in goal if c is not None]
+    if set_of_support:
+        return resolution_refutes(kb, goal)
+    return resolution_refutes([], kb + goal)
+
+def resolution_refutes(usable, support):
+    """Can the empty clause be derived from the int clauses usable and
+    support, never resolving two usable clauses with each other?  The
+    given-clause loop takes the shortest waiting clause, resolves it with
+    the clauses already processed (found through an index from each
+    literal to the clauses that contain it, so only complementary partners
+    are tried) and then adds it to them.  A new clause that some kept
+    clause subsumes (is a subset of) is dropped, and it removes the kept
+    clauses it subsumes.
+    >>> resolution_refutes([(1, 2), (-1, 2)], [(-2,)])
+    True
+    >>> resolution_refutes([(1, 2), (-1, 2)], [(-1,)])
+    False
+    """
+    kept = {}       ## id -> clause, as a frozenset of literals
+    occurs = {}     ## literal -> ids of kept clauses containing it
+    processed = {}  ## literal -> ids of processed clauses containing it
+    waiting = []    ## heap of (length, id) of clauses still to process
+    ids = itertools.count()
+
+    def subsumed(clause):
+        for lit in clause:
+            for i in occurs.get(lit, ()):
+                other = kept[i]
+                if len(other) <= len(clause) and other <= clause:
+                    return True
+        return False
+
+    def remove(i):
+        for lit in kept.pop(i):
+            occurs[lit].discard(i)
+            if lit in processed:
+                processed[lit].discard(i)
+
+    def keep(clause, is_processed):
+        "Keep a new clause; return True if it is the empty clause."
+        if not clause:
+            return True
+        if subsumed(clause):
+            return False
+        lit = min(clause, key=lambda lit: len(occurs.get(lit, ())))
+        for i in [i for i in occurs.get(lit, ()) if clause <= kept[i]]:
+            remove(i)
+        i = next(ids)
+        kept[i] = clause
+        for lit in clause:
+            occurs.setdefault(lit, set()).add(i)
+            if is_processed:
+                processed.setdefault(lit, set()).add(i)
+        if not is_processed:
+            heapq.heappush(waiting, (len(clause), i))
+        return False
+
+    for clause in usable:
+        if keep(frozenset(clause), True):
+            return True
+    for clause in support:
+        if keep(frozenset(clause), False):
+            return True
+    while waiting:
+        _, i = heapq.heappop(waiting)
+        given = kept.get(i)
+        if given is None:
+            continue ## Removed by backward subsumption
+        resolvents = []
+        for lit in given:
+            rest = given - {lit}
+            for j in processed.get(-lit, ()):
+                other = kept[j] - {-lit}
+                if not any(-l in other for l in rest):
+                    resolvents.append(rest | other)
+        for lit in given:
+            processed.setdefault(lit, set()).add(i)
+        for clause in resolvents:
+            if keep(clause, False):
+                return True
+    return False
 
 def pl_resolve(ci, cj):
     """Return all clauses that can be obtained by resolving clauses ci and cj.
@@ -582,46 +1251,97 @@ def pl_resolve(ci, cj):
 #______________________________________________________________________________
 
 class PropDefiniteKB(PropKB):
-    "A KB of propositional definite clauses."
+    """A KB of propositional definite clauses.  Clauses are indexed by the
+    symbols in their premise and by their conclusion, and each clause's
+    number of distinct premise symbols is kept, which is what forward
+    chaining needs to run in linear time."""
+
+    def __init__(self, sentence=None):
+        self.premise_index = {}     ## symbol -> clauses with it in the premise
+        self.conclusion_index = {}  ## symbol -> clauses (and facts) concluding it
+        self.premise_count = {}     ## clause -> number of distinct premise symbols
+        self.facts = set()
+        PropKB.__init__(self, sentence)
 
     def tell(self, sentence):
         "Add a definite clause to this KB."
         assert is_definite_clause(sentence), "Must be definite clause"
+        if sentence in self.clauses:
+            return
         self.clauses.add(sentence)
+        self.version += 1
+        premises, conclusion = parse_definite_clause(sentence)
+        self.conclusion_index.setdefault(conclusion, []).append(sentence)
+        if not premises:
+            self.facts.add(sentence)
+            return
+        premises = unique(premises)
+        self.premise_count[sentence] = len(premises)
+        for p in premises:
+            self.premise_index.setdefault(p, []).append(sentence)
 
     def ask_generator(self, query):
         "Yield the empty substitution if KB implies query; else nothing."
-        if pl_fc_entails(self.clauses, query):
+        if pl_fc_entails(self, query):
             yield {}
 
     def retract(self, sentence):
         self.clauses.remove(sentence)
+        self.version += 1
+        premises, conclusion = parse_definite_clause(sentence)
+        self.conclusion_index[conclusion].remove(sentence)
+        if not premises:
+            self.facts.discard(sentence)
+            return
+        del self.premise_count[sentence]
+        for p in unique(premises):
+            self.premise_index[p].remove(sentence)
 
     def clauses_with_premise(self, p):
-        """Return a list of the clauses in KB that have p in their premise.
-        This could be cached away for O(1) speed, but we'll recompute it."""
-        return [c for c in self.clauses
-                if c.op == '>>' and p in conjuncts(c.args[0])]
+        "Return a list of the clauses in KB that have p in their premise."
+        return self.premise_index.get(p, [])
+
+    def clauses_with_conclusion(self, q):
+        "Return a list of the clauses (and facts) in KB that conclude q."
+        return self.conclusion_index.get(q, [])
+
+    def relevant_symbols(self, q):
+        """The symbols q can be derived from (including q), found by
+        chaining backwards through the conclusion index."""
+        relevant, agenda = set([q]), [q]
+        while agenda:
+            for c in self.clauses_with_conclusion(agenda.pop()):
+                if c.op == '>>':
+                    for p in conjuncts(c.args[0]):
+                        if p not in relevant:
+                            relevant.add(p)
+                            agenda.append(p)
+        return relevant
 
 def pl_fc_entails(KB, q):
     """Use forward chaining to see if a PropDefiniteKB entails symbol q.
-    [Fig. 7.15]
+    [Fig. 7.15]  Each clause's count of unsatisfied premises is decremented
+    once per premise, so the run is linear in the size of the KB; clauses
+    that cannot lead to q (see relevant_symbols) are skipped.
     >>> pl_fc_entails(Fig[7,15], expr('Q'))
     True
     """
-    count = dict([(c, len(conjuncts(c.args[0]))) for c in KB.clauses
-                                                 if c.op == '>>'])
-    inferred = DefaultDict(False)
-    agenda = [s for s in KB.clauses if is_prop_symbol(s.op)]
+    relevant = KB.relevant_symbols(q)
+    count = {}
+    inferred = set()
+    agenda = [s for s in KB.facts if s in relevant]
     while agenda:
         p = agenda.pop()
         if p == q: return True
-        if not inferred[p]:
-            inferred[p] = True
+        if p not in inferred:
+            inferred.add(p)
             for c in KB.clauses_with_premise(p):
-                count[c] -= 1
+                conclusion = c.args[1]
+                if conclusion not in relevant:
+                    continue
+                count[c] = count.get(c, KB.premise_count[c]) - 1
                 if count[c] == 0:
-                    agenda.append(c.args[1])
+                    agenda.append(conclusion)
     return False
 
 ## Wumpus World example [Fig. 7.13]
@@ -732,26 +1452,529 @@ def inspect_literal(literal):
         return literal, True
 
 #______________________________________________________________________________
-# Walk-SAT [Fig. 7.18]
+# CDCL-Satisfiable: a conflict-driven solver over ClauseStore's int clauses.
+# Not in the book; dpll above is the algorithm of Fig. 7.17, this is how
+# practical solvers implement it.
+
+def luby(i):
+    """The i-th element (from 0) of the Luby restart sequence.
+    >>> [luby(i) for i in range(15)]
+    [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8]
+    """
+    size, seq = 1, 0
+    while size < i + 1:
+        seq += 1
+        size = 2*size + 1
+    while size - 1 != i:
+        size = (size - 1) >> 1
+        seq -= 1
+        i = i % size
+    return 2 ** seq
+
+
+class CDCLSolver:
+    """A conflict-driven clause learning SAT solver over int literals.
+    Variables are 1..num_vars and -v is the negation of v.  Unit propagation
+    watches two literals per clause, so only clauses watching a literal that
+    just became false are visited.  Each conflict is analysed back to its
+    first unique implication point and the resulting clause is learned.
+    Branching picks the unassigned variable with the highest VSIDS activity,
+    reusing its last value, and the search restarts on the Luby sequence.
+    Clauses can be added between calls to solve, and solve takes a list of
+    assumption literals that hold for that call only; learned clauses are
+    kept across calls.
+    >>> solver = CDCLSolver([[1, 2], [-1, 3], [-2, 3]])
+    >>> solver.solve()
+    True
+    >>> solver.value(3)
+    True
+    >>> solver.solve([-3])
+    False
+    >>> solver.add_clause([-3])
+    False
+    >>> solver.solve()
+    False
+    """
 
-def WalkSAT(clauses, p=0.5, max_flips=10000):
-    ## model is a random assignment of true/false to the symbols in clauses
-    ## See ~/aima1e/print1/manual/knowledge+logic-answers.tex ???
-    model = dict([(s, random.choice([True, False]))
-                 for s in prop_symbols(clauses)])
-    for i in range(max_flips):
-        satisfied, unsatisfied = [], []
+    restart_base = 100   ## conflicts in the first restart interval
+    var_decay = 0.95
+
+    def __init__(self, clauses=(), num_vars=0):
+        self.num_vars = 0
+        self.clauses = []   ## The first two literals of each clause are watched
+        self.watches = {}   ## literal -> indices of the clauses watching it
+        self.values = {}    ## literal -> 1 (true), -1 (false) or 0 (unassigned)
+        self.level = [0]    ## var -> decision level of its assignment
+        self.reason = [None]  ## var -> index of the clause that implied it
+        self.activity = [0.0]
+        self.polarity = [False]
+        self.seen = [False]
+        self.order = []     ## heap of (-activity, var); may hold stale entries
+        self.trail = []     ## assigned literals in assignment order
+        self.trail_lim = [] ## trail length at the start of each decision level
+        self.qhead = 0      ## trail[qhead:] still have to be propagated
+        self.var_inc = 1.0
+        self.ok = True      ## False once the clauses are unsatisfiable
+        self.model = None
+        self.conflicts = self.decisions = self.learned = 0
+        self.new_vars(num_vars)
         for clause in clauses:
-            if_(pl_true(clause, model), satisfied, unsatisfied).append(clause)
-        if not unsatisfied: ## if model satisfies all the clauses
-            return model
-        clause = random.choice(unsatisfied)
-        if probability(p):
-            sym = random.choice(prop_symbols(clause))
+            self.add_clause(clause)
+
+    def new_vars(self, n):
+        "Make sure variables 1..n exist."
+        for var in range(self.num_vars + 1, n + 1):
+            self.values[var] = self.values[-var] = 0
+            self.watches[var] = []
+            self.watches[-var] = []
+            self.level.append(0)
+            self.reason.append(None)
+            self.activity.append(0.0)
+            self.polarity.append(False)
+            self.seen.append(False)
+            heapq.heappush(self.order, (0.0, var))
+        self.num_vars = max(self.num_vars, n)
+
+    def add_clause(self, literals):
+        """Add a clause (a sequence of int literals).  Return False if the
+        clauses have become unsatisfiable."""
+        if not self.ok:
+            return False
+        self.cancel_until(0)
+        self.new_vars(max([abs(lit) for lit in literals] or [0]))
+        values = self.values
+        clause = []
+        for lit in literals:
+            if values[lit] == 1 or -lit in clause:
+                return True   ## Satisfied at level 0, or a tautology
+            if values[lit] == 0 and lit not in clause:
+                clause.append(lit)
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self.enqueue(clause[0], None)
+            self.ok = self.propagate() is None
         else:
-            ## Flip the symbol in clause that maximizes number of sat. clauses
-            raise NotImplementedError
-        model[sym] = not model[sym]
+            self.attach(clause)
+        return self.ok
+
+    def retire(self, guard):
+        """Delete every clause containing -guard, for a variable that is
+        only ever assumed true: the clauses it guarded, and the clauses
+        learned from them, which all contain -guard too.  The guard is
+        left unassigned, ready to guard new clauses.
+        >>> solver = CDCLSolver([[1, 2]])
+        >>> solver.add_clause([-1, -3]), solver.add_clause([-2, -3])
+        (True, True)
+        >>> solver.solve([3])
+        False
+        >>> solver.retire(3)
+        >>> solver.solve([3]), len(solver.clauses)
+        (True, 1)
+        """
+        self.new_vars(guard)
+        self.cancel_until(0)
+        if self.values[guard] != 0:
+            ## -guard was implied at level 0; no clause contains guard, so
+            ## nothing else follows from it
+            self.trail.remove(-guard)
+            self.values[guard] = self.values[-guard] = 0
+            heapq.heappush(self.order, (-self.activity[guard], guard))
+            self.qhead = len(self.trail)
+        kept = [c for c in self.clauses if -guard not in c]
+        if len(kept) == len(self.clauses):
+            return
+        for lit in self.trail:
+            self.reason[abs(lit)] = None  ## Clause indices are about to change
+        self.clauses = []
+        for lit in self.watches:
+            self.watches[lit] = []
+        for clause in kept:
+            self.attach(clause)
+
+    def attach(self, clause):
+        index = len(self.clauses)
+        self.clauses.append(clause)
+        self.watches[clause[0]].append(index)
+        self.watches[clause[1]].append(index)
+        return index
+
+    def value(self, var):
+        "The value of var in the last model found, or None."
+        if self.model is None or var > self.num_vars:
+            return None
+        return self.model[var]
+
+    def enqueue(self, lit, reason):
+        self.values[lit] = 1
+        self.values[-lit] = -1
+        var = abs(lit)
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        """Propagate the assignments on the trail.  Return the index of a
+        conflicting clause, or None."""
+        values, watches, clauses = self.values, self.watches, self.clauses
+        trail, level, reason = self.trail, self.level, self.reason
+        current = len(self.trail_lim)
+        qhead = self.qhead
+        while qhead < len(trail):
+            false_lit = -trail[qhead]
+            qhead += 1
+            ws = watches[false_lit]
+            i = j = 0
+            n = len(ws)
+            while i < n:
+                ci = ws[i]
+                i += 1
+                c = clauses[ci]
+                if c[0] == false_lit:  ## Keep the false literal in c[1]
+                    c[0] = c[1]
+                    c[1] = false_lit
+                first = c[0]
+                if values[first] == 1:
+                    ws[j] = ci
+                    j += 1
+                    continue
+                for k in range(2, len(c)):
+                    lit = c[k]
+                    if values[lit] != -1:  ## Found a new literal to watch
+                        c[1] = lit
+                        c[k] = false_lit
+                        watches[lit].append(ci)
+                        break
+                else:
+                    ws[j] = ci
+                    j += 1
+                    if values[first] == -1:  ## Conflict
+                        while i < n:
+                            ws[j] = ws[i]
+                            j += 1
+                            i += 1
+                        del ws[j:]
+                        self.qhead = len(trail)
+                        return ci
+                    ## Unit: first is implied by c
+                    values[first] = 1
+                    values[-first] = -1
+                    var = abs(first)
+                    level[var] = current
+                    reason[var] = ci
+                    trail.append(first)
+            del ws[j:]
+        self.qhead = qhead
+        return None
+
+    def analyze(self, conflict):
+        """Derive the first-UIP clause from a conflicting clause.  Return
+        the clause, asserting literal first, and the level to go back to."""
+        seen, level, reason = self.seen, self.level, self.reason
+        trail, clauses = self.trail, self.clauses
+        current = len(self.trail_lim)
+        learnt = [0]
+        pending = 0   ## literals of the current level still to be resolved
+        lit = 0
+        index = len(trail) - 1
+        clause = clauses[conflict]
+        while True:
+            for q in (clause if lit == 0 else clause[1:]):
+                var = abs(q)
+                if not seen[var] and level[var] > 0:
+                    seen[var] = True
+                    self.bump(var)
+                    if level[var] >= current:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            while not seen[abs(trail[index])]:
+                index -= 1
+            lit = trail[index]
+            index -= 1
+            var = abs(lit)
+            seen[var] = False
+            pending -= 1
+            if pending == 0:
+                break
+            clause = clauses[reason[var]]
+        learnt[0] = -lit
+
+        ## Drop literals implied by other literals of the clause
+        kept = [learnt[0]]
+        for q in learnt[1:]:
+            r = reason[abs(q)]
+            if r is None or not all(seen[abs(p)] or level[abs(p)] == 0
+                                    for p in clauses[r][1:]):
+                kept.append(q)
+        for q in learnt[1:]:
+            seen[abs(q)] = False
+        learnt = kept
+
+        if len(learnt) == 1:
+            return learnt, 0
+        best = 1
+        for i in range(2, len(learnt)):
+            if level[abs(learnt[i])] > level[abs(learnt[best])]:
+                best = i
+        learnt[1], learnt[best] = learnt[best], learnt[1]
+        return learnt, level[abs(learnt[1])]
+
+    def bump(self, var):
+        activity = self.activity
+        activity[var] += self.var_inc
+        if activity[var] > 1e100:
+            for v in range(1, self.num_vars + 1):
+                activity[v] *= 1e-100
+            self.var_inc *= 1e-100
+            self.rebuild_order()
+
+    def rebuild_order(self):
+        values, activity = self.values, self.activity
+        self.order = [(-activity[v], v) for v in range(1, self.num_vars + 1)
+                      if values[v] == 0]
+        heapq.heapify(self.order)
+
+    def cancel_until(self, level):
+        "Undo all assignments above the given decision level."
+        if len(self.trail_lim) > level:
+            values, reason, polarity = self.values, self.reason, self.polarity
+            activity, order = self.activity, self.order
+            stop = self.trail_lim[level]
+            for lit in reversed(self.trail[stop:]):
+                var = abs(lit)
+                values[var] = values[-var] = 0
+                reason[var] = None
+                polarity[var] = lit > 0  ## Phase saving
+                heapq.heappush(order, (-activity[var], var))
+            del self.trail[stop:]
+            del self.trail_lim[level:]
+            self.qhead = stop
+            if len(order) > 4 * self.num_vars + 100:
+                self.rebuild_order()
+
+    def pick_branch(self):
+        "The next decision literal, or None if every variable is assigned."
+        values, order = self.values, self.order
+        while order:
+            var = heapq.heappop(order)[1]
+            if values[var] == 0:
+                return var if self.polarity[var] else -var
+        return None
+
+    def solve(self, assumptions=()):
+        """Return True if the clauses and the assumption literals are
+        satisfiable together, and remember the model for value()."""
+        self.model = None
+        if not self.ok:
+            return False
+        assumptions = list(assumptions)
+        self.new_vars(max([abs(lit) for lit in assumptions] or [0]))
+        self.cancel_until(0)
+        restarts = 0
+        while True:
+            status = self.search(self.restart_base * luby(restarts), assumptions)
+            restarts += 1
+            if status is not None:
+                self.cancel_until(0)
+                return status
+
+    def search(self, budget, assumptions):
+        """Search until a model is found, the clauses are refuted, or the
+        conflict budget runs out (returns None, to restart)."""
+        trail_lim = self.trail_lim
+        conflicts = 0
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.conflicts += 1
+                conflicts += 1
+                if not trail_lim:
+                    self.ok = False
+                    return False
+                learnt, level = self.analyze(conflict)
+                self.cancel_until(level)
+                if len(learnt) == 1:
+                    self.enqueue(learnt[0], None)
+                else:
+                    self.enqueue(learnt[0], self.attach(learnt))
+                    self.learned += 1
+                self.var_inc /= self.var_decay
+                continue
+            if conflicts >= budget:
+                self.cancel_until(0)
+                return None
+            decision = None
+            while len(trail_lim) < len(assumptions):
+                lit = assumptions[len(trail_lim)]
+                if self.values[lit] == 1:
+                    trail_lim.append(len(self.trail))  ## Already true
+                elif self.values[lit] == -1:
+                    return False  ## The assumptions are refuted
+                else:
+                    decision = lit
+                    break
+            if decision is None:
+                decision = self.pick_branch()
+                if decision is None:
+                    values = self.values
+                    self.model = [None] + [values[v] == 1
+                                           for v in range(1, self.num_vars + 1)]
+                    return True
+            self.decisions += 1
+            trail_lim.append(len(self.trail))
+            self.enqueue(decision, None)
+
+def cdcl_satisfiable(s, cnf_method='distribute'):
+    """Check satisfiability of a propositional sentence with CDCLSolver.
+    Like dpll_satisfiable, return a model (covering every symbol of s,
+    but no Tseitin symbols) or False.
+    >>> ppsubst(cdcl_satisfiable(A&~B))
+    {A: True, B: False}
+    >>> cdcl_satisfiable(P&~P)
+    False
+    """
+    store = ClauseStore()
+    for symbol in prop_symbols(s):
+        store.symbol_id(symbol)
+    solver = CDCLSolver(store.tell(s, cnf_method), len(store.symbols) - 1)
+    if not solver.solve():
+        return False
+    return store.model(solver)
+
+#______________________________________________________________________________
+# Walk-SAT [Fig. 7.18]
+
+def WalkSAT(clauses, p=0.5, max_flips=10000, max_restarts=1):
+    """Local search for a model of a list of clauses. [Fig. 7.18]
+    The clauses are translated to int clauses and searched by walksat;
+    return a model (a dict over their symbols) or None if no model was
+    found, which does not mean there is none.
+    >>> ppsubst(WalkSAT([A, B | ~A, ~C | ~B], max_restarts=10))
+    {A: True, B: True, C: False}
+    """
+    store = ClauseStore()
+    ints = [store.clause(c) for c in clauses]
+    ints = [c for c in ints if c is not None]
+    model = walksat(ints, len(store.symbols) - 1, p, max_flips, max_restarts)
+    if model is None:
+        return None
+    return dict((store.symbols[i], model[i]) for i in range(1, len(store.symbols)))
+
+def walksat(clauses, num_vars, p=0.5, max_flips=10000, max_restarts=1,
+            model=None):
+    """WalkSAT on int clauses over variables 1..num_vars.  Return a model
+    as a list of booleans indexed by variable, or None.
+    Every clause keeps its number of true literals and the xor of its
+    true variables, so when exactly one literal is true the xor names it;
+    every variable keeps its break count, the number of clauses in which
+    it is that only true literal.  A flip updates these for the clauses
+    containing the variable only, so choosing the variable to flip in an
+    unsatisfied clause costs one look-up per literal: a variable that
+    breaks nothing is flipped at once, otherwise with probability p a
+    random one, else the one with the smallest break count (WalkSAT/SKC).
+    The search restarts from a fresh random assignment after max_flips
+    flips, up to max_restarts times; the first try starts from model, if
+    given.  An empty clause can never be satisfied, so it returns None.
+    >>> walksat([(1, 2), (-1,), (-2, 3)], 3)[1:]
+    [False, True, True]
+    >>> walksat([(1, 2), ()], 2) is None
+    True
+    """
+    if not all(clauses):
+        return None
+    n = num_vars
+    ## Repeated literals would break the counts, and tautologies never matter
+    clauses = [tuple(set(c)) for c in clauses if not any(-lit in c for lit in c)]
+    ## occurs[lit] lists the clauses containing lit; a list of 2n+1 slots
+    ## indexed by lit, so -v lands in the upper half
+    occurs = [[] for _ in range(2 * n + 1)]
+    for ci, clause in enumerate(clauses):
+        for lit in clause:
+            occurs[lit].append(ci)
+    for restart in range(max_restarts):
+        if restart == 0 and model is not None:
+            value = [False] + [bool(model[v]) if v < len(model) else False
+                               for v in range(1, n + 1)]
+        else:
+            value = [False] + [random.random() < 0.5 for v in range(n)]
+        true_count = [0] * len(clauses)
+        true_xor = [0] * len(clauses)
+        break_count = [0] * (n + 1)
+        unsat, position = [], [-1] * len(clauses)
+        for ci, clause in enumerate(clauses):
+            for lit in clause:
+                if value[abs(lit)] == (lit > 0):
+                    true_count[ci] += 1
+                    true_xor[ci] ^= abs(lit)
+            if true_count[ci] == 0:
+                position[ci] = len(unsat)
+                unsat.append(ci)
+            elif true_count[ci] == 1:
+                break_count[true_xor[ci]] += 1
+
+        for flip in range(max_flips):
+            if not unsat:
+                return value
+            clause = clauses[random.choice(unsat)]
+            best, best_breaks = None, None
+            for lit in clause:
+                b = break_count[abs(lit)]
+                if best is None or b < best_breaks:
+                    best, best_breaks = abs(lit), b
+            if best_breaks > 0 and random.random() < p:
+                var = abs(random.choice(clause))
+            else:
+                var = best
+
+            ## Flip var: the literal made true gains, the other one loses
+            value[var] = not value[var]
+            made_true = var if value[var] else -var
+            for ci in occurs[made_true]:
+                count = true_count[ci]
+                if count == 0:
+                    last = unsat.pop()
+                    if last != ci:
+                        unsat[position[ci]] = last
+                        position[last] = position[ci]
+                    position[ci] = -1
+                    break_count[var] += 1
+                elif count == 1:
+                    break_count[true_xor[ci]] -= 1
+                true_count[ci] = count + 1
+                true_xor[ci] ^= var
+            for ci in occurs[-made_true]:
+                count = true_count[ci] - 1
+                true_count[ci] = count
+                true_xor[ci] ^= var
+                if count == 0:
+                    position[ci] = len(unsat)
+                    unsat.append(ci)
+                    break_count[var] -= 1
+                elif count == 1:
+                    break_count[true_xor[ci]] += 1
+        if not unsat:
+            return value
+    return None
+
+def walksat_satisfiable(s, p=0.5, max_flips=10000, max_restarts=10):
+    """Like dpll_satisfiable, but with WalkSAT: return a model of s, or
+    False if none was found (so False does NOT prove unsatisfiability).
+    Can be passed to SAT_plan as its SAT_solver.
+    >>> ppsubst(walksat_satisfiable(A & ~B))
+    {A: True, B: False}
+    """
+    store = ClauseStore()
+    for symbol in prop_symbols(s):
+        store.symbol_id(symbol)
+    clauses = store.tell(s)
+    if () in clauses:
+        return False
+    model = walksat(clauses, len(store.symbols) - 1, p, max_flips, max_restarts)
+    if model is None:
+        return False
+    return dict((store.symbols[i], model[i]) for i in range(1, len(store.symbols))
+                if i not in store.auxiliary)
 
 #______________________________________________________________________________
 
@@ -765,20 +1988,189 @@ def WalkSAT(clauses, p=0.5, max_flips=10000):
 
 #______________________________________________________________________________
 
-def SAT_plan(init, transition, goal, t_max, SAT_solver=dpll_satisfiable):
-    "[Fig. 7.22]"
-    for t in range(t_max):
-        cnf = translate_to_SAT(init, transition, goal, t)
+def SAT_plan(init, transition, goal, t_max, SAT_solver=None):
+    """[Fig. 7.22]  transition maps each state to a dict {action: state};
+    goal is a state or a list (or set) of states.  Return the shortest
+    list of actions (of at most t_max) that reaches a goal, or None.
+    With SAT_solver=None the horizon is grown on one incremental solver
+    (see SATPlanner); otherwise each horizon is translated to a sentence
+    from scratch and handed to SAT_solver, which can be dpll_satisfiable,
+    cdcl_satisfiable or walksat_satisfiable (which is incomplete: a
+    horizon it fails on is skipped even if a plan exists).
+    >>> transition = {'A': {'Left': 'A', 'Right': 'B'},
+    ...               'B': {'Left': 'A', 'Right': 'C'},
+    ...               'C': {'Left': 'B', 'Right': 'C'}}
+    >>> SAT_plan('A', transition, 'C', 1) is None
+    True
+    >>> SAT_plan('A', transition, 'C', 3)
+    ['Right', 'Right']
+    >>> SAT_plan('A', transition, 'C', 3, SAT_solver=dpll_satisfiable)
+    ['Right', 'Right']
+    """
+    goals = goal_states(transition, goal)
+    if SAT_solver is None:
+        return SATPlanner(init, transition, goals).plan(t_max)
+    for t in range(t_max + 1):
+        cnf = translate_to_SAT(init, transition, goals, t)
         model = SAT_solver(cnf)
         if model is not False:
-            return extract_solution(model)
+            return extract_solution(model, init, transition, goals, t)
     return None
 
-def translate_to_SAT(init, transition, goal, t):
-    unimplemented()
+def goal_states(transition, goal):
+    "The goal argument of SAT_plan as a list of states."
+    if isinstance(goal, (list, set, frozenset)):
+        return list(goal)
+    return [goal]
+
+class SATPlanner:
+    """SATPlan over a live CDCLSolver.  The variable S(s, t) says the
+    state at time t is s, and T(s, a, t) that action a is taken in s at
+    time t.  The clauses for step t are
+        T(s, a, t) ==> S(s, t)      T(s, a, t) ==> S(s', t+1)
+        S(s', t+1) ==> the disjunction of the T(s, a, t) leading to s'
+    so every state true at time t is reached from init by a chain of true
+    transitions; no at-most-one constraints are needed and the encoding
+    grows linearly with the horizon.  Reaching a goal at time t is a
+    guard variable that is only assumed while trying horizon t, so
+    growing the horizon adds just the clauses of the new step, and
+    everything the solver has learned stays valid.  The plan is read
+    backwards from the goal state.  timings has one row per horizon:
+    [horizon, encode seconds, solve seconds, clauses, variables].
+    """
+
+    def __init__(self, init, transition, goals):
+        self.init = init
+        self.transition = transition
+        self.goals = [g for g in goals if g in transition]
+        self.predecessors = {}   ## state -> [(previous state, action)]
+        for s in transition:
+            for a, s1 in transition[s].items():
+                self.predecessors.setdefault(s1, []).append((s, a))
+        self.solver = CDCLSolver()
+        self.num_vars = 0
+        self.num_clauses = 0
+        self.state_var = {}
+        self.action_var = {}
+        self.horizon = -1
+        self.timings = []
+        self.path = None   ## [(state, action), ...] of the last plan
+
+    def new_var(self):
+        self.num_vars += 1
+        return self.num_vars
+
+    def add(self, clause):
+        self.num_clauses += 1
+        self.solver.add_clause(clause)
+
+    def extend(self):
+        "Add time step horizon+1 to the encoding."
+        t = self.horizon + 1
+        for s in self.transition:
+            self.state_var[s, t] = self.new_var()
+        if t == 0:
+            for s in self.transition:
+                self.add([self.state_var[s, 0] if s == self.init
+                          else -self.state_var[s, 0]])
+        else:
+            for s in self.transition:
+                for a, s1 in self.transition[s].items():
+                    v = self.action_var[s, a, t - 1] = self.new_var()
+                    self.add([-v, self.state_var[s, t - 1]])
+                    self.add([-v, self.state_var[s1, t]])
+            for s1 in self.transition:
+                self.add([-self.state_var[s1, t]] +
+                         [self.action_var[s, a, t - 1]
+                          for (s, a) in self.predecessors.get(s1, [])])
+        self.goal_var = self.new_var()
+        self.add([-self.goal_var] + [self.state_var[g, t] for g in self.goals])
+        self.horizon = t
+
+    def plan(self, t_max):
+        "The shortest plan of at most t_max actions, or None."
+        if self.init not in self.transition or not self.goals:
+            return None
+        while self.horizon < t_max:
+            start = time.perf_counter()
+            clauses = self.num_clauses
+            self.extend()
+            encoded = time.perf_counter()
+            found = self.solver.solve([self.goal_var])
+            self.timings.append([self.horizon, encoded - start,
+                                 time.perf_counter() - encoded,
+                                 self.num_clauses - clauses, self.num_vars])
+            if found:
+                return self.extract()
+            ## This horizon is done with: its goal guard is never assumed again
+            self.solver.add_clause([-self.goal_var])
+        return None
 
-def extract_solution(model):
-    unimplemented()
+    def extract(self):
+        "Read the plan from the model, backwards from a goal state."
+        value = self.solver.value
+        t = self.horizon
+        state = find_if(lambda g: value(self.state_var[g, t]), self.goals)
+        path = []
+        while t > 0:
+            for (s, a) in self.predecessors[state]:
+                if value(self.action_var[s, a, t - 1]):
+                    break
+            path.append((s, a))
+            state, t = s, t - 1
+        path.reverse()
+        self.path = path
+        return [a for (s, a) in path]
+
+    def report(self):
+        "Print the encode/solve timings per horizon."
+        print_table(self.timings, header=['horizon', 'encode s', 'solve s',
+                                          'clauses', 'variables'],
+                    numfmt='%.4g')
+
+def translate_to_SAT(init, transition, goals, t):
+    """The SATPlanner encoding for horizon t as one sentence, for
+    SAT_solver functions.  S_i_t and T_i_j_t name state i at time t and
+    its action j at time t, numbering states and actions in the order of
+    transition."""
+    states = list(transition)
+    index = dict((s, i) for i, s in enumerate(states))
+    S = lambda s, k: Expr('S_%d_%d' % (index[s], k))
+    T = lambda s, j, k: Expr('T_%d_%d_%d' % (index[s], j, k))
+    clauses = [S(s, 0) if s == init else ~S(s, 0) for s in states]
+    incoming = dict((s, []) for s in states)
+    for k in range(t):
+        for s in states:
+            for j, (a, s1) in enumerate(transition[s].items()):
+                clauses.append(~T(s, j, k) | S(s, k))
+                clauses.append(~T(s, j, k) | S(s1, k + 1))
+                if k == 0:
+                    incoming[s1].append((s, j))
+        for s1 in states:
+            clauses.append(associate('|', [~S(s1, k + 1)] +
+                                     [T(s, j, k) for (s, j) in incoming[s1]]))
+    clauses.append(associate('|', [S(g, t) for g in goals if g in index]))
+    return associate('&', clauses)
+
+def extract_solution(model, init, transition, goals, t):
+    "Read the plan for translate_to_SAT(init, transition, goals, t) from model."
+    states = list(transition)
+    index = dict((s, i) for i, s in enumerate(states))
+    true = lambda name: model.get(Expr(name), False)
+    state = find_if(lambda g: g in index and true('S_%d_%d' % (index[g], t)), goals)
+    actions = []
+    for k in range(t - 1, -1, -1):
+        for s in states:
+            for j, (a, s1) in enumerate(transition[s].items()):
+                if s1 == state and true('T_%d_%d_%d' % (index[s], j, k)):
+                    break
+            else:
+                continue
+            break
+        actions.append(a)
+        state = s
+    actions.reverse()
+    return actions
 
 #______________________________________________________________________________
 
@@ -860,14 +2252,128 @@ def subst(s, x):
     else:
         return Expr(x.op, *[subst(s, arg) for arg in x.args])
 
-def fol_fc_ask(KB, alpha):
-    """Inefficient forward chaining for first-order logic. [Fig. 9.3]
-    KB is a FolKB and alpha must be an atomic sentence."""
-    while True:
-        new = {}
-        for r in KB.clauses:
-            ps, q = parse_definite_clause(standardize_variables(r))
-            raise NotImplementedError
+def is_ground(x):
+    "Does the Expr x contain no variables?  (Cached on x.)"
+    memo = x.memo()
+    ground = memo.get('ground')
+    if ground is None:
+        if not x.args:
+            ground = not is_var_symbol(x.op)
+        else:
+            ground = every(is_ground, x.args)
+        memo['ground'] = ground
+    return ground
+
+class Bindings:
+    """A triangular substitution that is extended in place and undone from
+    a trail, instead of being copied on every binding as extend does.
+    Terms are shared, not renamed: a term is used together with a frame
+    number, and variable x in frame f is the key (x, f), so applying a rule
+    costs a new frame number rather than a standardized copy of the rule.
+    A variable may be bound to a term that contains bound variables; walk
+    follows such chains and resolve builds the substituted Expr.
+    >>> b = Bindings()
+    >>> f1, f2 = b.new_frame(), b.new_frame()
+    >>> mark = b.mark()
+    >>> b.unify(expr('F(x, y)'), f1, expr('F(A, x)'), f2)
+    True
+    >>> b.resolve(expr('F(x, y)'), f1)
+    F(A, x_2)
+    >>> b.unify(expr('G(x, x)'), f2, expr('G(A, B)'), f1)
+    False
+    >>> b.undo(mark); b.resolve(expr('F(x, y)'), f1)
+    F(x_1, y_1)
+    """
+
+    def __init__(self):
+        self.bound = {}  ## (variable, frame) -> (term, frame)
+        self.trail = []  ## the keys of bound, in the order they were bound
+        self.frames = itertools.count(1) ## frame 0 is the query's
+
+    def new_frame(self):
+        return next(self.frames)
+
+    def mark(self):
+        return len(self.trail)
+
+    def undo(self, mark):
+        "Remove the bindings made since mark."
+        bound, trail = self.bound, self.trail
+        while len(trail) > mark:
+            del bound[trail.pop()]
+
+    def walk(self, x, f):
+        "Follow the bindings of variable x in frame f; return (term, frame)."
+        binding = self.bound.get((x, f)) ## Only variables are ever bound
+        while binding is not None:
+            x, f = binding
+            binding = self.bound.get((x, f))
+        return x, f
+
+    def unify(self, x, fx, y, fy):
+        """Bind variables so that x in frame fx equals y in frame fy and return
+        True, or return False (undo to an earlier mark to drop what was bound)."""
+        stack = [(x, fx, y, fy)]
+        while stack:
+            x, fx, y, fy = stack.pop()
+            x, fx = self.walk(x, fx)
+            y, fy = self.walk(y, fy)
+            if x is y and (fx == fy or is_ground(x)):
+                continue
+            if not x.args and is_var_symbol(x.op):
+                if not self.bind(x, fx, y, fy):
+                    return False
+            elif not y.args and is_var_symbol(y.op):
+                if not self.bind(y, fy, x, fx):
+                    return False
+            elif x.op == y.op and len(x.args) == len(y.args) and x.args:
+                if is_ground(x) and is_ground(y):
+                    return False ## Distinct ground Exprs are never equal
+                stack.extend([(a, fx, b, fy) for (a, b) in zip(x.args, y.args)])
+            else:
+                return False
+        return True
+
+    def bind(self, var, f, x, fx):
+        if x.args and not is_ground(x) and self.occurs(var, f, x, fx):
+            return False
+        self.bound[var, f] = (x, fx)
+        self.trail.append((var, f))
+        return True
+
+    def occurs(self, var, f, x, fx):
+        x, fx = self.walk(x, fx)
+        if x is var and fx == f:
+            return True
+        return some(lambda arg: self.occurs(var, f, arg, fx), x.args)
+
+    def resolve(self, x, f):
+        """Substitute the bindings into x in frame f.  Unbound variables of
+        frame 0 keep their names; others get the frame number appended."""
+        if is_ground(x):
+            return x
+        x, f = self.walk(x, f)
+        if not x.args:
+            if not is_var_symbol(x.op) or f == 0:
+                return x
+            return Expr('%s_%d' % (x.op, f))
+        return Expr(x.op, *[self.resolve(arg, f) for arg in x.args])
+
+def variant_key(x):
+    """Rename the variables of x to v_0, v_1, ... in order of appearance, so
+    that x and y are variants of each other iff their keys are equal."""
+    if is_ground(x):
+        return x
+    names = {}
+    def rename(x):
+        if is_ground(x):
+            return x
+        if not x.args:
+            if x not in names:
+                names[x] = Expr('v_%d' % len(names))
+            return names[x]
+        return Expr(x.op, *list(map(rename, x.args)))
+    return rename(x)
 
 def standardize_variables(sentence, dic=None):
     """Replace all the variables in sentence with new variables.
@@ -908,14 +2414,19 @@ class FolKB(KB):
     >>> kb0.ask(expr('Wife(Pete, x)'))
     False
     """
-    def __init__(self, initial_clauses=[]):
-        self.clauses = [] # inefficient: no indexing
+    def __init__(self, initial_clauses=[], tabled=True):
+        self.clauses = []
+        self.index = {} ## (predicate, arity) of the conclusion -> clauses
+        self.tabled = tabled
+        self.tables = {} ## Complete answers of subgoals, see FolProver
         for clause in initial_clauses:
             self.tell(clause)
 
     def tell(self, sentence):
         if is_definite_clause(sentence):
             self.clauses.append(sentence)
+            self.index.setdefault(functor(sentence), []).append(sentence)
+            self.tables = {}
         else:
             raise Exception("Not a definite clause: %s" % sentence)
 
@@ -924,9 +2435,20 @@ class FolKB(KB):
 
     def retract(self, sentence):
         self.clauses.remove(sentence)
+        self.index[functor(sentence)].remove(sentence)
+        self.tables = {}
 
     def fetch_rules_for_goal(self, goal):
-        return self.clauses
+        "The clauses whose conclusion has the goal's predicate and arity."
+        return self.index.get((goal.op, len(goal.args)), [])
+
+def functor(clause):
+    """The (predicate, arity) of a definite clause's conclusion.
+    >>> functor(expr('(Missile(x) & Owns(Nono, x)) ==> Sells(West, x, Nono)'))
+    ('Sells', 3)
+    """
+    conclusion = parse_definite_clause(clause)[1]
+    return (conclusion.op, len(conclusion.args))
 
 def test_ask(query, kb=None):
     q = expr(query)
@@ -968,6 +2490,11 @@ crime_kb = FolKB(
 def fol_bc_ask(KB, query):
     """A simple backward-chaining algorithm for first-order logic. [Fig. 9.6]
     KB should be an instance of FolKB, and goals a list of literals.
+    The substitutions bind the variables of query.  With a tabled KB (the
+    default) each distinct subgoal is solved once and its answers are kept
+    until the KB changes; this also ends left recursion, but every answer
+    is found before the first is returned, so queries with infinitely many
+    answers need FolKB(tabled=False).
     >>> test_ask('Farmer(x)')
     ['{x: Mac}']
     >>> test_ask('Human(x)')
@@ -981,7 +2508,139 @@ def fol_bc_ask(KB, query):
     >>> test_ask('Criminal(x)', crime_kb)
     ['{x: West}']
     """
-    return fol_bc_or(KB, query, {})
+    prover = FolProver(KB)
+    vars = variables(query)
+    for _ in prover.prove(query, 0):
+        yield dict((v, prover.bindings.resolve(v, 0)) for v in vars)
+
+class FolProver:
+    """Backward chaining over the definite clauses of a FolKB with shared
+    Bindings.  Untabled, this is the depth-first search of fol_bc_or and
+    fol_bc_and.  Tabled, a subgoal is looked up by its variant_key: a
+    complete table in KB.tables answers it at once.  Otherwise the subgoal
+    is evaluated, eagerly, and a call to a subgoal that is still being
+    evaluated (recursion) gets the answers found so far and records that
+    it depends on it.  The oldest subgoal of such a group of mutually
+    dependent subgoals re-evaluates them until no new answer appears, and
+    then marks all of their tables complete.  Subgoals answered by facts
+    alone are not tabled: matching the facts is as cheap as a table."""
+
+    def __init__(self, KB):
+        self.KB = KB
+        self.bindings = Bindings()
+        self.tabled = KB.tabled
+        self.stack = []       ## The tables being evaluated, oldest first
+        self.incomplete = []  ## Evaluated tables waiting for their leader
+        self.tables = {}      ## variant_key -> table, until it is complete
+        self.answers_added = 0
+        self.partial_answers = 0  ## Times a table in progress was used
+        self.derived = {}         ## functor -> has_rules
+
+    def prove(self, goal, f):
+        "Generate each way of proving goal in frame f (as bindings)."
+        b = self.bindings
+        if self.tabled and self.has_rules(goal):
+            answers = self.table(variant_key(b.resolve(goal, f)))
+            for answer in answers:
+                mark = b.mark()
+                if b.unify(goal, f, answer, b.new_frame()):
+                    yield
+                b.undo(mark)
+        else:
+            for rule in self.KB.fetch_rules_for_goal(goal):
+                lhs, rhs = definite_clause_parts(rule)
+                frame = b.new_frame()
+                mark = b.mark()
+                if b.unify(rhs, frame, goal, f):
+                    for _ in self.prove_all(lhs, 0, frame):
+                        yield
+                b.undo(mark)
+
+    def has_rules(self, goal):
+        "Is goal concluded by a rule with premises (and not only by facts)?"
+        key = (goal.op, len(goal.args))
+        result = self.derived.get(key)
+        if result is None:
+            result = self.derived[key] = bool(some(
+                lambda rule: definite_clause_parts(rule)[0],
+                self.KB.fetch_rules_for_goal(goal)))
+        return result
+
+    def prove_all(self, goals, i, f):
+        "Generate each way of proving goals[i:], all in frame f."
+        if i == len(goals):
+            yield
+        else:
+            for _ in self.prove(goals[i], f):
+                for _ in self.prove_all(goals, i + 1, f):
+                    yield
+
+    def table(self, key):
+        "The answers to the subgoal key (some of them, while it is in progress)."
+        done = self.KB.tables.get(key)
+        if done is not None:
+            return done
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = Struct(key=key, answers=[], seen=set(),
+                                              depth=None, link=None,
+                                              waiting=False)
+        elif table.depth is not None:
+            ## Recursion: use what we have, and let the caller know it
+            self.stack[-1].link = min(self.stack[-1].link, table.depth)
+            self.partial_answers += 1
+            return list(table.answers)
+        start = len(self.incomplete)
+        while True:
+            before = (self.answers_added, self.partial_answers)
+            self.evaluate(table)
+            if table.link < table.depth:
+                ## Not the leader: pass the dependency on and keep the table
+                self.stack[-1].link = min(self.stack[-1].link, table.link)
+                table.depth = None
+                if not table.waiting:
+                    table.waiting = True
+                    self.incomplete.append(table)
+                return list(table.answers)
+            ## Another pass can only find more if a partial answer list was used
+            if self.answers_added == before[0] or self.partial_answers == before[1]:
+                break
+        table.depth = None
+        for t in [table] + self.incomplete[start:]:
+            ## (A waiting table may have been completed as a leader since)
+            if self.tables.pop(t.key, None) is not None:
+                self.KB.tables[t.key] = t.answers
+        del self.incomplete[start:]
+        return table.answers
+
+    def evaluate(self, table):
+        "One pass of every rule for the subgoal of table."
+        b = self.bindings
+        table.depth = table.link = len(self.stack)
+        self.stack.append(table)
+        goal = table.key
+        f = b.new_frame()
+        for rule in self.KB.fetch_rules_for_goal(goal):
+            lhs, rhs = definite_clause_parts(rule)
+            frame = b.new_frame()
+            mark = b.mark()
+            if b.unify(rhs, frame, goal, f):
+                for _ in self.prove_all(lhs, 0, frame):
+                    answer = variant_key(b.resolve(goal, f))
+                    if answer not in table.seen:
+                        table.seen.add(answer)
+                        table.answers.append(answer)
+                        self.answers_added += 1
+            b.undo(mark)
+        self.stack.pop()
+
+def definite_clause_parts(clause):
+    "parse_definite_clause(clause), cached on the clause."
+    memo = clause.memo()
+    parts = memo.get('definite')
+    if parts is None:
+        parts = memo['definite'] = parse_definite_clause(clause)
+    return parts
 
 def fol_bc_or(KB, goal, theta):
     for rule in KB.fetch_rules_for_goal(goal):
@@ -1000,6 +2659,72 @@ def fol_bc_and(KB, goals, theta):
             for theta2 in fol_bc_and(KB, rest, theta1):
                 yield theta2
 
+def fol_fc_ask(KB, alpha):
+    """Forward chaining for first-order logic. [Fig. 9.3]
+    KB is a FolKB and alpha must be an atomic sentence.  Generate a
+    substitution for the variables of alpha for each fact that matches it,
+    as the facts are derived.  Each fact is joined only with the rule
+    premises that have its functor, against the facts known so far, so
+    every combination of facts is tried once.  The KB is not changed.
+    >>> sorted(test_fc_ask('Criminal(x)', crime_kb), key=repr)
+    [{x: West}]
+    >>> sorted(test_fc_ask('Hates(Mac, y)'), key=repr)
+    [{y: MrsRabbit}, {y: Pete}]
+    """
+    b = Bindings()
+    vars = variables(alpha)
+    triggers = {}  ## functor -> [(premises, conclusion, i)] with premise i of that functor
+    agenda = []
+    known = set()
+    for clause in KB.clauses:
+        premises, conclusion = definite_clause_parts(clause)
+        for i, p in enumerate(premises):
+            triggers.setdefault((p.op, len(p.args)), []).append((premises, conclusion, i))
+        if not premises:
+            fact = variant_key(conclusion)
+            if fact not in known:
+                known.add(fact)
+                agenda.append(fact)
+    facts = {}     ## functor -> facts processed so far
+
+    def join(premises, i, skip, f):
+        "Match premises other than premises[skip] against facts, from i on."
+        if i == len(premises):
+            yield
+        elif i == skip:
+            for _ in join(premises, i + 1, skip, f):
+                yield
+        else:
+            p = premises[i]
+            for fact in facts.get((p.op, len(p.args)), ()):
+                mark = b.mark()
+                if b.unify(p, f, fact, b.new_frame()):
+                    for _ in join(premises, i + 1, skip, f):
+                        yield
+                b.undo(mark)
+
+    while agenda:
+        fact = agenda.pop()
+        key = (fact.op, len(fact.args))
+        facts.setdefault(key, []).append(fact)
+        mark = b.mark()
+        if b.unify(alpha, 0, fact, b.new_frame()):
+            yield dict((v, b.resolve(v, 0)) for v in vars)
+        b.undo(mark)
+        for premises, conclusion, i in triggers.get(key, ()):
+            f = b.new_frame()
+            mark = b.mark()
+            if b.unify(premises[i], f, fact, b.new_frame()):
+                for _ in join(premises, 0, i, f):
+                    new = variant_key(b.resolve(conclusion, f))
+                    if new not in known:
+                        known.add(new)
+                        agenda.append(new)
+            b.undo(mark)
+
+def test_fc_ask(query, kb=None):
+    return list(fol_fc_ask(kb or test_kb, expr(query)))
+
 #______________________________________________________________________________
 
 # Example application (not in the book).
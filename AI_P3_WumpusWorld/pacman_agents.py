@@ -26,11 +26,13 @@ from game import Actions
 from game import Directions
 
 import util
-#from pysat_wrapper import pysat_solver #did this according to email
 
 # AI:MA code
-from logic import expr, to_cnf, conjuncts
-from logic import dpll_satisfiable, Expr, PropKB
+from logic import expr, to_cnf, conjuncts, inspect_literal
+from logic import dpll_satisfiable, Expr, PropKB, SATPlanner
+from logic import Lit, Or
+
+from wumpus_probability import WumpusProbability
 
 class GoForwardAgent(Agent):
     """
@@ -72,13 +74,49 @@ class LogicalAgent(Agent):
     to determine its actions
     """
 
-    def __init__(self, index=0):
+    def __init__(self, index=0, solver='cdcl', cnf='distribute', planner='astar',
+                 risk='probability', plan_report=False):
         """
         Initialize the agent
+
+        solver selects how entailment is checked:
+            'cdcl' - the clause learning solver kept by the PropKB (default)
+            'dpll' - the AI:MA dpll_satisfiable (MUCH slower!)
+            'pysat' - the optional pysat package
+        e.g. python wumpus.py -l wumpus_tiny -p LogicalAgent -a solver=dpll
+
+        cnf selects the CNF conversion used by the KB (see logic.to_cnf):
+            'distribute' - the textbook conversion (default)
+            'tseitin' - linear size, with auxiliary symbols
+
+        planner selects how routes through safe cells are found:
+            'astar' - A* search over (position, direction) (default)
+            'satplan' - logic.SATPlanner over the same states; the encode
+                        and solve times of each horizon of every plan are
+                        kept in self.plan_timings, and printed after each
+                        plan with plan_report=1
+
+        risk selects the uncertain cell to try when no cell is known safe:
+            'probability' - the cells least likely to hold a pit or the
+                            active Wumpus (see wumpus_probability) (default)
+            'random' - a random half of the uncertain cells
         """
         super(LogicalAgent, self).__init__(index)
-        self.__kb = PropKB()
-        self.__kb.tell("WA")          # The wumpus is active!
+        if solver not in ('cdcl', 'dpll', 'pysat'):
+            raise ValueError("Unknown solver " + str(solver))
+        if planner not in ('astar', 'satplan'):
+            raise ValueError("Unknown planner " + str(planner))
+        self.planner = planner
+        self.plan_report = str(plan_report) not in ('False', '0', '')
+        self.plan_timings = []        # SATPlanner timings of each plan
+        if risk not in ('probability', 'random'):
+            raise ValueError("Unknown risk " + str(risk))
+        self.risk = risk
+        self.probability = WumpusProbability()
+        self.solver = solver
+        self.pysat = None             # PySatWrapper kept for the whole game
+        self.__kb = PropKB(cnf_method=cnf)
+        self.__kb.tell(Expr("WA"))          # The wumpus is active!
         self.wumpus_active = True     # Assumes only one Wumpus
         self.have_immobilizer = True  # Track whether we have our arrow
         self.listen_for_scream = None # Track location to listen for Wumpus scream
@@ -90,6 +128,9 @@ class LogicalAgent(Agent):
         self.unsafe = set()           # Track known unsafe cells for return planning
         self.safe = set()             # Track known safe cells for planning
         self.current_plan = None      # Plan to execute
+        self.entailment_cache = None  # Batch of safety answers, see ask_safety_batch
+        self.breezes = {}             # Whether we sensed a breeze at each visited cell
+        self.stenches = {}            # Whether we sensed a stench at each visited cell
 
         #print "Ask: "
         #for exp in self.__kb.ask_generator(expr("WA")):
@@ -101,20 +142,30 @@ class LogicalAgent(Agent):
         (i.e. formulated as the contradiction) proposition
         """
 
-        cnf = to_cnf(negative_query)
+        # The negation is already in the query, so the query itself is
+        # converted; a Tseitin CNF must never be negated afterwards.
+        cnf = to_cnf(negative_query, self.__kb.cnf_method)
 
-        if True:  # Make this False to use pysat setup
-            # Or true to use the AI:MA dpll_satisfiable which is MUCH slower!
+        if self.solver == 'cdcl' and not verbose_flag:
+            cached = self.cached_entailment(negative_query)
+            if cached is not None:
+                return cached
 
+        if self.solver != 'pysat':
             #print " negative query conjugates :", conjs
             #print "  KB clauses:", self.__kb.clauses
 
-            test = Expr('&', cnf, *self.__kb.clauses)
-
             if verbose_flag:
                 print("negative query: ", negative_query)
 
-            result = dpll_satisfiable(test) # can we satisfy the contradiction
+            # can we satisfy the contradiction
+            if self.solver == 'dpll':
+                test = Expr('&', cnf, *self.__kb.clauses)
+                result = dpll_satisfiable(test)
+            else:
+                # Solved under assumptions by the KB's own solver, which
+                # keeps what it learned from one query to the next
+                result = self.__kb.consistent_with(cnf)
             if result:
                 if verbose_flag:
                     print("query ", negative_query, " is satisfiable -> not entailed")
@@ -124,7 +175,10 @@ class LogicalAgent(Agent):
                 print("query ", negative_query, " is NOT satisfiable -> entailed!")
             return True
 
-        # Use the pysat setup (much, much faster)
+        # Use the pysat setup (much, much faster than dpll)
+        from pysat_wrapper import pysat_solver, PySatWrapper
+        if self.pysat is None:
+            self.pysat = PySatWrapper()
         conjs = conjuncts(cnf)
         if verbose_flag:
             print("Negative Query <", negative_query, ">  conjuncts<", conjs, ">")
@@ -137,7 +191,8 @@ class LogicalAgent(Agent):
             verbose_level = 1
 
         sat_result = pysat_solver(self.__kb.clauses, conjs, variable=None,
-                                  value=True, verbose_level=verbose_level)
+                                  value=True, verbose_level=verbose_level,
+                                  wrapper=self.pysat)
         if sat_result and sat_result.success:# == sF.success:
             if verbose_flag:
                 print("query ", negative_query, " is satisfiable ->  Not entailed!")
@@ -148,7 +203,8 @@ class LogicalAgent(Agent):
         if verbose_flag:
             sat_neg_result = pysat_solver(self.__kb.clauses, conjs,
                                           variable=None, value=False,
-                                          verbose_level=verbose_level)
+                                          verbose_level=verbose_level,
+                                          wrapper=self.pysat)
             print("query ", negative_query,
                   " is NOT satisfiable -> entailed!")
             print("     sat_result vars:", sat_result.varmap)
@@ -158,6 +214,38 @@ class LogicalAgent(Agent):
             print("  KB", self.__kb.clauses)
         return True
 
+    def ask_safety_batch(self, locations):
+        """
+        Ask the KB about P, W and B at every location in one batch
+        (a single backbone computation) and keep the answers until
+        the KB changes, so planning does not query cell by cell.
+        """
+        symbols = set()
+        for loc in locations:
+            for prefix in ("P", "W", "B"):
+                symbols.add(Lit(prefix, *loc))
+        entailed, refuted, _ = self.__kb.ask_literals(symbols)
+        self.entailment_cache = (self.__kb.version, entailed, refuted,
+                                 symbols, set(locations))
+
+    def cached_entailment(self, negative_query):
+        """
+        Answer ask_entailed from the batch, or return None if the query
+        is not a literal in the batch.  The KB entails the opposite of the
+        negative query exactly when the query's symbol is entailed (for ~X)
+        or refuted (for X).  If the KB has changed since the batch was
+        asked, the same cells are asked again first.
+        """
+        if self.entailment_cache is None:
+            return None
+        symbol, positive = inspect_literal(negative_query)
+        if symbol not in self.entailment_cache[3]:
+            return None
+        if self.entailment_cache[0] != self.__kb.version:
+            self.ask_safety_batch(self.entailment_cache[4])
+        _, entailed, refuted, _, _ = self.entailment_cache
+        return symbol in (refuted if positive else entailed)
+
     def get_action(self, state):
         """
         This method chooses the safest action
@@ -172,10 +260,10 @@ class LogicalAgent(Agent):
         # Disabled here, but can enable if using pysat with minimal penalty.
         # It does NOT work with dpll_satisfiable.
         if False:
-            if self.ask_entailed(expr("True")):
+            if self.ask_entailed(Expr("True")):
                 print("Knowledge base has an issue at start " +
                       "of get_action - True should always be satisfiable!")
-                self.ask_entailed(expr("True"), verbose_flag=True)
+                self.ask_entailed(Expr("True"), verbose_flag=True)
                 sys.exit(-1)
 
         # Get the current pacman position.
@@ -226,6 +314,17 @@ class LogicalAgent(Agent):
         self.update_kb_percepts(i_loc, sensors,
                                 current_dir, current_action)
 
+        if self.solver == 'cdcl':
+            # Answer this turn's safety questions in one batch: every cell
+            # we know of and its neighbors, which covers the planner's moves
+            cells = set(self.visited) | self.unvisited
+            for loc in list(cells):
+                cells.update(get_neighbors(loc))
+            if (self.entailment_cache is None
+                    or self.entailment_cache[0] != self.__kb.version
+                    or self.entailment_cache[4] != cells):
+                self.ask_safety_batch(cells)
+
 
         # If we have glitter, then grab the gold!
         if "Glitter" in sensors:
@@ -341,7 +440,7 @@ class LogicalAgent(Agent):
         logically_pits = []
         for loc in possible_goal_set:
             " Check for definite Pit (definite Wumpus considered in plan shot)"
-            negative_query = expr(make_loc_proposition("~P", loc))
+            negative_query = Lit("~P", *loc)
             result = self.ask_entailed(negative_query)
             if not result:
                 # The KB does NOT entail that a Pit IS here
@@ -356,7 +455,7 @@ class LogicalAgent(Agent):
             self.unsafe.add(loc)
             if loc in self.unvisited:
                 self.unvisited.remove(loc) # Never going here
-            self.__kb.tell(expr(make_loc_proposition("P", loc)))
+            self.__kb.tell(Lit("P", *loc))
 
         if not self.have_immobilizer and self.wumpus_active:
             # We must have missed the wumpus earlier
@@ -364,12 +463,12 @@ class LogicalAgent(Agent):
             wumpus_locations = []
             for loc in goal_set:
                 # Check for certainty
-                negative_query = expr(make_loc_proposition("~W", loc))
+                negative_query = Lit("~W", *loc)
                 result = self.ask_entailed(negative_query)
                 if result:
                     # The Wumpus is there!
-                    self.__kb.tell(expr(make_loc_proposition("W", loc))) # Wumpus is here!
-                    self.__kb.tell(expr(make_loc_proposition("~P", loc))) # No pit with Wumpus!
+                    self.__kb.tell(Lit("W", *loc)) # Wumpus is here!
+                    self.__kb.tell(Lit("~P", *loc)) # No pit with Wumpus!
                     wumpus_locations.append(loc)
 
             if not wumpus_locations:
@@ -379,15 +478,21 @@ class LogicalAgent(Agent):
                     self.unvisited.remove(loc)
                     self.unsafe.add(loc)
 
-        # For now, we won't consider reasoning about beliefs about which
-        # of remaining cells is the least risky
         print("     Original uncertain set: ", possible_goal_set)
         print("     Uncertain cells remaining :", goal_set)
 
-        # Add some random choice if we don't know what to do
-        random.shuffle(goal_set)
-        if len(goal_set) > 1:
-            goal_set = goal_set[0:int(len(goal_set)/2)] # gets 1/2 of elements
+        if self.risk == 'probability' and goal_set:
+            # Keep the cells least likely to kill us
+            risks = self.cell_risks(goal_set)
+            least = min(risks.values())
+            print("     Risk of uncertain cells:",
+                  ", ".join("%s %.3f" % (loc, risks[loc]) for loc in sorted(risks)))
+            goal_set = [loc for loc in goal_set if risks[loc] <= least + 1e-9]
+        else:
+            # Add some random choice if we don't know what to do
+            random.shuffle(goal_set)
+            if len(goal_set) > 1:
+                goal_set = goal_set[0:int(len(goal_set)/2)] # gets 1/2 of elements
 
         print("     go to closest of   :", goal_set)
         # just go to the closest cell
@@ -399,6 +504,8 @@ class LogicalAgent(Agent):
         This uses an implementation of A* with specific goal tests and successor
         generation for this Wumpus world problem.
         """
+        if self.planner == 'satplan':
+            return self.get_sat_plan(current_location, current_dir, goal_set)
         from util import manhattan_distance
         # Set up the basic A* planner
         closed_set = set()
@@ -412,38 +519,117 @@ class LogicalAgent(Agent):
                 return (action_plan, state)
             if state not in closed_set:
                 closed_set.add(state)
-                for action in (Actions.FWD, Actions.LEFT, Actions.RIGHT):
-                # Possible motion actions
-                    succ_posn = state[0]
-                    succ_dir = state[1]
-                    if action == Actions.FWD:
-                        vec = Actions.direction_to_vector(state[1])
-                        succ_posn = (state[0][0]+int(vec[0]),
-                                     state[0][1]+int(vec[1]))
-                    else:
-                        succ_dir = Actions.get_rotation_successor(succ_dir, action)
-
-                    if self.is_location_safe(succ_posn) or succ_posn in goal_set:
-                        # Only considering safe or terminal positions in plan
-                        new_plan = action_plan[:]
-                        new_plan.append(action)
-                        new_cost = cost + 1
-
-                        #print(" "*cost, "     Adding ", succ_posn, " ",
-                        #      succ_dir, " from ", action, " to fringe with f=g+h",
-                        #      new_cost, "+",h_cost)
-                        h_cost = min([manhattan_distance(succ_posn, goal) for goal in goal_set])
-                        f_cost = new_cost + h_cost
-
-                        fringe.push(((succ_posn, succ_dir), new_plan, new_cost), f_cost)
-                    #else:
-                    #    print(" "*cost, "     Cannot add ", succ_posn, " ", succ_dir,
-                    #          " from ", action, " to the fringe as not safe")
+                for action, succ_state in self.motion_successors(state, goal_set):
+                    # Only considering safe or terminal positions in plan
+                    succ_posn = succ_state[0]
+                    new_plan = action_plan[:]
+                    new_plan.append(action)
+                    new_cost = cost + 1
+
+                    #print(" "*cost, "     Adding ", succ_posn, " ",
+                    #      succ_state[1], " from ", action, " to fringe with f=g+h",
+                    #      new_cost, "+",h_cost)
+                    h_cost = min([manhattan_distance(succ_posn, goal) for goal in goal_set])
+                    f_cost = new_cost + h_cost
+
+                    fringe.push((succ_state, new_plan, new_cost), f_cost)
 
         print("failed to find plan to any goal set", goal_set)
 
         return (None, None)
 
+    def motion_successors(self, state, goal_set):
+        """
+        The (action, (posn, dir)) moves from a state that get_plan may take:
+        into safe cells, or into one of the goal cells
+        """
+        successors = []
+        for action in (Actions.FWD, Actions.LEFT, Actions.RIGHT):
+            succ_posn = state[0]
+            succ_dir = state[1]
+            if action == Actions.FWD:
+                vec = Actions.direction_to_vector(state[1])
+                succ_posn = (state[0][0]+int(vec[0]),
+                             state[0][1]+int(vec[1]))
+            else:
+                succ_dir = Actions.get_rotation_successor(succ_dir, action)
+            if self.is_location_safe(succ_posn) or succ_posn in goal_set:
+                successors.append((action, (succ_posn, succ_dir)))
+        return successors
+
+    def get_sat_plan(self, current_location, current_dir, goal_set):
+        """
+        get_plan by SATPlan: the (posn, dir) states reachable near the
+        known cells become the transition table of logic.SATPlanner, whose first satisfiable
+        horizon is a shortest plan
+        """
+        # Cells past the map count as safe, so keep to one cell around
+        # the box of the cells we know of
+        known = list(self.visited | self.unvisited) + list(goal_set) + [current_location]
+        low_x = min(x for x, y in known) - 1
+        high_x = max(x for x, y in known) + 1
+        low_y = min(y for x, y in known) - 1
+        high_y = max(y for x, y in known) + 1
+        start = (current_location, current_dir)
+        transition = {}
+        goals = []
+        frontier = [start]
+        while frontier:
+            state = frontier.pop()
+            if state in transition:
+                continue
+            transition[state] = {}
+            if state[0] in goal_set:
+                goals.append(state)   # plans end here, no need to go on
+                continue
+            for action, succ in self.motion_successors(state, goal_set):
+                (x, y) = succ[0]
+                if not (low_x <= x <= high_x and low_y <= y <= high_y):
+                    continue
+                transition[state][action] = succ
+                frontier.append(succ)
+
+        planner = SATPlanner(start, transition, goals)
+        plan = planner.plan(len(transition))
+        self.plan_timings.append(planner.timings)
+        if self.plan_report:
+            planner.report()
+        if plan is None:
+            print("failed to find plan to any goal set", goal_set)
+            return (None, None)
+        if not plan:
+            return (plan, start)
+        final_state, action = planner.path[-1]
+        return (plan, transition[final_state][action])
+
+    def cell_risks(self, cells):
+        """
+        The probability that each cell holds a pit or the active Wumpus,
+        given the breezes and stenches sensed so far and what the KB entails
+        about the cells we have not visited
+        """
+        frontier = [loc for loc in self.unvisited if loc not in self.walls]
+        no_pit = set(self.visited) | self.safe
+        no_pit.update(loc for loc in frontier if self.ask_entailed(Lit("P", *loc)))
+        pits = set(loc for loc in frontier if self.ask_entailed(Lit("~P", *loc)))
+        pit = self.probability.pit_probabilities(self.breezes, no_pit, pits | self.unsafe)
+
+        wumpus = {}
+        if self.wumpus_active:
+            candidates = [loc for loc in frontier if not self.ask_entailed(Lit("W", *loc))]
+            wumpus = self.probability.wumpus_probabilities(self.stenches, candidates)
+
+        risks = {}
+        for loc in cells:
+            if loc in no_pit:
+                p = 0.0
+            elif loc in pits:
+                p = 1.0
+            else:
+                p = pit.get(loc, self.probability.pit_prior)
+            risks[loc] = 1.0 - (1.0 - p) * (1.0 - wumpus.get(loc, 0.0))
+        return risks
+
     def shot_available(self, i_loc, current_dir, potential_wumpus_locations):
         """
         Do any of these locations potentially contain a wumpus.
@@ -453,19 +639,19 @@ class LogicalAgent(Agent):
         might_be_wumpus = []
         for loc in potential_wumpus_locations:
             "~Wumpus"
-            negative_query = expr(make_loc_proposition("W", loc))
+            negative_query = Lit("W", *loc)
             result = self.ask_entailed(negative_query)
             if not result:
                 # The KB does NOT entail that the Wumpus is NOT here
                 might_be_wumpus.append(loc) # it might be
 
                 # Check for certainty
-                negative_query = expr(make_loc_proposition("~W", loc))
+                negative_query = Lit("~W", *loc)
                 result = self.ask_entailed(negative_query)
                 if result:
                     # The Wumpus is there!
-                    self.__kb.tell(expr(make_loc_proposition("W", loc))) # Wumpus is here!
-                    self.__kb.tell(expr(make_loc_proposition("~P", loc))) # No pit with Wumpus!
+                    self.__kb.tell(Lit("W", *loc)) # Wumpus is here!
+                    self.__kb.tell(Lit("~P", *loc)) # No pit with Wumpus!
                     #Plan to one step short of Wumpus then face Wumpus and shoot (better hope you are logically correct)
                     return self.plan_shot(i_loc, current_dir, loc)
 
@@ -542,9 +728,9 @@ class LogicalAgent(Agent):
         #        prove.
         #       e.g. return self.ask_entailed(neg_query)
 
-        pitThere = self.ask_entailed(expr(make_loc_proposition("~P", iloc)))
-        wumpusThere = self.ask_entailed(expr(make_loc_proposition("~W", iloc)))
-        breezeThere = self.ask_entailed(expr(make_loc_proposition("~B", iloc))) #pacman was diregarding breezes
+        pitThere = self.ask_entailed(Lit("~P", *iloc))
+        wumpusThere = self.ask_entailed(Lit("~W", *iloc))
+        breezeThere = self.ask_entailed(Lit("~B", *iloc)) #pacman was diregarding breezes
 
         return pitThere and wumpusThere and breezeThere
 
@@ -563,8 +749,8 @@ class LogicalAgent(Agent):
         #  This will require two propositions with some logical
         #     as to apply one or both in different states
 
-        self.__kb.tell(expr(make_loc_proposition('~P', position)))
-        self.__kb.tell(expr(make_loc_proposition('~W', position)))
+        self.__kb.tell(Lit('~P', *position))
+        self.__kb.tell(Lit('~W', *position))
 
         # Get list of 4 adjacent neighbors
         neighbors = get_neighbors(position)
@@ -572,13 +758,12 @@ class LogicalAgent(Agent):
 
         # Will sense breeze iff pit is adjacent
         #e.g. (B11 <=> (P12 | P21))
-        prop = expr(make_loc_proposition('B', position)+ "<=> " + make_or_proposition('P', neighbors))
+        prop = Lit('B', *position) % Or(*[Lit('P', *nbor) for nbor in neighbors])
         self.__kb.tell(prop)
 
         # Will sense stench iff wumpus is here or adjacent
-        prop = expr(make_loc_proposition('S', position)+ "<=> (" +
-                    make_loc_proposition('W', position) + " | " +
-                    make_or_proposition('W', neighbors)[1:])
+        prop = Lit('S', *position) % Or(Lit('W', *position),
+                                        *[Lit('W', *nbor) for nbor in neighbors])
         self.__kb.tell(prop)
 
 
@@ -601,11 +786,11 @@ class LogicalAgent(Agent):
                 self.unvisited.add(nbor)
 
             #@TODO - add proposition that says wumpus cannot be in two places at once (current and neighbors)
-            self.__kb.tell(expr("~W{0}_{1} | ~W{2}_{3}".format(position[0], position[1], nbor[0], nbor[1])))
+            self.__kb.tell(Or(Lit("~W", *position), Lit("~W", *nbor)))
 
             for other_nbor in neighbors:
                 if other_nbor != nbor:
-                    self.__kb.tell(expr("~W{0}_{1} | ~W{2}_{3}".format(nbor[0], nbor[1], other_nbor[0], other_nbor[1])))
+                    self.__kb.tell(Or(Lit("~W", *nbor), Lit("~W", *other_nbor)))
 
 
 
@@ -613,7 +798,7 @@ class LogicalAgent(Agent):
         import itertools #?
         for pairs in itertools.product(*[neighbors, neighbors]):
             if pairs[0] != pairs[1]:
-                self.__kb.tell(expr(make_or_proposition("~W", pairs)))
+                self.__kb.tell(Or(*[Lit("~W", *pos) for pos in pairs]))
 
 
         # Enable this check for entailed with TRUE
@@ -624,9 +809,9 @@ class LogicalAgent(Agent):
         # minimal penalty.
         # It does NOT work with dpll_satisfiable.
         if False:
-            if self.ask_entailed(expr("True")):
+            if self.ask_entailed(Expr("True")):
                 print("Knowledge base has an issue at start of get_action - True should always be satisfiable!")
-                self.ask_entailed(expr("True"), verbose_flag=True)
+                self.ask_entailed(Expr("True"), verbose_flag=True)
                 sys.exit(-1)
 
     def update_kb_percepts(self, iloc, sensors, current_dir, current_action):
@@ -644,22 +829,22 @@ class LogicalAgent(Agent):
                 self.visited.add(nloc)      # we have shown the contents of cell,
                 if nloc in self.unvisited:
                     self.unvisited.remove(nloc) #     so we have effectively visited the cell
-                self.__kb.tell(expr(make_loc_proposition("~P", nloc))) # no pit if wall
-                self.__kb.tell(expr(make_loc_proposition("~W", nloc))) # no Wumpus if wall
+                self.__kb.tell(Lit("~P", *nloc)) # no pit if wall
+                self.__kb.tell(Lit("~W", *nloc)) # no Wumpus if wall
                 self.current_plan = None # Clear any existing plan to force replanning
 
         # Tell if we sense glitter
         #  No need to track ~GL for us
         if "Glitter" in sensors:
-            self.__kb.tell(expr(make_loc_proposition("GL", iloc)))
+            self.__kb.tell(Lit("GL", *iloc))
 
         if "Scream" in sensors:
             print("Wumpus screamed - add not active to knowledge base")
-            self.__kb.retract("WA") # The Wumpus is no longer active
-            self.__kb.tell(expr("~WA")) # The Wumpus is immobile, Jim
+            self.__kb.retract(Expr("WA")) # The Wumpus is no longer active
+            self.__kb.tell(~Expr("WA")) # The Wumpus is immobile, Jim
             self.wumpus_active = False # Simplify our checks
             if self.listen_for_scream is not None:
-                self.__kb.tell(expr(make_loc_proposition("W", self.listen_for_scream))) # We hit it here!
+                self.__kb.tell(Lit("W", *self.listen_for_scream)) # We hit it here!
                 self.listen_for_scream = None
         elif not self.have_immobilizer:
             if self.listen_for_scream is not None:
@@ -667,7 +852,7 @@ class LogicalAgent(Agent):
                 if current_action != Actions.SHOOT:
                     # We missed
                     print("Oh no! We must have missed!  The Wumpus wasn't there.")
-                    self.__kb.tell(expr(make_loc_proposition("~W", self.listen_for_scream))) # No Wumpus here!
+                    self.__kb.tell(Lit("~W", *self.listen_for_scream)) # No Wumpus here!
                     self.listen_for_scream = None
                 else:
                     print("Waiting in hopeful anticipation to see if we got the dreaded Wumpus ...")
@@ -676,27 +861,29 @@ class LogicalAgent(Agent):
         #   or detect a breeze (or not)
         #@TODO - handle the Stench and Breeze precepts
 
-        if "Breeze" in sensors:
-            self.__kb.tell(expr(make_loc_proposition('B', iloc))) #Yes breeze
+        self.breezes[iloc] = "Breezy" in sensors
+        self.stenches[iloc] = "Stench" in sensors
+        if "Breezy" in sensors:
+            self.__kb.tell(Lit('B', *iloc)) #Yes breeze
         else:
-            self.__kb.tell(expr(make_loc_proposition('~B', iloc))) #No breeze
+            self.__kb.tell(Lit('~B', *iloc)) #No breeze
         if "Stench" in sensors:
-            self.__kb.tell(expr(make_loc_proposition('S', iloc))) #Yes stench
+            self.__kb.tell(Lit('S', *iloc)) #Yes stench
         else:
-            self.__kb.tell(expr(make_loc_proposition('~S', iloc))) #No stench
+            self.__kb.tell(Lit('~S', *iloc)) #No stench
 
        #inference: nearby cells do not hold wumpus
         if "Stench" not in sensors:
             for nloc in get_neighbors(iloc):
-                self.__kb.tell(expr(make_loc_proposition("~W", nloc)))
+                self.__kb.tell(Lit("~W", *nloc))
 
         #inference: no pit nearby
-        if "Breeze" not in sensors:
+        if "Breezy" not in sensors:
             for nloc in get_neighbors(iloc):
-                self.__kb.tell(expr(make_loc_proposition("~P", nloc)))
+                self.__kb.tell(Lit("~P", *nloc))
 
         if not self.wumpus_active: #pacman would get confused after grabbing treasure
-            self.__kb.tell(expr("~W"))
+            self.__kb.tell(~Expr("W"))
 
         # Enable this check for entailed with TRUE
         # which checks that the KB is still consistent
@@ -707,10 +894,10 @@ class LogicalAgent(Agent):
         # with minimal penalty.
         # It does NOT work with dpll_satisfiable.
         if False:
-            if self.ask_entailed(expr("True")):
+            if self.ask_entailed(Expr("True")):
                 print("Knowledge base has an issue at start of get_action " +
                       " - True should always be satisfiable!")
-                self.ask_entailed(expr("True"), verbose_flag=True)
+                self.ask_entailed(Expr("True"), verbose_flag=True)
                 sys.exit(-1)
 
 
@@ -733,6 +920,7 @@ def get_neighbors(position):
 def make_loc_proposition(symbol, position):
     """
     Make a simple proposition from prefix symbol and x_y format
+    (logic.Lit builds the same proposition as an Expr, without parsing)
     """
     return symbol+"{0}_{1}".format(position[0], position[1])
 
@@ -30,6 +30,8 @@
 # (see http://minisat.se) SAT solver, and is directly based on the satispy
 # python project, see https://github.com/netom/satispy .
 
+import time
+
 from logic import *
 from pysat.formula import CNF
 from pysat.solvers import Solver
@@ -37,26 +39,30 @@ from pysat.solvers import Solver
 from subprocess import call
 from tempfile import NamedTemporaryFile
 
-def pysat_solver(clauses, query=None, variable=None, value=True, verbose_level=0):
+def pysat_solver(clauses, query=None, variable=None, value=True, verbose_level=0,
+                 wrapper=None):
     """ Interface to pysat
-    <query> is simply added as to the list of <clauses>
+    <query> is checked together with <clauses>, but only for this call
 
     Set <variable> to a particular <value> in order to test SAT
     assuming any instance of that variable has that value.
 
     Otherwise, with defaults, will perform normal SAT on <clauses>+<query>
+
+    Pass the same PySatWrapper as <wrapper> on every call (e.g. one per game)
+    to keep its solver, symbol map and learned clauses between calls.
     """
 
     aima_clauses = list(clauses)
     if query is not None:
         assert isinstance(query, list)
-        aima_clauses = aima_clauses + query
 
-    solver = PySatWrapper()
+    solver = wrapper if wrapper is not None else PySatWrapper()
     try:
         if verbose_level > 0:
             print(f"Calling PySat solver with query = <{query}>")
-        solution = solver.solve(aima_clauses, variable=variable, value=value, verbose_level=verbose_level)
+        solution = solver.solve(aima_clauses, variable=variable, value=value,
+                                verbose_level=verbose_level, query=query)
         if verbose_level > 0:
             print(f"PySat Solver result: {solution}")
         return solution
@@ -72,18 +78,59 @@ def literal_name(literal):
 
 def clauses_to_conjunct(clause_list):
     """ coerce a list of clauses into a conjunction """
-    conj = Expr('&')
-    conj.args = clause_list
-    return conj
+    return Expr('&', *clause_list)
     #return ' & '.join(map(lambda(i): '{0}'.format(KB.clauses[i]), list))
 
 def prop_symbols_from_clause_list(clause_list):
     return prop_symbols(clauses_to_conjunct(clause_list))
 
+class AIMA_to_PySat_Translator(object):
+    """
+    Translates AI:MA clauses straight to the lists of ints used by pysat,
+    walking each clause once.  Symbols keep their ids for the life of the
+    translator (a logic.ClauseStore holds the map), so clauses translated
+    on different calls can go to the same solver.
+    """
+
+    def __init__(self):
+        self.store = ClauseStore()
+
+    def varname(self, vo):
+        return self.store.ids[vo]
+
+    def varobj(self, v):
+        return self.store.symbols[abs(int(v))]
+
+    def literal(self, literal):
+        return self.store.literal(literal)
+
+    def to_pysat_clauses(self, clauses):
+        """ Return the int clauses for a list of AI:MA clauses,
+        leaving out clauses that are always true
+        """
+        pysat_cnf = []
+        for clause in clauses:
+            literals = self.store.clause(clause)
+            if literals is not None:
+                pysat_cnf.append(list(literals))
+        return pysat_cnf
+
+    def new_guard(self):
+        """ A fresh variable id, used to switch query clauses on and off """
+        return self.store.symbol_id(self.store.new_symbol('_Query'))
+
+    def varmap(self, model):
+        """ The pysat model as a dict from AI:MA symbols to values """
+        symbols, auxiliary = self.store.symbols, self.store.auxiliary
+        return dict((symbols[abs(v)], v > 0) for v in model
+                    if abs(v) < len(symbols) and abs(v) not in auxiliary)
+
 # The following is a fairly direct adaptation of the very nice,
 # slim wrapper to minisat provided by https://github.com/netom/satispy
 # I'm not using satispy directly b/c it implements its own cnf rep.
 # so I'm adapting the aima rep to communication with minisat.
+# It is kept to print readable DIMACS when debugging; solving uses
+# AIMA_to_PySat_Translator above.
 
 class AIMA_to_Dimacs_Translator(object):
 
@@ -204,14 +251,15 @@ class AIMA_to_Dimacs_Translator(object):
         lines = dimacs.split("\n")
         pysat_cnf = []
         for line in lines[1:]:
-            pysat_cnf.append([int(val) for val in line.split(" ")[:-1]])
+            if line.strip():
+                pysat_cnf.append([int(val) for val in line.split(" ")[:-1]])
         return pysat_cnf
 
 class Solution(object):
 
-    def __init__(self, success = False, varmap = {}):
+    def __init__(self, success = False, varmap = None):
         self.success = success
-        self.varmap = varmap
+        self.varmap = varmap if varmap is not None else {}
 
     def __repr__(self):
         return '<PySat.Sol {0}>'.format(self.success)
@@ -227,38 +275,111 @@ class Solution(object):
         return f" {self.success}: {self.varmap}"
 
 class PySatWrapper(object):
+    """
+    Runs pysat on AI:MA clauses.  The translator and a live pysat Solver
+    are kept between calls: clauses already in the solver are not
+    translated again, query clauses and <variable>=<value> are passed as
+    assumptions, and the solver is only rebuilt when a clause it holds is
+    no longer in the KB (e.g. after a retract).
+    """
     DEFAULT_SOLVER = 'minisat22'
 
     def __init__(self, solver_name = DEFAULT_SOLVER):
         self.solver_name = solver_name
+        self.translator = AIMA_to_PySat_Translator()
+        self.solver = None
+        self.clauses = set()   # AI:MA clauses already in self.solver
+        self.translation_time = 0.0
+        self.solve_time = 0.0
+
+    def delete(self):
+        if self.solver is not None:
+            self.solver.delete()
+            self.solver = None
+        self.clauses = set()
 
     def solve(self, aima_cnf, variable=None, value=True,
-              translator=AIMA_to_Dimacs_Translator,
-              verbose_level=0):
+              translator=AIMA_to_PySat_Translator,
+              verbose_level=0, query=None):
 
         # if there are no clauses, then can't infer anything, so by default query result is unknown
         # return Solution with success == None
         # Note that this could be treated the same as failure.
         # In PropKB_SAT.ask, this is OK as it will test if sT.success == sF.success
         #     and therefore will also return None
-        if not aima_cnf:
+        if not aima_cnf and not query:
             print("No cnf clauses - nothing to infer!")
             return Solution(None)
 
+        if translator is AIMA_to_Dimacs_Translator:
+            # Debugging path through DIMACS text
+            return self.solve_dimacs(list(aima_cnf) + list(query or []),
+                                     variable, value, verbose_level)
+
+        start = time.perf_counter()
+        kb_clauses = set(aima_cnf)
+        if self.solver is None or not self.clauses <= kb_clauses:
+            self.delete()
+            self.solver = Solver(name=self.solver_name, use_timer=True)
+        new_clauses = [c for c in aima_cnf if c not in self.clauses]
+        pysat_cnf = self.translator.to_pysat_clauses(new_clauses)
+        self.clauses.update(new_clauses)
+
+        # Unit query clauses are assumptions; longer ones are switched on
+        # by a guard variable that is assumed now and falsified afterwards
+        assumptions, guarded = [], []
+        for literals in self.translator.to_pysat_clauses(query or []):
+            if len(literals) == 1:
+                assumptions.append(literals[0])
+            else:
+                guarded.append(literals)
+        guard = None
+        if guarded:
+            guard = self.translator.new_guard()
+            pysat_cnf += [literals + [-guard] for literals in guarded]
+            assumptions.append(guard)
+        if variable:
+            lit = self.translator.literal(variable)
+            assumptions.append(lit if value else -lit)
+        translated = time.perf_counter()
+        self.translation_time += translated - start
 
-        # Translate from AI:MA notation to DIMACS
-        # https://people.sc.fsu.edu/~jburkardt/data/cnf/cnf.html
-        io = translator()
+        if verbose_level > 1:
+            print(f"AI:MA CNF: {aima_cnf}")
+            print(30*"-")
+            print(f"PySat CNF added: {pysat_cnf}")
+            print(f"Assumptions: {assumptions}")
+            print(30*"=")
+
+        solution = Solution()
+        if [] in pysat_cnf:
+            # An empty clause (FALSE) can never be satisfied
+            self.delete()
+            return solution
+        self.solver.append_formula(pysat_cnf)
+        if self.solver.solve(assumptions=assumptions):
+            solution.success = True
+            solution.varmap = self.translator.varmap(self.solver.get_model())
+        if guard is not None:
+            self.solver.add_clause([-guard])
+        self.solve_time += time.perf_counter() - translated
+
+        if verbose_level > 0:
+            print(f"   translation {self.translation_time:.4f}s, solve {self.solve_time:.4f}s in total")
+        return solution
+
+    def solve_dimacs(self, aima_cnf, variable=None, value=True, verbose_level=0):
+        """ The original one-shot path, through DIMACS text """
+        io = AIMA_to_Dimacs_Translator()
         if variable:
             dimacs_cnf = io.to_dimacs_string_set_variable_value(aima_cnf, variable, value)
-            if not dimacs:
+            if not dimacs_cnf:
                 return Solution() # Failed
         else:
             dimacs_cnf = io.to_dimacs_string(aima_cnf)
 
         pysat_cnf = io.to_pysat_cnf(dimacs_cnf)
 
-
         if verbose_level > 1:
             print(f"AI:MA CNF: {aima_cnf}")
             print(30*"-")
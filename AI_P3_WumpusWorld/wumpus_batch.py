@@ -0,0 +1,274 @@
+# wumpus_batch.py
+# ---------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+"""
+Headless batch runs of the LogicalAgent, for comparing solver back-ends.
+
+Every game runs with the null display and with standard output and error
+thrown away (the game rules and the agent print on every move), in a pool of
+worker processes.  Game i of every configuration is seeded the same way,
+so the back-ends are compared on the same worlds.  For each game the
+agent's KB and its ask methods are wrapped to record:
+
+    outcome, score and number of moves,
+    tell calls, ask calls (ask_entailed and ask_safety_batch),
+    time spent answering asks (the SAT time) and the whole game time,
+    the number of KB clauses after every move,
+    the peak memory allocated during the game (tracemalloc).
+
+A summary table with one row per layout and configuration is printed,
+and -g adds one row per game.  Games that crash (an agent timed out or
+raised) or fail to start count as failed.  -o writes every game record,
+with the clause counts per move, to a file of JSON lines.
+
+Example (configurations are separated by ';', as -a of wumpus.py):
+    python wumpus_batch.py -l wumpus_tiny,wumpus2 -n 10 -a "solver=cdcl;solver=dpll"
+"""
+
+import contextlib
+import json
+import multiprocessing
+import optparse
+import os
+import random
+import time
+import tracemalloc
+
+import layout
+import text_display
+from logic import PropKB
+from pacman_agents import LogicalAgent
+from utils import print_table
+from wumpus import ClassicGameRules, parse_agent_args
+from wumpus_agents import WumpusAgent
+
+
+class GameStats:
+    """
+    Counts the KB and SAT work of one LogicalAgent during a game.
+    """
+
+    def __init__(self):
+        self.tells = 0
+        self.asks = 0
+        self.sat_time = 0.0
+        self.clauses = []  # KB size after each move
+        self._depth = 0    # cached asks may ask a batch; time it once
+
+    def instrument(self, agent):
+        """
+        Replaces the agent's ask methods, get_action and its KB's tell
+        with counting versions.
+        """
+        kb = next(value for value in vars(agent).values() if isinstance(value, PropKB))
+        kb.tell = self._wrap_tell(kb.tell)
+        agent.ask_entailed = self._wrap_ask(agent.ask_entailed)
+        agent.ask_safety_batch = self._wrap_ask(agent.ask_safety_batch)
+        agent.get_action = self._wrap_get_action(agent.get_action, kb)
+
+    def _wrap_tell(self, tell):
+        def counted_tell(sentence):
+            self.tells += 1
+            return tell(sentence)
+
+        return counted_tell
+
+    def _wrap_ask(self, ask):
+        def timed_ask(*args, **kwargs):
+            self.asks += 1
+            self._depth += 1
+            start = time.perf_counter()
+            try:
+                return ask(*args, **kwargs)
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    self.sat_time += time.perf_counter() - start
+
+        return timed_ask
+
+    def _wrap_get_action(self, get_action, kb):
+        def counted_get_action(state):
+            try:
+                return get_action(state)
+            finally:
+                self.clauses.append(len(kb.clauses))
+
+        return counted_get_action
+
+
+def play_game(task):
+    """
+    Plays one quiet game and returns its record.  task is a tuple
+    (layout name, agent options string, seed, randomize, timeout,
+    trace memory).
+    """
+    layout_name, agent_args, seed, randomize, timeout, trace_memory = task
+    record = {'layout': layout_name, 'agent': agent_args, 'seed': seed}
+    stats = GameStats()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+                contextlib.redirect_stderr(devnull):
+            random.seed(seed)
+            world_layout = layout.getLayout(layout_name)
+            if world_layout is None:
+                raise Exception("The layout " + layout_name + " cannot be found")
+            if randomize:
+                world_layout.radomize()
+            pacman = LogicalAgent(**parse_agent_args(agent_args or None))
+            stats.instrument(pacman)
+            rules = ClassicGameRules(timeout)
+            game = rules.new_game(world_layout, pacman, [WumpusAgent(1)],
+                                  text_display.NullGraphics(), quiet=True,
+                                  catch_exceptions=True)
+            game.run()
+        state = game.state
+        if state.is_win():
+            record['outcome'] = 'win'
+        elif state.is_lose():
+            record['outcome'] = 'loss'
+        else:
+            record['outcome'] = 'crash' if game.agent_crashed else 'unfinished'
+        record['score'] = state.get_score()
+        record['moves'] = len(game.move_history)
+    except Exception as e:
+        record.update(outcome='error', score=0, moves=0,
+                      error='%s: %s' % (type(e).__name__, e))
+    record['game_time'] = time.perf_counter() - start
+    if trace_memory:
+        record['peak_mb'] = tracemalloc.get_traced_memory()[1] / 2.0 ** 20
+        tracemalloc.stop()
+    else:
+        record['peak_mb'] = None
+    record.update(tells=stats.tells, asks=stats.asks, sat_time=stats.sat_time,
+                  clauses=stats.clauses)
+    return record
+
+
+def run_batch(layouts, agent_args_list, num_games, seed=0, randomize=False,
+              timeout=30, workers=None, trace_memory=True):
+    """
+    Plays num_games games per layout and agent configuration and returns
+    their records in the order of the tasks.  Game i of every layout
+    and configuration uses the seed seed + i.  With workers=1 the games
+    run in this process.
+    """
+    tasks = [(layout_name, agent_args, seed + i, randomize, timeout, trace_memory)
+             for layout_name in layouts
+             for agent_args in agent_args_list
+             for i in range(num_games)]
+    if workers == 1:
+        return [play_game(task) for task in tasks]
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(play_game, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def summarize(records):
+    """
+    One row per layout and agent configuration, in order of appearance.
+    """
+    groups = {}
+    for record in records:
+        groups.setdefault((record['layout'], record['agent']), []).append(record)
+    rows = []
+    for (layout_name, agent_args), group in groups.items():
+        n = len(group)
+        peaks = [r['peak_mb'] for r in group if r['peak_mb'] is not None]
+        rows.append([layout_name, agent_args or '-', n,
+                     sum(r['outcome'] == 'win' for r in group),
+                     sum(r['outcome'] in ('error', 'crash') for r in group),
+                     sum(r['score'] for r in group) / float(n),
+                     sum(r['moves'] for r in group) / float(n),
+                     sum(r['tells'] for r in group) / float(n),
+                     sum(r['asks'] for r in group) / float(n),
+                     sum(r['sat_time'] for r in group) / n,
+                     sum(r['game_time'] for r in group) / n,
+                     max(max(r['clauses'] or [0]) for r in group),
+                     max(peaks) if peaks else '-'])
+    return rows
+
+
+SUMMARY_HEADER = ['layout', 'agent', 'games', 'wins', 'failed', 'score', 'moves',
+                  'tells', 'asks', 'SAT s', 'game s', 'max clauses', 'peak MB']
+
+GAME_HEADER = ['layout', 'agent', 'seed', 'outcome', 'score', 'moves', 'tells',
+               'asks', 'SAT s', 'game s', 'clauses', 'peak MB']
+
+
+def game_rows(records):
+    return [[r['layout'], r['agent'] or '-', r['seed'], r['outcome'], r['score'],
+             r['moves'], r['tells'], r['asks'], r['sat_time'], r['game_time'],
+             r['clauses'][-1] if r['clauses'] else 0,
+             '-' if r['peak_mb'] is None else r['peak_mb']]
+            for r in records]
+
+
+def read_command(argv):
+    usage_str = """
+    USAGE:      python wumpus_batch.py <options>
+    EXAMPLES:   (1) python wumpus_batch.py -l wumpus_tiny -n 20
+                    - plays 20 seeded games with the default LogicalAgent
+                (2) python wumpus_batch.py -l wumpus_tiny,wumpus2 -a "solver=cdcl;solver=dpll"
+                    - compares two solver back-ends on the same games
+    """
+    parser = optparse.OptionParser(usage_str)
+    parser.add_option('-l', '--layouts', dest='layouts', default='wumpus_tiny',
+                      help='comma separated layouts to play [Default: %default]')
+    parser.add_option('-n', '--num_games', dest='num_games', type='int', default=5,
+                      help='games per layout and configuration [Default: %default]')
+    parser.add_option('-a', '--agent_args', dest='agent_args', default='',
+                      help='LogicalAgent options, configurations separated by ";"')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=0,
+                      help='seed of the first game [Default: %default]')
+    parser.add_option('-r', '--randomize', action='store_true', default=False,
+                      help='randomize pits, Wumpus and gold in each game')
+    parser.add_option('-w', '--workers', dest='workers', type='int', default=None,
+                      help='worker processes [Default: one per CPU]')
+    parser.add_option('--timeout', dest='timeout', type='int', default=30,
+                      help='maximum seconds an agent may spend on one move [Default: %default]')
+    parser.add_option('--no_memory', dest='trace_memory', action='store_false', default=True,
+                      help='do not trace peak memory (tracing slows the games down)')
+    parser.add_option('-g', '--games', dest='show_games', action='store_true', default=False,
+                      help='also print one row per game')
+    parser.add_option('-o', '--output', dest='output', default=None,
+                      help='write the game records to this file of JSON lines')
+    options, otherjunk = parser.parse_args(argv)
+    if len(otherjunk) != 0:
+        raise Exception('Command line input not understood: ' + str(otherjunk))
+    return options
+
+
+if __name__ == '__main__':
+    import sys
+    options = read_command(sys.argv[1:])
+    records = run_batch(options.layouts.split(','), options.agent_args.split(';'),
+                        options.num_games, options.seed, options.randomize,
+                        options.timeout, options.workers, options.trace_memory)
+    if options.output:
+        with open(options.output, 'w') as handle:
+            for record in records:
+                handle.write(json.dumps(record) + '\n')
+    if options.show_games:
+        print_table(game_rows(records), GAME_HEADER, numfmt='%.3g')
+        print()
+    print_table(summarize(records), SUMMARY_HEADER, numfmt='%.4g')
+    for record in records:
+        if 'error' in record:
+            print('%s seed %d: %s' % (record['layout'], record['seed'], record['error']))
@@ -0,0 +1,197 @@
+# wumpus_probability.py
+# ---------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+"""
+Probabilities of pits and of the Wumpus in unvisited cells, given the
+breezes and stenches sensed so far (AI:MA section 12.7 / 13.6).
+
+Pits are independent with a prior probability each, so only the frontier
+cells next to a breeze are uncertain beyond the prior.  The breezes split
+these cells into connected components (two cells are connected if they are
+next to the same breeze), and the components are independent: each is
+enumerated on its own, by a dynamic program over its cells whose state is
+the set of breezes that are still waiting for a pit.  The answers for a
+component are memoized, so a component that did not change since the last
+turn costs a dictionary lookup.
+
+There is a single Wumpus, so it is in a frontier cell exactly when a
+stench was sensed, and then in one of the cells whose neighbors are
+precisely the stench cells among the visited ones.
+
+Example:
+    model = WumpusProbability()
+    model.pit_probabilities({(1, 1): True, (2, 0): False}, no_pit={(1, 1), (2, 0)})
+"""
+
+# The memo of component answers is cleared once it holds this many entries
+MAX_MEMO_SIZE = 10000
+
+
+def neighbors(cell):
+    """
+    The four adjacent cells with non-negative coordinates
+    (as get_neighbors in pacman_agents)
+    """
+    x, y = cell
+    return [(nx, ny) for (nx, ny) in ((x - 1, y), (x, y - 1), (x, y + 1), (x + 1, y))
+            if nx >= 0 and ny >= 0]
+
+
+class WumpusProbability:
+    """
+    Posterior probabilities of pits and the Wumpus, with a memo of
+    component answers that is kept from turn to turn.
+    """
+
+    def __init__(self, pit_prior=0.2):
+        self.pit_prior = pit_prior
+        self.memo = {}
+        self.enumerated = 0  # components actually enumerated (not memoized)
+
+    def pit_probabilities(self, breezes, no_pit=(), pits=()):
+        """
+        Returns {cell: P(pit)} for the cells next to a breeze that are not
+        known.  breezes maps each visited cell to whether it was breezy,
+        no_pit holds the cells known to be free of pits (visited cells,
+        walls, or anything else the KB entails) and pits the cells known
+        to hold one.  Other unknown cells have probability pit_prior.
+        """
+        no_pit = set(no_pit) | set(breezes)
+        pits = set(pits)
+        for cell, breeze in breezes.items():
+            if not breeze:
+                no_pit.update(neighbors(cell))
+
+        # Each breeze not explained by a known pit needs one among its unknown cells
+        constraints = []
+        for cell, breeze in breezes.items():
+            if breeze:
+                unknown = frozenset(n for n in neighbors(cell) if n not in no_pit)
+                if unknown and not unknown & pits:
+                    constraints.append(unknown - pits)
+
+        probabilities = {}
+        for cells, component in self.components(constraints):
+            probabilities.update(self.component_probabilities(cells, component))
+        return probabilities
+
+    def components(self, constraints):
+        """
+        Splits the constraints into groups that share no cells; returns
+        a list of (cells, constraints) pairs.
+        """
+        parent = {}
+
+        def find(cell):
+            while parent[cell] != cell:
+                parent[cell] = parent[parent[cell]]
+                cell = parent[cell]
+            return cell
+
+        for constraint in constraints:
+            for cell in constraint:
+                parent.setdefault(cell, cell)
+            first = find(next(iter(constraint)))
+            for cell in constraint:
+                parent[find(cell)] = first
+
+        groups = {}
+        for constraint in constraints:
+            root = find(next(iter(constraint)))
+            cells, members = groups.setdefault(root, (set(), set()))
+            cells.update(constraint)
+            members.add(constraint)
+        return [(sorted(cells), frozenset(members)) for cells, members in groups.values()]
+
+    def component_probabilities(self, cells, constraints):
+        """
+        P(pit) for each cell of one component, given that every constraint
+        (a set of cells) holds at least one pit.
+        """
+        key = (tuple(cells), constraints)
+        result = self.memo.get(key)
+        if result is not None:
+            return result
+        self.enumerated += 1
+
+        # Cells in sorted order are close together, which keeps the set of
+        # breezes waiting for a pit small
+        constraints = list(constraints)
+        index = {cell: i for i, cell in enumerate(cells)}
+        containing = [[] for _ in cells]  # constraints that hold cell i
+        starts = [[] for _ in cells]      # constraints whose first cell is i
+        closes = [[] for _ in cells]      # constraints whose last cell is i
+        for c, constraint in enumerate(constraints):
+            positions = [index[cell] for cell in constraint]
+            for i in positions:
+                containing[i].append(c)
+            starts[min(positions)].append(c)
+            closes[max(positions)].append(c)
+
+        p = self.pit_prior
+        n = len(cells)
+        table = {}
+
+        def weigh(i, waiting):
+            """
+            Returns (weight, [weight with a pit in cell j for j >= i]) of the
+            assignments to cells i.. that satisfy the waiting constraints
+            and those not started yet.
+            """
+            if i == n:
+                return 1.0, []
+            state = (i, waiting)
+            if state in table:
+                return table[state]
+            total = 0.0
+            marginals = [0.0] * (n - i)
+            for pit, weight in ((True, p), (False, 1.0 - p)):
+                if pit:
+                    rest = waiting.difference(containing[i])
+                else:
+                    rest = waiting.union(starts[i])
+                    if rest.intersection(closes[i]):
+                        continue  # a breeze left without a pit
+                rest_total, rest_marginals = weigh(i + 1, rest)
+                total += weight * rest_total
+                if pit:
+                    marginals[0] += weight * rest_total
+                for j, m in enumerate(rest_marginals):
+                    marginals[j + 1] += weight * m
+            table[state] = (total, marginals)
+            return total, marginals
+
+        total, marginals = weigh(0, frozenset())
+        result = {cell: marginals[i] / total for i, cell in enumerate(cells)}
+
+        if len(self.memo) > MAX_MEMO_SIZE:
+            self.memo.clear()
+        self.memo[key] = result
+        return result
+
+    def wumpus_probabilities(self, stenches, candidates):
+        """
+        Returns {cell: P(Wumpus)} for the candidate cells (unvisited cells
+        the KB does not rule out), given whether each visited cell in
+        stenches smelled.  Without a stench the Wumpus is further away.
+        """
+        smelly = set(cell for cell, stench in stenches.items() if stench)
+        probabilities = dict((cell, 0.0) for cell in candidates)
+        if not smelly:
+            return probabilities
+        consistent = [cell for cell in candidates
+                      if all(stenches[n] for n in neighbors(cell) if n in stenches)
+                      and smelly.issubset(neighbors(cell))]
+        for cell in consistent:
+            probabilities[cell] = 1.0 / len(consistent)
+        return probabilities
@@ -19,10 +19,18 @@ import sys
 
 import environment
 import mdp
+import mdp_compiler
 import q_learning_agents
 import util
 import value_iteration_agents
 
+# Agents that plan with the model, selected by -a
+VALUE_AGENTS = {'value': value_iteration_agents.ValueIterationAgent,
+                'gauss_seidel': value_iteration_agents.GaussSeidelValueIterationAgent,
+                'prioritized': value_iteration_agents.PrioritizedSweepingValueIterationAgent,
+                'policy': value_iteration_agents.PolicyIterationAgent,
+                'modified_policy': value_iteration_agents.ModifiedPolicyIterationAgent}
+
 
 class GridWorld(mdp.MarkovDecisionProcess):
     """
@@ -66,7 +74,7 @@ class GridWorld(mdp.MarkovDecisionProcess):
         if state == self.grid.terminal_state:
             return ()
         x, y = state
-        if isinstance(self.grid[x][y], int):
+        if isinstance(self.grid[x][y], (float, int)):
             return ('exit',)
         return ('north', 'west', 'south', 'east')
 
@@ -167,6 +175,123 @@ class GridWorld(mdp.MarkovDecisionProcess):
 
         return successors
 
+    def compile(self):
+        """
+        The CompiledMDP of the grid (see mdp_compiler.py), built for all
+        cells at once with NumPy.  A move has one entry for each of the
+        three directions it can go, so a row may list the same next state
+        more than once; the probabilities add up as in
+        get_transition_states_and_probs.  Without NumPy the mdp is
+        compiled state by state.
+
+        It numbers the states as CompiledMDP(self) does and gives the
+        same Q-values (run with python -m doctest grid_world.py):
+        >>> def same_q_values(grid_world, sweeps=30, discount=0.9):
+        ...     fast, slow = grid_world.compile(), mdp_compiler.CompiledMDP(grid_world)
+        ...     if fast.states != slow.states:
+        ...         return False
+        ...     fast_values, slow_values = fast.zeros(), slow.zeros()
+        ...     for _ in range(sweeps):
+        ...         fast_values = fast.bellman_backup(fast_values, discount)
+        ...         slow_values = slow.bellman_backup(slow_values, discount)
+        ...     return all(abs(fast.row_q_value(fast_values, fast.row(state, action), discount)
+        ...                    - slow.row_q_value(slow_values, slow.row(state, action), discount))
+        ...                < 1e-12
+        ...                for state in slow.states if not grid_world.is_terminal(state)
+        ...                for action in grid_world.get_possible_actions(state))
+        >>> grids = [get_book_grid(), get_bridge_grid(), get_cliff_grid(), get_cliff_grid2(),
+        ...          get_discount_grid(), get_maze_grid()]
+        >>> grids += [get_random_grid(width, height, density, (1, -1, 2.5), noise, -0.1, seed)
+        ...           for seed, (width, height, density, noise) in enumerate(
+        ...               [(4, 1, 0.0, 0.2), (7, 5, 0.3, 0.2), (30, 20, 0.25, 0.0),
+        ...                (40, 40, 0.1, 0.3), (25, 25, 0.4, 0.5)])]
+        >>> [same_q_values(grid_world) for grid_world in grids]
+        [True, True, True, True, True, True, True, True, True, True, True]
+        """
+        if mdp_compiler.np is None:
+            return mdp_compiler.CompiledMDP(self)
+        np = mdp_compiler.np
+        width, height = self.grid.width, self.grid.height
+        # Cells in the order of get_states: column by column
+        cells = np.empty((width, height), dtype=object)
+        cells[:, :] = self.grid.data
+        walls = cells == '#'
+        # Only the few cells that are not plain strings need a type check
+        is_exit = ~(walls | (cells == ' ') | (cells == 'S'))
+        is_exit[is_exit] = [isinstance(cell, (float, int)) for cell in cells[is_exit]]
+        xs, ys = np.nonzero(~walls)
+        # State 0 is the terminal state; the cells follow it
+        index = np.full((width, height), -1, dtype=np.intp)
+        index[xs, ys] = np.arange(1, len(xs) + 1)
+        num_states = len(xs) + 1
+        exits = is_exit[xs, ys]
+        exit_rewards = cells[xs[exits], ys[exits]].astype(float)
+
+        def neighbour(dx, dy):
+            nx, ny = xs + dx, ys + dy
+            inside = (nx >= 0) & (nx < width) & (ny >= 0) & (ny < height)
+            target = np.arange(1, num_states)
+            target[inside] = np.where(walls[nx[inside], ny[inside]], target[inside],
+                                      index[nx[inside], ny[inside]])
+            return target
+
+        north, west, south, east = (neighbour(0, 1), neighbour(-1, 0),
+                                    neighbour(0, -1), neighbour(1, 0))
+        # Next states of the north, west, south and east rows of every cell,
+        # intended direction first, and their probabilities
+        moves = np.stack([np.stack([north, west, east], axis=1),
+                          np.stack([west, north, south], axis=1),
+                          np.stack([south, west, east], axis=1),
+                          np.stack([east, north, south], axis=1)], axis=1)
+        move_probs = np.array([1 - self.noise, self.noise / 2.0, self.noise / 2.0])
+
+        # Exit cells have one row with one entry, the others four rows
+        # with three entries
+        rows_of = np.where(exits, 1, 4)
+        entries_of = np.where(exits, 1, 12)
+        state_start = np.concatenate(([0, 0], np.cumsum(rows_of)))
+        entry_start = np.concatenate(([0], np.cumsum(entries_of)))[:-1]
+        num_pairs, num_entries = int(state_start[-1]), int(entries_of.sum())
+
+        actions = []
+        if len(xs):
+            move_actions = ['north', 'west', 'south', 'east']
+            actions = ['exit'] + move_actions if exits[0] else move_actions + ['exit']
+            if exits.all():
+                actions = ['exit']
+            elif not exits.any():
+                actions = move_actions
+        exit_action = actions.index('exit') if 'exit' in actions else -1
+        move_action = [actions.index(a) for a in ('north', 'west', 'south', 'east')
+                       if a in actions]
+
+        pair_state = np.repeat(np.arange(1, num_states), rows_of)
+        pair_action = np.empty(num_pairs, dtype=np.intp)
+        entry_next = np.empty(num_entries, dtype=np.intp)
+        entry_prob = np.empty(num_entries)
+        entry_reward = np.full(num_entries, float(self.living_reward))
+
+        exit_rows = state_start[1:-1][exits]
+        pair_action[exit_rows] = exit_action
+        exit_entries = entry_start[exits]
+        entry_next[exit_entries] = 0
+        entry_prob[exit_entries] = 1.0
+        entry_reward[exit_entries] = exit_rewards
+
+        moving = ~exits
+        move_rows = state_start[1:-1][moving][:, None] + np.arange(4)
+        pair_action[move_rows] = move_action
+        move_entries = entry_start[moving][:, None] + np.arange(12)
+        entry_next[move_entries] = moves[moving].reshape(-1, 12)
+        entry_prob[move_entries] = np.tile(move_probs, 4)
+
+        row_start = np.concatenate(([0], np.cumsum(np.where(pair_action == exit_action, 1, 3))))
+        entry_pair = np.repeat(np.arange(num_pairs), np.diff(row_start))
+        states = [self.grid.terminal_state] + list(zip(xs.tolist(), ys.tolist()))
+        return mdp_compiler.CompiledMDP.from_arrays(
+            self, states, actions, [True] + [False] * len(xs), pair_state, pair_action,
+            state_start, row_start, entry_pair, entry_next, entry_prob, entry_reward)
+
     def __aggregate(self, states_and_probs):
         counter = util.Counter()
         for state, prob in states_and_probs:
@@ -330,6 +455,89 @@ def get_maze_grid():
     return GridWorld(grid)
 
 
+def get_random_grid(width=20, height=20, wall_density=0.2, terminal_rewards=(1, -1),
+                    noise=0.2, living_reward=0.0, seed=None):
+    """
+    A width x height grid with walls in about wall_density of the cells,
+    one exit for each of terminal_rewards and a start, all placed at
+    random by a random.Random(seed).  Only the largest open region is
+    kept and the start and the exits are placed in it, so every exit is
+    reachable and the grid is as large as the walls allow.  The walls are
+    drawn with NumPy when it is installed, so a seed gives a different
+    grid with and without it.
+    """
+    rand = random.Random(seed)
+    np = mdp_compiler.np
+    if np is not None:
+        draws = np.random.default_rng(rand.getrandbits(64)).random((width, height))
+        region = largest_region(draws >= wall_density)
+        open_cells = np.flatnonzero(region).tolist()
+        grid = Grid(0, 0)
+        grid.width, grid.height = width, height
+        grid.data = np.where(region, ' ', '#').tolist()
+    else:
+        is_open = [[rand.random() >= wall_density for y in range(height)] for x in range(width)]
+        open_cells = largest_region(is_open)
+        grid = Grid(width, height, '#')
+        for cell in open_cells:
+            grid[cell // height][cell % height] = ' '
+    if len(open_cells) < len(terminal_rewards) + 1:
+        raise Exception('Grid has room for only %d cells' % len(open_cells))
+
+    start, *exits = rand.sample(open_cells, len(terminal_rewards) + 1)
+    grid[start // height][start % height] = 'S'
+    for cell, reward in zip(exits, terminal_rewards):
+        grid[cell // height][cell % height] = reward
+
+    grid_world = GridWorld(grid)
+    grid_world.set_noise(noise)
+    grid_world.set_living_reward(living_reward)
+    return grid_world
+
+
+def largest_region(is_open):
+    """
+    The cells x * height + y of the largest 4-connected region of open
+    cells, in increasing order.  is_open[x][y] tells whether a cell is
+    open; with NumPy it is a boolean array and the result a mask of it.
+    """
+    np = mdp_compiler.np
+    if np is not None and mdp_compiler.sparse is not None:
+        from scipy import ndimage
+        labels, count = ndimage.label(is_open)
+        if not count:
+            return np.zeros_like(is_open)
+        return labels == np.argmax(np.bincount(labels.ravel())[1:]) + 1
+    width, height = len(is_open), len(is_open[0]) if len(is_open) else 0
+    if np is not None:
+        cells = is_open.ravel().tolist()
+    else:
+        cells = [is_open[x][y] for x in range(width) for y in range(height)]
+    seen = [False] * len(cells)
+    best = []
+    for first in range(len(cells)):
+        if not cells[first] or seen[first]:
+            continue
+        seen[first] = True
+        region, frontier = [first], [first]
+        while frontier:
+            cell = frontier.pop()
+            x, y = divmod(cell, height)
+            for next_cell, inside in ((cell + 1, y + 1 < height), (cell - 1, y > 0),
+                                      (cell + height, x + 1 < width), (cell - height, x > 0)):
+                if inside and cells[next_cell] and not seen[next_cell]:
+                    seen[next_cell] = True
+                    region.append(next_cell)
+                    frontier.append(next_cell)
+        if len(region) > len(best):
+            best = region
+    if np is not None:
+        mask = np.zeros(len(cells), dtype=bool)
+        mask[best] = True
+        return mask.reshape(width, height)
+    return sorted(best)
+
+
 def getUserAction(state, action_function):
     """
     Get an action from the user (rather than the agent).
@@ -404,6 +612,21 @@ def run_episode(agent, environment, discount, decision, display, message, pause,
         agent.stop_episode()
 
 
+def make_value_agent(args, mdp, iterations):
+    """
+    The value iteration agent selected by -a, run for the given iterations.
+    """
+    if args.agent == 'prioritized':
+        return VALUE_AGENTS[args.agent](mdp, args.discount, iterations, theta=args.theta)
+    if args.agent == 'policy':
+        return VALUE_AGENTS[args.agent](mdp, args.discount, iterations)
+    if args.agent == 'modified_policy':
+        tolerance = 1e-6 if args.tolerance is None else args.tolerance
+        return VALUE_AGENTS[args.agent](mdp, args.discount, iterations,
+                                        k=args.evaluation_backups, tolerance=tolerance)
+    return VALUE_AGENTS[args.agent](mdp, args.discount, iterations, tolerance=args.tolerance)
+
+
 def parse_options():
     arg_parser = argparse.ArgumentParser()
     arg_parser.add_argument('-d', '--discount', action='store',
@@ -430,6 +653,23 @@ def parse_options():
                             type=int, dest='iters', default=10,
                             metavar="K",
                             help='Number of rounds of value iteration (default %default)')
+    arg_parser.add_argument('--tolerance', action='store',
+                            type=float, dest='tolerance', default=None, metavar="T",
+                            help='Stop value iteration once no value changes by more than T '
+                                 'in a sweep (default: run all iterations; prioritized '
+                                 'sweeping stops at --theta instead)')
+    arg_parser.add_argument('--theta', action='store',
+                            type=float, dest='theta', default=1e-5, metavar="T",
+                            help='Bellman error below which prioritized sweeping stops '
+                                 '(default %(default)s)')
+    arg_parser.add_argument('--evaluation_backups', action='store',
+                            type=int, dest='evaluation_backups', default=5, metavar="K",
+                            help='Policy evaluation backups per iteration of modified policy '
+                                 'iteration (default %(default)s)')
+    arg_parser.add_argument('--qtable', action='store', metavar="Q",
+                            type=str, dest='qtable', default='counter',
+                            help='Q-value storage of the q agent, \'counter\' or \'array\' '
+                                 '(default %(default)s)')
     arg_parser.add_argument('-k', '--episodes', action='store',
                             type=int, dest='episodes', default=1,
                             metavar="K",
@@ -437,14 +677,16 @@ def parse_options():
     arg_parser.add_argument('-g', '--grid', action='store',
                             metavar="G", type=str, dest='grid', default="book_grid",
                             help='Grid to use (case sensitive; options are book_grid, bridge_grid, '
-                                 'cliff_grid, maze_grid, default %default)')
+                                 'cliff_grid, maze_grid, random_grid (20x20), default %default)')
     arg_parser.add_argument('-w', '--windowSize', metavar="X", type=int, dest='gridSize',
                             default=150,
                             help='Request a window width of X pixels *per grid cell* (default '
                                  '%default)')
     arg_parser.add_argument('-a', '--agent', action='store', metavar="A",
                             type=str, dest='agent', default="random",
-                            help='Agent type (options are \'random\', \'value\' and \'q\', '
+                            help='Agent type (options are \'random\', \'value\', '
+                                 '\'gauss_seidel\', \'prioritized\', \'policy\', '
+                                 '\'modified_policy\' and \'q\', '
                                  'default %default)')
     arg_parser.add_argument('-t', '--text', action='store_true',
                             dest='text_display', default=False,
@@ -523,8 +765,9 @@ if __name__ == '__main__':
     ###########################
 
     a = None
-    if args.agent == 'value':
-        a = value_iteration_agents.ValueIterationAgent(mdp, args.discount, args.iters)
+    if args.agent in VALUE_AGENTS:
+        a = make_value_agent(args, mdp, args.iters)
+        print(a.report())
     elif args.agent == 'q':
         # env.get_possible_actions, args.discount, args.learning_rate, args.epsilon
         # simulationFn = lambda agent, state: simulation.GridWorldSimulation(agent,state,mdp)
@@ -533,7 +776,8 @@ if __name__ == '__main__':
         q_learn_opts = {'gamma': args.discount,
                         'alpha': args.learning_rate,
                         'epsilon': args.epsilon,
-                        'actionFn': action_fn}
+                        'actionFn': action_fn,
+                        'qtable': args.qtable}
         a = q_learning_agents.QLearningAgent(**q_learn_opts)
     elif args.agent == 'random':
         # # No reason to use the random agent without episodes
@@ -569,10 +813,10 @@ if __name__ == '__main__':
     ###########################
     # DISPLAY Q/V VALUES BEFORE SIMULATION OF EPISODES
     try:
-        if not args.manual and args.agent == 'value':
+        if not args.manual and args.agent in VALUE_AGENTS:
             if args.valueSteps:
                 for i in range(args.iters):
-                    tempAgent = value_iteration_agents.ValueIterationAgent(mdp, args.discount, i)
+                    tempAgent = make_value_agent(args, mdp, i)
                     display.display_values(tempAgent,
                                            message="VALUES AFTER " + str(i) + " ITERATIONS")
                     display.pause()
@@ -594,7 +838,7 @@ if __name__ == '__main__':
                 display_callback = lambda state: display.display_values(a,
                                                                         state,
                                                                         "CURRENT VALUES")
-            if args.agent == 'value':
+            if args.agent in VALUE_AGENTS:
                 display_callback = lambda state: display.display_values(a,
                                                                         state,
                                                                         "CURRENT VALUES")
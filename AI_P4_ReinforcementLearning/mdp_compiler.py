@@ -0,0 +1,485 @@
+"""
+mdp_compiler.py
+---------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+This file contains a CompiledMDP object which turns a MarkovDecisionProcess
+(see mdp.py) into arrays, so that a planner does whole Bellman backups at
+once instead of calling the mdp for every state, action and successor on
+every sweep.
+
+States are numbered 0..n-1 in the order of mdp.get_states(), and every legal
+action of a non-terminal state is a row 0..m-1; the rows of a state are
+contiguous and in the order of mdp.get_possible_actions(state).  The
+transitions are stored sparsely, one entry per (row, next state):
+
+    pair_state[k], pair_action[k]       the state and action of row k
+    state_start[s]:state_start[s + 1]   the rows of state s
+    row_start[k]:row_start[k + 1]       the entries of row k
+    entry_pair[e], entry_next[e],
+    entry_prob[e], entry_reward[e]      row, next state, probability, reward
+
+dense() expands them to the tensors P[a, s, s'] and R[a, s, s'].  When NumPy
+is installed the fields are NumPy arrays and the backups are vectorized;
+without it they are lists and the backups are loops over them, which still
+avoids every call into the mdp.
+
+A policy is a vector of rows, one per state (-1 for states without rows).
+evaluate_policy solves (I - discount * P_pi) V = R_pi with a sparse solver
+when SciPy is installed, densely with NumPy for small MDPs, and otherwise
+by Gauss-Seidel sweeps until the values stop changing.
+
+compile_mdp uses mdp.compile() when the mdp has one.  GridWorld does: it
+builds the arrays for the whole grid at once with CompiledMDP.from_arrays,
+which is what makes grids of a million cells practical.
+
+Example (the examples are doctests: python -m doctest mdp_compiler.py):
+>>> import grid_world
+>>> compiled = compile_mdp(grid_world.get_book_grid())
+>>> values = compiled.zeros()
+>>> for i in range(100):
+...     values = compiled.bellman_backup(values, 0.9)
+>>> round(compiled.value_of(values, (0, 0)), 4)
+0.4907
+
+The Q-values, backups and greedy rows agree with a Bellman backup that
+calls the mdp for every state, action and successor:
+>>> def mdp_q_value(mdp, values, state, action, discount):
+...     return sum(prob * (mdp.get_reward(state, action, next_state)
+...                        + discount * values[next_state])
+...                for next_state, prob in mdp.get_transition_states_and_probs(state, action))
+>>> def largest_difference(mdp, sweeps, discount=0.9):
+...     compiled = CompiledMDP(mdp)
+...     values = compiled.zeros()
+...     mdp_values = {state: 0.0 for state in mdp.get_states()}
+...     error = 0.0
+...     for _ in range(sweeps):
+...         q = compiled.q_values(values, discount)
+...         rows = compiled.greedy_rows(q)
+...         new_values = {}
+...         for state in mdp.get_states():
+...             new_values[state] = 0.0
+...             if mdp.is_terminal(state) or not mdp.get_possible_actions(state):
+...                 continue
+...             mdp_q = {action: mdp_q_value(mdp, mdp_values, state, action, discount)
+...                      for action in mdp.get_possible_actions(state)}
+...             new_values[state] = max(mdp_q.values())
+...             greedy = compiled.actions[compiled.pair_action[rows[compiled.index[state]]]]
+...             error = max([error, abs(mdp_q[greedy] - new_values[state])]
+...                         + [abs(q[compiled.row(state, action)] - mdp_q[action])
+...                            for action in mdp_q])
+...         values = compiled.bellman_backup(values, discount)
+...         mdp_values = new_values
+...         error = max([error] + [abs(compiled.value_of(values, state) - mdp_values[state])
+...                                for state in mdp_values])
+...     return error
+>>> for name in ('book_grid', 'bridge_grid', 'cliff_grid', 'discount_grid', 'maze_grid'):
+...     print(name, largest_difference(getattr(grid_world, 'get_' + name)(), 50) < 1e-12)
+book_grid True
+bridge_grid True
+cliff_grid True
+discount_grid True
+maze_grid True
+"""
+
+import warnings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from scipy import sparse
+    from scipy.sparse import linalg as sparse_linalg
+except ImportError:
+    sparse = None
+
+# Without SciPy, policies over at most this many states are evaluated with
+# a dense NumPy solve, and larger ones by Gauss-Seidel sweeps
+DENSE_SOLVE_LIMIT = 2000
+
+
+class CompiledMDP:
+    """
+    The states, actions and sparse transitions of an mdp, indexed by ints.
+    """
+
+    def __init__(self, mdp):
+        self.mdp = mdp
+        self.states = list(mdp.get_states())
+        self.index = {state: i for i, state in enumerate(self.states)}
+        self.actions = []
+        self.action_index = {}
+        self.terminal = [bool(mdp.is_terminal(state)) for state in self.states]
+
+        pair_state, pair_action, state_start, row_start = [], [], [0], [0]
+        entry_pair, entry_next, entry_prob, entry_reward = [], [], [], []
+        for s, state in enumerate(self.states):
+            # Terminal states have no future rewards, so they get no rows
+            actions = () if self.terminal[s] else mdp.get_possible_actions(state)
+            for action in actions:
+                a = self.action_index.get(action)
+                if a is None:
+                    a = self.action_index[action] = len(self.actions)
+                    self.actions.append(action)
+                k = len(pair_state)
+                pair_state.append(s)
+                pair_action.append(a)
+                for next_state, prob in mdp.get_transition_states_and_probs(state, action):
+                    entry_pair.append(k)
+                    entry_next.append(self.index[next_state])
+                    entry_prob.append(prob)
+                    entry_reward.append(mdp.get_reward(state, action, next_state))
+                row_start.append(len(entry_pair))
+            state_start.append(len(pair_state))
+
+        self._store(pair_state, pair_action, state_start, row_start,
+                    entry_pair, entry_next, entry_prob, entry_reward)
+
+    @classmethod
+    def from_arrays(cls, mdp, states, actions, terminal, pair_state, pair_action, state_start,
+                    row_start, entry_pair, entry_next, entry_prob, entry_reward):
+        """
+        A CompiledMDP from arrays already laid out as above, for mdps that
+        can build them faster than by calling their methods for every state.
+        """
+        compiled = cls.__new__(cls)
+        compiled.mdp = mdp
+        compiled.states = states
+        compiled.index = {state: i for i, state in enumerate(states)}
+        compiled.actions = list(actions)
+        compiled.action_index = {action: a for a, action in enumerate(compiled.actions)}
+        compiled.terminal = terminal
+        compiled._store(pair_state, pair_action, state_start, row_start,
+                        entry_pair, entry_next, entry_prob, entry_reward)
+        return compiled
+
+    def _store(self, pair_state, pair_action, state_start, row_start,
+               entry_pair, entry_next, entry_prob, entry_reward):
+        self.num_states = len(self.states)
+        self.num_pairs = len(pair_state)
+        if np is not None:
+            self.pair_state = np.asarray(pair_state, dtype=np.intp)
+            self.pair_action = np.asarray(pair_action, dtype=np.intp)
+            self.state_start = np.asarray(state_start, dtype=np.intp)
+            self.row_start = np.asarray(row_start, dtype=np.intp)
+            self.entry_pair = np.asarray(entry_pair, dtype=np.intp)
+            self.entry_next = np.asarray(entry_next, dtype=np.intp)
+            self.entry_prob = np.asarray(entry_prob, dtype=float)
+            self.entry_reward = np.asarray(entry_reward, dtype=float)
+            # States with at least one row, and where their rows start
+            self.acting = np.flatnonzero(np.diff(self.state_start) > 0)
+            self.acting_start = self.state_start[self.acting]
+        else:
+            self.pair_state, self.pair_action = pair_state, pair_action
+            self.state_start, self.row_start = state_start, row_start
+            self.entry_pair, self.entry_next = entry_pair, entry_next
+            self.entry_prob, self.entry_reward = entry_prob, entry_reward
+            self.acting = [s for s in range(self.num_states)
+                           if state_start[s + 1] > state_start[s]]
+            self.acting_start = [state_start[s] for s in self.acting]
+
+        self._successors = None
+        self._predecessors = None
+
+    def zeros(self):
+        """
+        A value vector that is 0 in every state.
+        """
+        if np is not None:
+            return np.zeros(self.num_states)
+        return [0.0] * self.num_states
+
+    def vector(self, values):
+        """
+        A value vector from a list of floats, one per state.
+        """
+        if np is not None:
+            return np.array(values, dtype=float)
+        return list(values)
+
+    def max_change(self, new_values, old_values):
+        """
+        The largest absolute difference between two value vectors.
+        """
+        if not self.num_states:
+            return 0.0
+        if np is not None:
+            return float(np.max(np.abs(new_values - old_values)))
+        return max(abs(new - old) for new, old in zip(new_values, old_values))
+
+    def successors(self):
+        """
+        For each state, the list of its rows, each a list of
+        (next state, probability, reward) tuples.  In-place backups
+        update one state at a time, which plain lists do fastest.
+        """
+        if self._successors is None:
+            row_start = [int(e) for e in self.row_start]
+            state_start = [int(k) for k in self.state_start]
+            entries = list(zip([int(n) for n in self.entry_next],
+                               [float(p) for p in self.entry_prob],
+                               [float(r) for r in self.entry_reward]))
+            self._successors = [[entries[row_start[k]:row_start[k + 1]]
+                                 for k in range(state_start[s], state_start[s + 1])]
+                                for s in range(self.num_states)]
+        return self._successors
+
+    def predecessors(self):
+        """
+        For each state, the set of states that reach it with non-zero
+        probability under some action.
+        """
+        if self._predecessors is None:
+            self._predecessors = [set() for _ in range(self.num_states)]
+            for s, rows in enumerate(self.successors()):
+                for row in rows:
+                    for next_s, prob, _ in row:
+                        if prob > 0:
+                            self._predecessors[next_s].add(s)
+        return self._predecessors
+
+    def state_backup(self, values, s, discount):
+        """
+        max_a Q(s, a) for one state with values a list, 0 without rows.
+        """
+        best = None
+        for row in self.successors()[s]:
+            q_value = 0.0
+            for next_s, prob, reward in row:
+                q_value += prob * (reward + discount * values[next_s])
+            if best is None or q_value > best:
+                best = q_value
+        return 0.0 if best is None else best
+
+    def value_of(self, values, state):
+        """
+        The entry of a value vector for a state; 0 for unknown states.
+        """
+        s = self.index.get(state)
+        return 0.0 if s is None else float(values[s])
+
+    def row(self, state, action):
+        """
+        The row of a (state, action) pair, or None if it has none.
+        """
+        s = self.index.get(state)
+        a = self.action_index.get(action)
+        if s is None or a is None:
+            return None
+        for k in range(self.state_start[s], self.state_start[s + 1]):
+            if self.pair_action[k] == a:
+                return int(k)
+        return None
+
+    def row_q_value(self, values, k, discount):
+        """
+        Q-value of row k: sum of prob * (reward + discount * V(next state)).
+        """
+        q_value = 0.0
+        for e in range(self.row_start[k], self.row_start[k + 1]):
+            q_value += self.entry_prob[e] * (self.entry_reward[e]
+                                             + discount * values[self.entry_next[e]])
+        return float(q_value)
+
+    def q_values(self, values, discount):
+        """
+        The Q-values of every row under the value vector.
+        """
+        if np is not None:
+            contributions = self.entry_prob * (self.entry_reward
+                                               + discount * values[self.entry_next])
+            return np.bincount(self.entry_pair, weights=contributions, minlength=self.num_pairs)
+        q = [0.0] * self.num_pairs
+        for k, next_s, prob, reward in zip(self.entry_pair, self.entry_next,
+                                           self.entry_prob, self.entry_reward):
+            q[k] += prob * (reward + discount * values[next_s])
+        return q
+
+    def state_max(self, q):
+        """
+        The best Q-value of each state, 0 for states without rows.
+        """
+        if np is not None:
+            values = np.zeros(self.num_states)
+            if self.num_pairs:
+                values[self.acting] = np.maximum.reduceat(q, self.acting_start)
+            return values
+        values = [0.0] * self.num_states
+        for s in self.acting:
+            values[s] = max(q[self.state_start[s]:self.state_start[s + 1]])
+        return values
+
+    def greedy_rows(self, q):
+        """
+        For each state the row of its first best action (the order of
+        get_possible_actions breaks ties), -1 for states without rows.
+        """
+        if np is not None:
+            rows = np.full(self.num_states, -1, dtype=np.intp)
+            if self.num_pairs:
+                best = self.state_max(q)[self.pair_state]
+                candidates = np.where(q == best, np.arange(self.num_pairs), self.num_pairs)
+                rows[self.acting] = np.minimum.reduceat(candidates, self.acting_start)
+            return rows
+        rows = [-1] * self.num_states
+        for s in self.acting:
+            start, end = self.state_start[s], self.state_start[s + 1]
+            rows[s] = max(range(start, end), key=lambda k: (q[k], -k))
+        return rows
+
+    def bellman_backup(self, values, discount):
+        """
+        One synchronous sweep of value iteration: V'(s) = max_a Q(s, a).
+        """
+        return self.state_max(self.q_values(values, discount))
+
+    def improve_rows(self, q, rows, epsilon=1e-10):
+        """
+        The greedy policy for the Q-values, keeping the row of the current
+        policy wherever it is within epsilon of the best, so that ties do
+        not make policy iteration cycle.  Returns (rows, states changed).
+        """
+        greedy = self.greedy_rows(q)
+        if np is not None:
+            acting = self.acting
+            keep = q[rows[acting]] >= q[greedy[acting]] - epsilon
+            new_rows = greedy.copy()
+            new_rows[acting] = np.where(keep, rows[acting], greedy[acting])
+            return new_rows, int(np.count_nonzero(new_rows != rows))
+        new_rows = list(greedy)
+        changed = 0
+        for s in self.acting:
+            if q[rows[s]] >= q[greedy[s]] - epsilon:
+                new_rows[s] = rows[s]
+            else:
+                changed += 1
+        return new_rows, changed
+
+    def policy_entries(self, rows):
+        """
+        The transitions of a policy: (state, next state, probability,
+        reward) of every entry of the rows it chooses.
+        """
+        if np is not None:
+            chosen = np.zeros(self.num_pairs, dtype=bool)
+            chosen[rows[self.acting]] = True
+            selected = chosen[self.entry_pair]
+            return (self.pair_state[self.entry_pair[selected]], self.entry_next[selected],
+                    self.entry_prob[selected], self.entry_reward[selected])
+        states, next_states, probs, rewards = [], [], [], []
+        for s in self.acting:
+            k = rows[s]
+            for e in range(self.row_start[k], self.row_start[k + 1]):
+                states.append(s)
+                next_states.append(self.entry_next[e])
+                probs.append(self.entry_prob[e])
+                rewards.append(self.entry_reward[e])
+        return states, next_states, probs, rewards
+
+    def policy_backup(self, entries, values, discount):
+        """
+        One sweep of policy evaluation: V'(s) = Q(s, pi(s)), with entries
+        from policy_entries.
+        """
+        states, next_states, probs, rewards = entries
+        if np is not None:
+            return np.bincount(states, weights=probs * (rewards + discount * values[next_states]),
+                               minlength=self.num_states)
+        new_values = [0.0] * self.num_states
+        for s, next_s, prob, reward in zip(states, next_states, probs, rewards):
+            new_values[s] += prob * (reward + discount * values[next_s])
+        return new_values
+
+    def evaluate_policy(self, rows, discount, tolerance=1e-10, max_sweeps=10000):
+        """
+        The values of a policy, V = R_pi + discount * P_pi V.  When discount
+        is 1 and the policy can avoid the terminal states forever the
+        system is singular; the values are then those of max_sweeps
+        Gauss-Seidel sweeps, which are very low for the looping states.
+        """
+        entries = self.policy_entries(rows)
+        states, next_states, probs, rewards = entries
+        n = self.num_states
+        if np is not None and (sparse is not None or n <= DENSE_SOLVE_LIMIT):
+            expected = np.bincount(states, weights=probs * rewards, minlength=n)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                try:
+                    if sparse is not None:
+                        system = sparse.identity(n, format='csc') - discount * sparse.csc_matrix(
+                            (probs, (states, next_states)), shape=(n, n))
+                        values = np.asarray(sparse_linalg.spsolve(system, expected), dtype=float)
+                    else:
+                        system = np.identity(n)
+                        np.add.at(system, (states, next_states), -discount * probs)
+                        values = np.linalg.solve(system, expected)
+                except np.linalg.LinAlgError:
+                    values = None
+            if values is not None and np.all(np.isfinite(values)):
+                return values
+        return self.iterate_policy(entries, discount, tolerance, max_sweeps)
+
+    def iterate_policy(self, entries, discount, tolerance, max_sweeps):
+        """
+        Gauss-Seidel policy evaluation: each state uses the values already
+        updated in the sweep.
+        """
+        by_state = [[] for _ in range(self.num_states)]
+        for s, next_s, prob, reward in zip(*entries):
+            by_state[int(s)].append((int(next_s), float(prob), float(reward)))
+        acting = [int(s) for s in self.acting]
+        values = [0.0] * self.num_states
+        for _ in range(max_sweeps):
+            change = 0.0
+            for s in acting:
+                value = 0.0
+                for next_s, prob, reward in by_state[s]:
+                    value += prob * (reward + discount * values[next_s])
+                change = max(change, abs(value - values[s]))
+                values[s] = value
+            if change <= tolerance:
+                break
+        return self.vector(values)
+
+    def dense(self):
+        """
+        The transition and reward tensors P[a, s, s'] and R[a, s, s'].
+        Actions that are not legal in s have all-zero rows.  Needs NumPy.
+        """
+        if np is None:
+            raise ImportError('CompiledMDP.dense needs NumPy')
+        shape = (len(self.actions), self.num_states, self.num_states)
+        transitions = np.zeros(shape)
+        rewards = np.zeros(shape)
+        where = (self.pair_action[self.entry_pair], self.pair_state[self.entry_pair],
+                 self.entry_next)
+        np.add.at(transitions, where, self.entry_prob)
+        rewards[where] = self.entry_reward
+        return transitions, rewards
+
+
+def compile_mdp(mdp):
+    """
+    Returns the CompiledMDP of an mdp, from mdp.compile() when the mdp
+    has one.
+    """
+    compile_arrays = getattr(mdp, 'compile', None)
+    if compile_arrays is not None:
+        return compile_arrays()
+    return CompiledMDP(mdp)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -16,6 +16,7 @@ import util
 from feature_extractors import *
 from game import *
 from learning_agents import ReinforcementAgent
+from q_table import ArrayQTable
 from util import random
 
 class QLearningAgent(ReinforcementAgent):
@@ -37,9 +38,12 @@ class QLearningAgent(ReinforcementAgent):
       Functions you should use
         - self.get_legal_actions(state)
           which return_val legal actions for a state
+
+      With qtable='array' the Q-values are kept in an ArrayQTable
+      (see q_table.py) instead of a util.Counter.
     """
 
-    def __init__(self, **args):
+    def __init__(self, qtable='counter', **args):
         """
         You can initialize Q-values here...
         :param args:
@@ -47,7 +51,10 @@ class QLearningAgent(ReinforcementAgent):
         ReinforcementAgent.__init__(self, **args)
 
         # *** YOUR CODE HERE ***
-        self.q_values = util.Counter()
+        if qtable not in ('counter', 'array'):
+            raise Exception('Unknown Q-table: ' + str(qtable))
+        self.q_values = util.Counter() if qtable == 'counter' else None
+        self.q_table = ArrayQTable() if qtable == 'array' else None
 
     def get_q_value(self, state, action):
         """
@@ -57,6 +64,8 @@ class QLearningAgent(ReinforcementAgent):
         """
 
         # *** YOUR CODE HERE ***
+        if self.q_table is not None:
+            return self.q_table.get(state, action)
 
         return self.q_values[(state,action)]
 
@@ -69,6 +78,8 @@ class QLearningAgent(ReinforcementAgent):
         """
 
         # *** YOUR CODE HERE ***
+        if self.q_table is not None:
+            return self.q_table.max_value(self.q_table.row(state, self.get_legal_actions))
 
         legal_actions = self.get_legal_actions(state)
         if not legal_actions:
@@ -83,6 +94,8 @@ class QLearningAgent(ReinforcementAgent):
         """
 
         # *** YOUR CODE HERE *** #see q1
+        if self.q_table is not None:
+            return self.q_table.best_action(self.q_table.row(state, self.get_legal_actions))
         current_best = []
         legal_actions = self.get_legal_actions(state)
         if not legal_actions:
@@ -135,6 +148,11 @@ class QLearningAgent(ReinforcementAgent):
 
         # *** YOUR CODE HERE ***
         item = reward + self.discount * self.compute_value_from_q_values(next_state)
+        if self.q_table is not None:
+            row = self.q_table.row(state, self.get_legal_actions)
+            self.q_table.set(row, action, (1 - self.alpha) * self.get_q_value(state, action)
+                             + self.alpha * item)
+            return
         self.q_values[(state, action)] = (1 - self.alpha) * self.get_q_value(state, action) + self.alpha * item
 
     def get_policy(self, state):
@@ -186,6 +204,9 @@ class ApproximateQAgent(PacmanQAgent):
     """
 
     def __init__(self, extractor='IdentityExtractor', **args):
+        if args.get('qtable', 'counter') != 'counter':
+            raise Exception('ApproximateQAgent computes Q-values from weights, '
+                            'it has no Q-table')
         self.feat_extractor = util.lookup(extractor, globals())()
         PacmanQAgent.__init__(self, **args)
         self.weights = util.Counter()
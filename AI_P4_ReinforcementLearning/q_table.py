@@ -0,0 +1,167 @@
+"""
+q_table.py
+----------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+This file contains an ArrayQTable, a dense table of Q-values for tabular
+Q-learning, used by QLearningAgent when it is created with qtable='array'
+(python pacman.py -p PacmanQAgent -a qtable=array).
+
+States and actions are interned on first sight: a state gets the next row of
+the table and an action the next column, and the table doubles its rows or
+grows its columns when it runs out.  When a state is interned the agent's
+legal actions in it are looked up once and kept as an array of columns, so
+the value and the greedy action of a state are a max and a flatnonzero over
+one row instead of a get_legal_actions call and a dict lookup per action.
+Q-values that were never set are 0, as in the util.Counter the agent uses
+by default.
+
+Ties between greedy actions are broken by one random.randrange over the
+tied columns, in the order of the legal actions, which draws the same
+random numbers and picks the same action as random.choice over the list
+of tied actions.  Without NumPy the rows are lists.
+
+Example (the examples are doctests: python -m doctest q_table.py):
+>>> table = ArrayQTable(states=2, actions=2)
+>>> rows = [table.row(n, lambda n: range(n % 7)) for n in range(100)]
+>>> table.set(rows[6], 5, 2.5)
+>>> table.set(rows[6], 2, -1.0)
+>>> table.get(6, 5), table.get(6, 4), table.get(6, 9), table.get(1000, 0)
+(2.5, 0.0, 0.0, 0.0)
+>>> table.max_value(rows[6]), table.best_action(rows[6])
+(2.5, 5)
+>>> table.max_value(rows[0]), table.best_action(rows[0])
+(0.0, None)
+
+Q-learning with the table learns exactly what it learns with the Counter:
+>>> import grid_world, q_learning_agents
+>>> def learn(qtable, mdp, episodes=100):
+...     random.seed(7)
+...     environment = grid_world.GridWorldEnvironment(mdp)
+...     agent = q_learning_agents.QLearningAgent(
+...         gamma=0.9, alpha=0.5, epsilon=0.3, actionFn=mdp.get_possible_actions, qtable=qtable)
+...     for episode in range(episodes):
+...         grid_world.run_episode(agent, environment, 0.9, agent.get_action, ignore, ignore,
+...                                lambda: None, episode)
+...     return [agent.get_q_value(state, action) for state in mdp.get_states()
+...             for action in mdp.get_possible_actions(state)]
+>>> def ignore(*args):
+...     pass
+>>> grids = [grid_world.get_book_grid(), grid_world.get_discount_grid(),
+...          grid_world.get_random_grid(15, 15, 0.2, seed=2)]
+>>> [learn('array', mdp) == learn('counter', mdp) for mdp in grids]
+[True, True, True]
+"""
+
+import random
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ArrayQTable:
+    """
+    Q-values of interned (state, action) pairs in a growable dense table.
+    """
+
+    def __init__(self, states=64, actions=4):
+        self.state_index = {}
+        self.action_index = {}
+        self.actions = []
+        self.legal = []  # for each row, the columns of the legal actions
+        if np is not None:
+            self.table = np.zeros((states, actions))
+        else:
+            self.table = []
+
+    def row(self, state, legal_actions_fn):
+        """
+        The row of a state, interning it and its legal actions (from
+        legal_actions_fn(state)) on first sight.
+        """
+        i = self.state_index.get(state)
+        if i is None:
+            i = self.state_index[state] = len(self.legal)
+            columns = [self.column(action) for action in legal_actions_fn(state)]
+            if np is not None:
+                self.legal.append(np.array(columns, dtype=np.intp))
+                if i == self.table.shape[0]:
+                    self.table = np.concatenate((self.table, np.zeros_like(self.table)))
+            else:
+                self.legal.append(columns)
+                self.table.append([0.0] * len(self.actions))
+        return i
+
+    def column(self, action):
+        """
+        The column of an action, interning it on first sight.
+        """
+        j = self.action_index.get(action)
+        if j is None:
+            j = self.action_index[action] = len(self.actions)
+            self.actions.append(action)
+            if np is not None:
+                if j == self.table.shape[1]:
+                    self.table = np.concatenate((self.table, np.zeros_like(self.table)), axis=1)
+            else:
+                for values in self.table:
+                    values.append(0.0)
+        return j
+
+    def get(self, state, action):
+        """
+        Q(state, action), 0 if either was never seen.
+        """
+        i = self.state_index.get(state)
+        j = self.action_index.get(action)
+        if i is None or j is None:
+            return 0.0
+        return float(self.table[i][j])
+
+    def set(self, row, action, value):
+        self.table[row][self.column(action)] = value
+
+    def max_value(self, row):
+        """
+        The best Q-value of the legal actions of a row, 0 without any.
+        """
+        columns = self.legal[row]
+        if not len(columns):
+            return 0.0
+        if np is not None:
+            return float(self.table[row, columns].max())
+        values = self.table[row]
+        return max(values[j] for j in columns)
+
+    def best_action(self, row):
+        """
+        A legal action of a row with the best Q-value, chosen uniformly at
+        random among ties; None without legal actions.
+        """
+        columns = self.legal[row]
+        if not len(columns):
+            return None
+        if np is not None:
+            q = self.table[row, columns]
+            ties = np.flatnonzero(q == q.max())
+            return self.actions[columns[ties[random.randrange(len(ties))]]]
+        values = self.table[row]
+        best = max(values[j] for j in columns)
+        ties = [j for j in columns if values[j] == best]
+        return self.actions[ties[random.randrange(len(ties))]]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,141 @@
+"""
+value_benchmark.py
+------------------
+Licensing Information:  You are free to use or extend these projects for
+educational purposes provided that (1) you do not distribute or publish
+solutions, (2) you retain this notice, and (3) you provide clear
+attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+
+Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+The core projects and autograders were primarily created by John DeNero
+(denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+Student side autograding was added by Brad Miller, Nick Hay, and
+Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+Compares the planners of value_iteration_agents.py on the bundled grids and
+on large generated ones.  Every planner runs until it converges (value
+iteration to the tolerance, policy iteration until its policy is stable)
+and the table shows the time it took, including compiling the mdp, the
+work it reports, the largest difference of its values from those of value
+iteration and how many states it acts differently in.
+
+The large grids are n x n grids from grid_world.get_random_grid, with
+the wall density and seed of the options.  Before its planners, a line for
+each generated grid shows how long generating and compiling it took.
+
+Example:
+    python value_benchmark.py -g book_grid,maze_grid -s 20,50 -a value,policy
+    python value_benchmark.py -g "" -s 100,300,1000 -a value,modified_policy
+"""
+
+import argparse
+import time
+
+import grid_world
+import mdp_compiler
+import value_iteration_agents
+
+PLANNERS = {'value': value_iteration_agents.ValueIterationAgent,
+            'gauss_seidel': value_iteration_agents.GaussSeidelValueIterationAgent,
+            'prioritized': value_iteration_agents.PrioritizedSweepingValueIterationAgent,
+            'policy': value_iteration_agents.PolicyIterationAgent,
+            'modified_policy': value_iteration_agents.ModifiedPolicyIterationAgent}
+
+
+def make_planner(name, mdp, args):
+    """
+    The planner called name, run on the mdp until it converges.
+    """
+    if name == 'prioritized':
+        return PLANNERS[name](mdp, args.discount, args.max_iterations, theta=args.tolerance)
+    if name == 'policy':
+        return PLANNERS[name](mdp, args.discount, args.max_iterations)
+    if name == 'modified_policy':
+        return PLANNERS[name](mdp, args.discount, args.max_iterations,
+                              k=args.evaluation_backups, tolerance=args.tolerance)
+    return PLANNERS[name](mdp, args.discount, args.max_iterations, tolerance=args.tolerance)
+
+
+def compare(reference, agent, mdp):
+    """
+    The largest value difference and the number of policy differences.
+    """
+    error, disagreements = 0.0, 0
+    for state in mdp.get_states():
+        error = max(error, abs(agent.get_value(state) - reference.get_value(state)))
+        if agent.get_policy(state) != reference.get_policy(state):
+            disagreements += 1
+    return error, disagreements
+
+
+def run(name, mdp, planners, args):
+    """
+    Runs every planner on the mdp and prints one row for each.
+    """
+    mdp.set_noise(args.noise)
+    mdp.set_living_reward(args.living_reward)
+    reference = make_planner('value', mdp, args)
+    for planner in planners:
+        start = time.perf_counter()
+        agent = make_planner(planner, mdp, args)
+        elapsed = time.perf_counter() - start
+        error, disagreements = compare(reference, agent, mdp)
+        print('%-14s %7d  %-16s %9.3f  %-40s %9.2e %6d' % (
+            name, len(mdp.get_states()), planner, elapsed, agent.report().split(': ', 1)[1],
+            error, disagreements))
+
+
+def parse_options():
+    arg_parser = argparse.ArgumentParser(
+        description='Compare value iteration and policy iteration planners.')
+    arg_parser.add_argument('-g', '--grids', default='book_grid,bridge_grid,maze_grid',
+                            help='Bundled grids to run, separated by commas '
+                                 '(default %(default)s)')
+    arg_parser.add_argument('-s', '--sizes', default='20,50',
+                            help='Sides of the generated grids to run, separated by commas '
+                                 '(default %(default)s)')
+    arg_parser.add_argument('-w', '--wall_density', type=float, default=0.2,
+                            help='Fraction of walls in the generated grids (default %(default)s)')
+    arg_parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the generated grids (default %(default)s)')
+    arg_parser.add_argument('-a', '--agents', default=','.join(PLANNERS),
+                            help='Planners to compare, separated by commas '
+                                 '(default %(default)s)')
+    arg_parser.add_argument('-d', '--discount', type=float, default=0.9,
+                            help='Discount on future (default %(default)s)')
+    arg_parser.add_argument('-n', '--noise', type=float, default=0.2,
+                            help='How often action results in unintended direction '
+                                 '(default %(default)s)')
+    arg_parser.add_argument('-r', '--living_reward', type=float, default=0.0,
+                            help='Reward for living for a time step (default %(default)s)')
+    arg_parser.add_argument('--tolerance', type=float, default=1e-8,
+                            help='Convergence tolerance of the value iteration planners '
+                                 '(default %(default)s)')
+    arg_parser.add_argument('--evaluation_backups', type=int, default=5,
+                            help='Policy evaluation backups per iteration of modified policy '
+                                 'iteration (default %(default)s)')
+    arg_parser.add_argument('--max_iterations', type=int, default=10000,
+                            help='Iterations after which a planner stops anyway '
+                                 '(default %(default)s)')
+    return arg_parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_options()
+    planners = [name for name in args.agents.split(',') if name]
+    for name in planners:
+        if name not in PLANNERS:
+            raise Exception('Unknown planner: ' + name)
+
+    print('%-14s %7s  %-16s %9s  %-40s %9s %6s' % (
+        'grid', 'states', 'planner', 'seconds', 'work', 'error', 'policy'))
+    for grid in filter(None, args.grids.split(',')):
+        run(grid, getattr(grid_world, 'get_' + grid)(), planners, args)
+    for size in filter(None, args.sizes.split(',')):
+        start = time.perf_counter()
+        mdp = grid_world.get_random_grid(int(size), int(size), args.wall_density, seed=args.seed)
+        generated = time.perf_counter()
+        mdp_compiler.compile_mdp(mdp)
+        print('random_%s: generated in %.3f s, compiled in %.3f s' % (
+            size, generated - start, time.perf_counter() - generated))
+        run('random_%s' % size, mdp, planners, args)
@@ -12,10 +12,10 @@ The core projects and autograders were primarily created by John DeNero
 Student side autograding was added by Brad Miller, Nick Hay, and
 Pieter Abbeel (pabbeel@cs.berkeley.edu).
 """
-
-import util
+import heapq
 
 from learning_agents import ValueEstimationAgent
+from mdp_compiler import compile_mdp
 
 
 class ValueIterationAgent(ValueEstimationAgent):
@@ -28,11 +28,13 @@ class ValueIterationAgent(ValueEstimationAgent):
         discount factor.
     """
 
-    def __init__(self, mdp, discount=0.9, iterations=100):
+    def __init__(self, mdp, discount=0.9, iterations=100, tolerance=None):
         """
           Your value iteration agent should take an mdp on
           construction, run the indicated number of iterations
           and then act according to the resulting policy.
+          With a tolerance, it stops early once no value changes
+          by more than the tolerance in a sweep.
 
           Some useful mdp methods you will use:
               mdp.get_states()
@@ -45,27 +47,39 @@ class ValueIterationAgent(ValueEstimationAgent):
         self.mdp = mdp
         self.discount = discount
         self.iterations = iterations
-        self.values = util.Counter()  # A Counter is a dict with default 0
+        # The mdp is compiled to arrays once; self.values is a vector
+        # indexed by self.compiled.index (see mdp_compiler.py)
+        self.compiled = compile_mdp(mdp)
+        self.values = self.compiled.zeros()
+        self.tolerance = tolerance
+        self.sweeps = 0   # sweeps over the states performed
+        self.backups = 0  # single state backups performed
+        self.run_value_iteration()
 
+    def run_value_iteration(self):
         # Write value iteration code here
         # *** YOUR CODE HERE ***
+        acting = len(self.compiled.acting)
         for _ in range(self.iterations):
-            currValues = util.Counter()
-            for state in self.mdp.get_states():
-                if self.mdp.is_terminal(state):
-                    currValues[state] = 0
-                else:
-                    action_values = [self.compute_q_value_from_values(state, action) for action in self.mdp.get_possible_actions(state) ]
-                    if action_values:
-                        currValues[state] = max(action_values)
-            self.values = currValues
+            values = self.compiled.bellman_backup(self.values, self.discount)
+            change = self.compiled.max_change(values, self.values)
+            self.values = values
+            self.sweeps += 1
+            self.backups += acting
+            if self.tolerance is not None and change <= self.tolerance:
+                break
 
+    def report(self):
+        """
+          A line describing the work done by value iteration.
+        """
+        return "%s: %d sweeps, %d backups" % (type(self).__name__, self.sweeps, self.backups)
 
     def get_value(self, state):
         """
           Return the value of the state (computed in __init__).
         """
-        return self.values[state]
+        return self.compiled.value_of(self.values, state)
 
     def compute_q_value_from_values(self, state, action):
         """
@@ -74,10 +88,14 @@ class ValueIterationAgent(ValueEstimationAgent):
         """
 
         # *** YOUR CODE HERE ***
+        k = self.compiled.row(state, action)
+        if k is not None:
+            return self.compiled.row_q_value(self.values, k, self.discount)
+        # Not compiled (e.g. an action of a terminal state): ask the mdp
         q_value = 0
         for next_state, probability in self.mdp.get_transition_states_and_probs(state, action):
             rewardGiven = self.mdp.get_reward(state, action, next_state)
-            q_value += probability * (rewardGiven + self.discount * self.values[next_state])
+            q_value += probability * (rewardGiven + self.discount * self.get_value(next_state))
         return q_value
 
     def compute_action_from_values(self, state):
@@ -116,3 +134,171 @@ class ValueIterationAgent(ValueEstimationAgent):
 
     def get_q_value(self, state, action):
         return self.compute_q_value_from_values(state, action)
+
+
+class GaussSeidelValueIterationAgent(ValueIterationAgent):
+    """
+        Value iteration in place: each sweep visits the states in order
+        and a backup immediately uses the values already updated in the
+        same sweep, which usually converges in fewer sweeps.
+
+        It converges to the values of value iteration, as does prioritized
+        sweeping (run with python -m doctest value_iteration_agents.py):
+        >>> import grid_world
+        >>> def largest_difference(agent_class, mdp, **options):
+        ...     reference = ValueIterationAgent(mdp, 0.9, 1000, tolerance=1e-12)
+        ...     agent = agent_class(mdp, 0.9, 1000, **options)
+        ...     return max(abs(agent.get_value(state) - reference.get_value(state))
+        ...                for state in mdp.get_states())
+        >>> grids = ['book_grid', 'bridge_grid', 'discount_grid', 'maze_grid']
+        >>> [largest_difference(GaussSeidelValueIterationAgent, getattr(grid_world, 'get_' + name)(),
+        ...                     tolerance=1e-12) < 1e-9 for name in grids]
+        [True, True, True, True]
+        >>> [largest_difference(PrioritizedSweepingValueIterationAgent,
+        ...                     getattr(grid_world, 'get_' + name)(), theta=1e-12) < 1e-9
+        ...  for name in grids]
+        [True, True, True, True]
+    """
+
+    def run_value_iteration(self):
+        compiled = self.compiled
+        values = [0.0] * compiled.num_states
+        for _ in range(self.iterations):
+            change = 0.0
+            for s in compiled.acting:
+                value = compiled.state_backup(values, s, self.discount)
+                change = max(change, abs(value - values[s]))
+                values[s] = value
+            self.sweeps += 1
+            self.backups += len(compiled.acting)
+            if self.tolerance is not None and change <= self.tolerance:
+                break
+        self.values = compiled.vector(values)
+
+
+class PrioritizedSweepingValueIterationAgent(ValueIterationAgent):
+    """
+        Backs up the state with the largest Bellman error first.  After
+        a backup, the predecessors of the state whose error exceeds theta
+        are queued again.  iterations bounds the backups to as many as
+        that many sweeps would do; the agent stops sooner when no error
+        exceeds theta.  theta takes the place of a tolerance.
+    """
+
+    def __init__(self, mdp, discount=0.9, iterations=100, theta=1e-5):
+        self.theta = theta
+        super().__init__(mdp, discount, iterations)
+
+    def run_value_iteration(self):
+        compiled = self.compiled
+        predecessors = compiled.predecessors()
+        values = [0.0] * compiled.num_states
+        # Lowest priority first; a state is queued with its current
+        # priority in queued, and older heap entries for it are skipped
+        queued = {}
+        heap = []
+        for s in compiled.acting:
+            error = abs(compiled.state_backup(values, s, self.discount) - values[s])
+            if error > self.theta:
+                queued[s] = -error
+                heap.append((-error, s))
+        heapq.heapify(heap)
+
+        max_backups = self.iterations * len(compiled.acting)
+        while heap and self.backups < max_backups:
+            priority, s = heapq.heappop(heap)
+            if queued.get(s) != priority:
+                continue
+            del queued[s]
+            values[s] = compiled.state_backup(values, s, self.discount)
+            self.backups += 1
+            for p in predecessors[s]:
+                error = abs(compiled.state_backup(values, p, self.discount) - values[p])
+                if error > self.theta and -error < queued.get(p, 0.0):
+                    queued[p] = -error
+                    heapq.heappush(heap, (-error, p))
+        self.values = compiled.vector(values)
+
+    def report(self):
+        return "%s: %d backups" % (type(self).__name__, self.backups)
+
+
+class PolicyIterationAgent(ValueIterationAgent):
+    """
+        Policy iteration: evaluates the current policy exactly, as the
+        sparse linear system (I - discount * P_pi) V = R_pi, then makes it
+        greedy with respect to those values, until the policy is stable
+        or after the given number of iterations.  Starts from the policy
+        greedy with respect to zero values.
+
+        Both policy iteration agents reach the values of value iteration:
+        >>> import grid_world
+        >>> def largest_difference(agent):
+        ...     reference = ValueIterationAgent(agent.mdp, 0.9, 1000, tolerance=1e-12)
+        ...     return max(abs(agent.get_value(state) - reference.get_value(state))
+        ...                for state in agent.mdp.get_states())
+        >>> grids = [getattr(grid_world, 'get_' + name)()
+        ...          for name in ('book_grid', 'bridge_grid', 'discount_grid', 'maze_grid')]
+        >>> [largest_difference(PolicyIterationAgent(mdp, 0.9)) < 1e-9 for mdp in grids]
+        [True, True, True, True]
+        >>> [largest_difference(ModifiedPolicyIterationAgent(mdp, 0.9, 1000, k=3, tolerance=1e-12))
+        ...  < 1e-9 for mdp in grids]
+        [True, True, True, True]
+    """
+
+    def __init__(self, mdp, discount=0.9, iterations=100):
+        self.policy_iterations = 0  # policies evaluated
+        super().__init__(mdp, discount, iterations)
+
+    def run_value_iteration(self):
+        compiled = self.compiled
+        rows = compiled.greedy_rows(compiled.q_values(self.values, self.discount))
+        for _ in range(self.iterations):
+            self.values = self.evaluate_policy(rows)
+            self.policy_iterations += 1
+            q = compiled.q_values(self.values, self.discount)
+            self.backups += len(compiled.acting)
+            rows, changed = compiled.improve_rows(q, rows)
+            if not changed:
+                break
+
+    def evaluate_policy(self, rows):
+        return self.compiled.evaluate_policy(rows, self.discount)
+
+    def report(self):
+        return "%s: %d policy iterations, %d backups" % (
+            type(self).__name__, self.policy_iterations, self.backups)
+
+
+class ModifiedPolicyIterationAgent(PolicyIterationAgent):
+    """
+        Modified policy iteration: each iteration makes the policy greedy
+        with one full backup, then evaluates it approximately with k more
+        backups under the fixed policy.  k=0 is value iteration and a
+        large k approaches policy iteration.  Stops once the full backup
+        changes no value by more than the tolerance.
+    """
+
+    def __init__(self, mdp, discount=0.9, iterations=100, k=5, tolerance=1e-6):
+        self.k = k
+        self.policy_iterations = 0
+        ValueIterationAgent.__init__(self, mdp, discount, iterations, tolerance)
+
+    def run_value_iteration(self):
+        compiled = self.compiled
+        acting = len(compiled.acting)
+        for _ in range(self.iterations):
+            q = compiled.q_values(self.values, self.discount)
+            values = compiled.state_max(q)
+            change = compiled.max_change(values, self.values)
+            self.values = values
+            self.policy_iterations += 1
+            self.sweeps += 1
+            self.backups += acting
+            if self.tolerance is not None and change <= self.tolerance:
+                break
+            entries = compiled.policy_entries(compiled.greedy_rows(q))
+            for _ in range(self.k):
+                self.values = compiled.policy_backup(entries, self.values, self.discount)
+                self.sweeps += 1
+                self.backups += acting